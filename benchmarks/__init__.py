@@ -0,0 +1 @@
+# Để trống
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""Đo chi phí mỗi ảnh của luồng đăng ký cũ (detect + face_landmarks + face_encodings)
+so với analyze_image (detect + landmark + encode trong một lượt)
+
+Chạy: python -m benchmarks.bench_face_analysis --images data/known_faces --limit 100
+"""
+import argparse
+import os
+import time
+import numpy as np
+import face_recognition
+from src import config
+from src.face_analysis import analyze_image
+from src.face_detectors import create_face_detector
+from benchmarks.bench_face_detectors import load_images
+
+def legacy_encode(image, detector):
+    """Luồng cũ của DataManager._encode_image / add_new_face"""
+    face_locations = detector.detect(image)
+    if not face_locations:
+        return None
+    if not face_recognition.face_landmarks(image, face_locations):
+        return None
+    face_encodings = face_recognition.face_encodings(image, known_face_locations=face_locations, model="small")
+    return face_encodings[0] if face_encodings else None
+
+def single_pass_encode(image, detector):
+    return analyze_image(image, detector, max_faces=1).encoding
+
+def measure(func, images, detector):
+    """Trả về (ms/ảnh, danh sách encoding)"""
+    start = time.perf_counter()
+    encodings = [func(image, detector) for image in images]
+    return (time.perf_counter() - start) * 1000 / len(images), encodings
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phân tích khuôn mặt một lượt")
+    parser.add_argument("--images", default=os.path.join(config.BASE_DIR, "data", "known_faces"))
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--detector", default=config.FACE_DETECTOR)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"Không có ảnh trong {args.images}")
+        return
+    detector = create_face_detector(args.detector)
+    single_pass_encode(images[0], detector)  # warm-up model dlib
+
+    legacy_ms, legacy = measure(legacy_encode, images, detector)
+    single_ms, single = measure(single_pass_encode, images, detector)
+
+    # Kết quả phải giống hệt luồng cũ (cùng predictor 5 điểm và cùng bộ mã hóa)
+    same = all((a is None and b is None) or (a is not None and b is not None and np.allclose(a, b))
+               for a, b in zip(legacy, single))
+    print(f"{'path':>12} {'ms/image':>9}")
+    print(f"{'legacy':>12} {legacy_ms:>9.2f}")
+    print(f"{'single-pass':>12} {single_ms:>9.2f}")
+    print(f"Tiết kiệm {legacy_ms - single_ms:.2f} ms/ảnh ({1 - single_ms / legacy_ms:.0%}) "
+          f"trên {len(images)} ảnh, encoding {'giống nhau' if same else 'KHÁC NHAU'}")
+
+if __name__ == "__main__":
+    main()
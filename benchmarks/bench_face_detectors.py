@@ -0,0 +1,62 @@
+"""Benchmark độ trễ và recall của các face detector ở nhiều tỉ lệ thu nhỏ
+
+Mỗi ảnh đầu vào được giả định có đúng một khuôn mặt (ví dụ ảnh đã đăng ký), recall là
+tỉ lệ ảnh phát hiện được ít nhất một khuôn mặt.
+
+Chạy: python -m benchmarks.bench_face_detectors --images data/known_faces --scales 1.0 0.5 0.25
+"""
+import argparse
+import os
+import time
+import cv2
+from src import config
+from src.face_detectors import FACE_DETECTORS, create_face_detector
+from src.batch_runner import IMAGE_EXTENSIONS
+
+def load_images(image_dir, limit):
+    """Đọc ảnh (RGB) trong thư mục, tìm cả thư mục con"""
+    images = []
+    for root, _, files in os.walk(image_dir):
+        for filename in sorted(files):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                image = cv2.imread(os.path.join(root, filename))
+                if image is not None:
+                    images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            if len(images) >= limit:
+                return images
+    return images
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector")
+    parser.add_argument("--images", default=os.path.join(config.BASE_DIR, "data", "known_faces"))
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5, 0.25])
+    parser.add_argument("--detectors", nargs="+", default=list(FACE_DETECTORS))
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"Không có ảnh trong {args.images}")
+        return
+
+    print(f"{len(images)} ảnh")
+    print(f"{'detector':>9} {'scale':>6} {'ms/image':>9} {'recall':>7}")
+    for name in args.detectors:
+        try:
+            detector = create_face_detector(name)
+        except Exception as e:
+            print(f"{name:>9} bỏ qua: {str(e)}")
+            continue
+        for scale in args.scales:
+            scaled = [cv2.resize(image, (0, 0), fx=scale, fy=scale) if scale != 1.0 else image
+                      for image in images]
+            detected = 0
+            start = time.perf_counter()
+            for image in scaled:
+                if detector.detect(image):
+                    detected += 1
+            elapsed = time.perf_counter() - start
+            print(f"{name:>9} {scale:>6.2f} {elapsed * 1000 / len(scaled):>9.2f} {detected / len(scaled):>7.3f}")
+
+if __name__ == "__main__":
+    main()
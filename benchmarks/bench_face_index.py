@@ -0,0 +1,57 @@
+"""Benchmark recall và độ trễ của các backend chỉ mục khuôn mặt
+
+Chạy: python -m benchmarks.bench_face_index --sizes 10000 100000 --nprobe 4 8 16
+"""
+import argparse
+import time
+import numpy as np
+from src.face_gallery import FaceGallery
+from benchmarks.synthetic import make_identities, make_queries
+
+def build_gallery(encodings, labels, backend, options):
+    """Tạo gallery từ encoding giả lập"""
+    gallery = FaceGallery(capacity=len(encodings), index_backend=backend, index_options=options)
+    for label in np.unique(labels):
+        gallery.add(f"user_{label}", f"user_{label}", encodings[labels == label])
+    return gallery
+
+def run(gallery, queries, batch_size):
+    """Chạy truy vấn theo batch, trả về (dòng gần nhất, ms/query)"""
+    # Truy vấn đầu tiên có thể train chỉ mục, không tính vào thời gian
+    gallery.index.search(queries[:1])
+    rows = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        batch_rows, _ = gallery.index.search(queries[i:i + batch_size])
+        rows.append(batch_rows)
+    elapsed = time.perf_counter() - start
+    return np.concatenate(rows), elapsed * 1000 / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chỉ mục khuôn mặt")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Số identity trong gallery")
+    parser.add_argument("--images-per-identity", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=4, help="Số khuôn mặt mỗi frame")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    print(f"{'N':>8} {'backend':>12} {'recall@1':>9} {'ms/query':>9}")
+    for size in args.sizes:
+        encodings, labels = make_identities(size, args.images_per_identity)
+        queries, _ = make_queries(encodings, labels, args.queries)
+
+        exact = build_gallery(encodings, labels, "exact", {})
+        exact_rows, exact_ms = run(exact, queries, args.batch_size)
+        print(f"{len(exact):>8} {'exact':>12} {1.0:>9.3f} {exact_ms:>9.3f}")
+
+        for nprobe in args.nprobe:
+            ivf = build_gallery(encodings, labels, "ivf", {"nprobe": nprobe, "min_train_size": 0})
+            ivf_rows, ivf_ms = run(ivf, queries, args.batch_size)
+            # Recall so với kết quả tìm kiếm chính xác
+            recall = np.mean(np.array(ivf.row_users)[ivf_rows] == np.array(exact.row_users)[exact_rows])
+            print(f"{len(ivf):>8} {f'ivf/{nprobe}':>12} {recall:>9.3f} {ivf_ms:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""So sánh cấp phát bộ nhớ và độ trễ của vòng lặp frame khi cấp phát mới mỗi frame
+và khi dùng lại buffer (read(image=...), resize(dst=...), cvtColor(dst=...))
+
+Dùng video tổng hợp (MJPG) nên chạy được mà không cần camera; số liệu bộ nhớ lấy từ tracemalloc
+(NumPy báo cáo các vùng dữ liệu của mảng cho tracemalloc).
+
+Chạy: python -m benchmarks.bench_frame_pool --width 1920 --height 1080 --frames 120
+"""
+import os
+import argparse
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import cv2
+from src import config
+from src.frame_pool import FramePool, ScratchBuffers
+
+def make_video(path, width, height, frames, seed=0):
+    """Ghi video tổng hợp có một khối chuyển động trên nền nhiễu"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (width, height))
+    for i in range(frames):
+        frame = background.copy()
+        x = (i * 16) % max(1, width - 200)
+        cv2.rectangle(frame, (x, height // 3), (x + 200, height // 3 + 200), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+def step_alloc(capture, state, scale):
+    """Vòng lặp cũ: mỗi bước trả về một mảng mới"""
+    ret, frame = capture.read()
+    if not ret:
+        return False
+    small = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    cv2.rectangle(frame, (10, 10), (200, 200), (0, 255, 0), 2)
+    return True
+
+def step_pool(capture, state, scale):
+    """Vòng lặp mới: đọc và xử lý vào buffer có sẵn"""
+    pool, scratch = state
+    buffer = pool.acquire()
+    ret, frame = capture.read(buffer) if buffer is not None else capture.read()
+    if not ret:
+        return False
+    pool.adopt(frame)
+    h, w = frame.shape[:2]
+    size = (round(w * scale), round(h * scale))
+    small = cv2.resize(frame, size, dst=scratch.get("small", (size[1], size[0], 3)))
+    cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=scratch.get("rgb", small.shape))
+    cv2.rectangle(frame, (10, 10), (200, 200), (0, 255, 0), 2)
+    pool.release(frame)
+    return True
+
+def run(path, step, frames, scale, trace):
+    """Trả về (ms/frame, MB cấp phát tạm/frame, MB bộ nhớ cao nhất)"""
+    capture = cv2.VideoCapture(path)
+    state = (FramePool(4), ScratchBuffers())
+    step(capture, state, scale)  # frame đầu tiên: cấp phát pool
+    if trace:
+        tracemalloc.start()
+    churn = 0
+    start = time.perf_counter()
+    done = 0
+    for _ in range(frames):
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        if not step(capture, state, scale):
+            break
+        if trace:
+            churn += tracemalloc.get_traced_memory()[1] - before
+        done += 1
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace:
+        tracemalloc.stop()
+    capture.release()
+    return elapsed * 1000 / max(done, 1), churn / max(done, 1) / 2**20, peak / 2**20
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pool buffer frame")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--scale", type=float, default=config.FACE_SCALE_MAX)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.avi")
+        make_video(path, args.width, args.height, args.frames + 1)
+
+        print(f"{'loop':>6} {'ms/frame':>9} {'alloc MB/frame':>15} {'peak MB':>8}")
+        for name, step in (("alloc", step_alloc), ("pool", step_pool)):
+            # Đo thời gian và bộ nhớ ở hai lần chạy riêng vì tracemalloc làm chậm vòng lặp
+            ms, _, _ = run(path, step, args.frames, args.scale, trace=False)
+            _, churn, peak = run(path, step, args.frames, args.scale, trace=True)
+            print(f"{name:>6} {ms:>9.2f} {churn:>15.2f} {peak:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Đo dung lượng, thời gian mở và độ chính xác của file gallery memmap (float32/float16)
+so với cách cũ (danh sách encoding float64 trong Python)
+
+Chạy: python -m benchmarks.bench_gallery_file --identities 100000 --images-per-identity 10
+"""
+import os
+import argparse
+import tempfile
+import time
+import numpy as np
+from src import config
+from src.face_gallery import FaceGallery
+from src.gallery_file import save_gallery_file, load_gallery_file
+from benchmarks.synthetic import make_identities, make_queries
+from benchmarks.bench_prototypes import evaluate
+
+def build_gallery(encodings, labels):
+    gallery = FaceGallery(capacity=len(encodings), index_backend="exact")
+    bounds = np.flatnonzero(np.diff(labels)) + 1
+    for rows in np.split(np.arange(len(labels)), bounds):
+        label = int(labels[rows[0]])
+        gallery.add(label, str(label), encodings[rows])
+    return gallery
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark file gallery nhị phân")
+    parser.add_argument("--identities", type=int, default=100000)
+    parser.add_argument("--images-per-identity", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=config.FACE_MATCH_TOLERANCE)
+    args = parser.parse_args()
+
+    encodings, labels = make_identities(2 * args.identities, args.images_per_identity)
+    enrolled = labels < args.identities
+    queries, query_labels = make_queries(encodings[enrolled], labels[enrolled], args.queries)
+    impostors, _ = make_queries(encodings[~enrolled], labels[~enrolled], args.queries)
+    gallery = build_gallery(encodings[enrolled], labels[enrolled])
+    rows = len(gallery)
+
+    # Cách cũ: mỗi encoding là một mảng float64 riêng trong list (1 KB dữ liệu + overhead đối tượng)
+    legacy_mb = rows * (128 * 8 + np.empty(128).__sizeof__() - np.empty(128).nbytes) / 2**20
+    print(f"{rows} encoding, {args.identities} người; list float64 cũ ~{legacy_mb:.0f} MB")
+    print(f"{'dtype':>8} {'file MB':>8} {'save s':>7} {'open ms':>8} {'1st match ms':>13} "
+          f"{'accuracy':>9} {'false acc':>10} {'ms/face':>8}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for dtype in ("float32", "float16"):
+            path = os.path.join(directory, f"gallery_{dtype}.fgal")
+            start = time.perf_counter()
+            save_gallery_file(path, gallery, dtype)
+            save_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            loaded = load_gallery_file(path, index_backend="exact")
+            open_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            loaded.match(queries[:args.batch_size], args.tolerance)
+            first_ms = (time.perf_counter() - start) * 1000
+
+            accuracy, false_accept, ms = evaluate(loaded, queries, query_labels, impostors,
+                                                  args.tolerance, args.batch_size)
+            size_mb = os.path.getsize(path) / 2**20
+            print(f"{dtype:>8} {size_mb:>8.1f} {save_s:>7.2f} {open_ms:>8.1f} {first_ms:>13.1f} "
+                  f"{accuracy:>9.4f} {false_accept:>10.4f} {ms:>8.3f}")
+            del loaded
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""So sánh ms/frame của ObjectDetector giữa PyTorch và ONNX (FP32/INT8)
+
+Chạy: python -m benchmarks.bench_object_backend --imgsz 320 640 --frames 50
+"""
+import argparse
+import time
+from src import config
+from src.object_detection import ObjectDetector
+from benchmarks.bench_object_batch import make_frames
+
+def measure(detector, frames):
+    """ms/frame khi chạy từng frame một (như vòng lặp live)"""
+    start = time.perf_counter()
+    for frame in frames:
+        detector.detect_batch([frame])
+    return (time.perf_counter() - start) * 1000 / len(frames)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend của ObjectDetector")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[config.OBJECT_IMGSZ])
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.width, args.height)
+    print(f"{'backend':>12} {'imgsz':>6} {'load s':>7} {'ms/frame':>9}")
+    for imgsz in args.imgsz:
+        for backend, int8 in [("pytorch", False), ("onnx", False), ("onnx", True)]:
+            config.OBJECT_IMGSZ = imgsz
+            config.OBJECT_INT8 = int8
+            start = time.perf_counter()
+            detector = ObjectDetector(backend)
+            load_time = time.perf_counter() - start
+            if backend == "onnx" and detector.onnx_backend is None:
+                continue
+            name = f"{backend}-int8" if int8 else backend
+            print(f"{name:>12} {imgsz:>6} {load_time:>7.2f} {measure(detector, frames):>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Benchmark thông lượng ObjectDetector.detect_batch theo batch size
+
+Chạy: python -m benchmarks.bench_object_batch --batch-sizes 1 2 4 8 --frames 64
+"""
+import argparse
+import time
+import numpy as np
+from src.object_detection import ObjectDetector
+
+def make_frames(count, width, height, seed=0):
+    """Sinh frame ngẫu nhiên (chỉ đo chi phí suy luận, không đo độ chính xác)"""
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YOLO theo batch size")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    detector = ObjectDetector()
+    frames = make_frames(args.frames, args.width, args.height)
+    # Warm-up để không tính thời gian khởi tạo lần đầu
+    detector.detect_batch(frames[:1])
+
+    print(f"{'batch':>6} {'frames/s':>9} {'ms/frame':>9}")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(frames), batch_size):
+            detector.detect_batch(frames[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>6} {len(frames) / elapsed:>9.1f} {elapsed * 1000 / len(frames):>9.2f}")
+
+if __name__ == "__main__":
+    main()
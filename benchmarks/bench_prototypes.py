@@ -0,0 +1,62 @@
+"""So sánh độ chính xác và chi phí so khớp giữa gallery đầy đủ và gallery prototype
+
+Chạy: python -m benchmarks.bench_prototypes --identities 2000 --images-per-identity 10
+"""
+import argparse
+import time
+import numpy as np
+from src import config
+from src.face_gallery import FaceGallery
+from utils.vector_utils import compute_prototypes
+from benchmarks.synthetic import make_identities, make_queries
+
+def build_gallery(encodings, labels, k):
+    """Tạo gallery, k=0 giữ toàn bộ encoding"""
+    gallery = FaceGallery(capacity=len(encodings), index_backend="exact")
+    for label in np.unique(labels):
+        user_encodings = encodings[labels == label]
+        if k:
+            user_encodings = compute_prototypes(user_encodings, k)
+        gallery.add(int(label), str(label), user_encodings)
+    return gallery
+
+def evaluate(gallery, queries, query_labels, impostors, tolerance, batch_size):
+    """Trả về (tỉ lệ nhận đúng, tỉ lệ nhận nhầm người lạ, ms/khuôn mặt)"""
+    start = time.perf_counter()
+    ids = []
+    for i in range(0, len(queries), batch_size):
+        batch_ids, _ = gallery.match(queries[i:i + batch_size], tolerance)
+        ids.extend(batch_ids)
+    elapsed = time.perf_counter() - start
+    accuracy = np.mean([user_id == label for user_id, label in zip(ids, query_labels)])
+
+    impostor_ids, _ = gallery.match(impostors, tolerance)
+    false_accept = np.mean([user_id is not None for user_id in impostor_ids])
+    return accuracy, false_accept, elapsed * 1000 / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark nén gallery thành prototype")
+    parser.add_argument("--identities", type=int, default=2000)
+    parser.add_argument("--images-per-identity", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=config.FACE_MATCH_TOLERANCE)
+    parser.add_argument("--k", type=int, nargs="+", default=[0, 1, 3])
+    args = parser.parse_args()
+
+    # Người lạ: identity không có trong gallery, sinh cùng phân phối
+    encodings, labels = make_identities(2 * args.identities, args.images_per_identity)
+    enrolled = labels < args.identities
+    queries, query_labels = make_queries(encodings[enrolled], labels[enrolled], args.queries)
+    impostors, _ = make_queries(encodings[~enrolled], labels[~enrolled], args.queries)
+
+    print(f"{'gallery':>10} {'rows':>8} {'accuracy':>9} {'false acc':>10} {'ms/face':>8}")
+    for k in args.k:
+        gallery = build_gallery(encodings[enrolled], labels[enrolled], k)
+        accuracy, false_accept, ms = evaluate(gallery, queries, query_labels, impostors,
+                                              args.tolerance, args.batch_size)
+        name = "full" if not k else f"k={k}"
+        print(f"{name:>10} {len(gallery):>8} {accuracy:>9.3f} {false_accept:>10.3f} {ms:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""So sánh độ trễ đăng ký và tra cứu giữa metadata.json và SQLite
+
+Chạy: python -m benchmarks.bench_storage --users 10000 100000
+"""
+import os
+import argparse
+import tempfile
+import time
+import numpy as np
+from src.storage import JsonMetadataStore, SqliteMetadataStore
+
+def make_user(i):
+    """Metadata giả lập của một người dùng"""
+    return {
+        "name": f"person_{i:06d}",
+        "created_at": "20240101_000000",
+        "images": [f"data/known_faces/user_{i:06d}/{j}.jpg" for j in range(3)],
+        "additional_info": {"age": str(20 + i % 50)}
+    }
+
+def open_store(backend, directory):
+    if backend == "json":
+        return JsonMetadataStore(os.path.join(directory, "metadata.json"))
+    return SqliteMetadataStore(os.path.join(directory, "metadata.db"))
+
+def measure(func, args_list):
+    """Trả về thời gian trung bình (ms) của func trên từng tham số"""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) * 1000 / len(args_list)
+
+def run(backend, users, enrolls, lookups, seed):
+    """Trả về (ms/đăng ký, ms/get_user, ms/tìm theo tên, ms/mở store)"""
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        store = open_store(backend, directory)
+        with store.batch():
+            for i in range(users):
+                store.add_user(f"user_{i:06d}", make_user(i))
+        store.close()
+
+        start = time.perf_counter()
+        store = open_store(backend, directory)
+        open_ms = (time.perf_counter() - start) * 1000
+
+        ids = rng.integers(0, users, lookups)
+        get_ms = measure(store.get_user, [(f"user_{i:06d}",) for i in ids])
+        find_ms = measure(store.find_users_by_name, [(f"person_{i:06d}",) for i in ids])
+        enroll_ms = measure(store.add_user, [(f"user_new_{i:06d}", make_user(users + i)) for i in range(enrolls)])
+        store.close()
+    return enroll_ms, get_ms, find_ms, open_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend lưu metadata")
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=["json", "sqlite"])
+    parser.add_argument("--enrolls", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'users':>8} {'enroll ms':>10} {'get ms':>8} {'find ms':>8} {'open ms':>8}")
+    for users in args.users:
+        for backend in args.backends:
+            enroll_ms, get_ms, find_ms, open_ms = run(backend, users, args.enrolls, args.lookups, args.seed)
+            print(f"{backend:>8} {users:>8} {enroll_ms:>10.3f} {get_ms:>8.4f} {find_ms:>8.4f} {open_ms:>8.1f}")
+
+if __name__ == "__main__":
+    main()
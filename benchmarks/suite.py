@@ -0,0 +1,323 @@
+"""Bộ benchmark tái lập được cho toàn bộ pipeline nhận diện, chạy offline trên CPU
+
+Đo: thời gian load gallery (DataManager.get_all_faces) theo số người, độ trễ từng frame của
+luồng khuôn mặt (resize, cvtColor, detect, encode, match), chi phí so khớp theo N,
+ObjectDetector.detect_objects ms/frame và thông lượng đăng ký. Kết quả ghi ra JSON và có thể
+so sánh với một baseline đã lưu (thoát với mã 1 nếu có hồi quy).
+
+Chạy: python -m benchmarks.suite --quick --baseline benchmarks/baseline.json
+      python -m benchmarks.suite --quick --update-baseline benchmarks/baseline.json
+
+benchmarks/baseline.json được tạo bằng lệnh thứ hai (chế độ --quick) và phụ thuộc máy đo
+(xem mục "environment"). Baseline chỉ được ghi khi mọi benchmark đều chạy được (cài đủ
+face_recognition, ultralytics và có ảnh mẫu); --allow-partial-baseline bỏ qua kiểm tra này và
+benchmark thiếu nằm trong mục "skipped". Khi so sánh, metric có trong baseline mà lần chạy này
+không đo được là lỗi, còn benchmark baseline không có số liệu được cảnh báo.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import cv2
+from src import config
+from src.face_gallery import FaceGallery
+from benchmarks.synthetic import make_identities, make_queries
+
+# Metric có hậu tố này càng lớn càng tốt, còn lại (thời gian) càng nhỏ càng tốt
+HIGHER_IS_BETTER = ("_per_s", "_recall")
+
+FULL_DEFAULTS = {"sizes": [1000, 10000, 100000], "queries": 400, "frames": 30, "enroll_users": 2000}
+QUICK_DEFAULTS = {"sizes": [1000, 10000], "queries": 100, "frames": 10, "enroll_users": 200}
+
+
+def timed(func, repeat):
+    """Trung vị thời gian (giây) của repeat lần gọi func"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def bench_match(args):
+    """Chi phí gallery.match theo kích thước gallery và backend chỉ mục"""
+    results = {}
+    for size in args.sizes:
+        encodings, labels = make_identities(size, 1, seed=args.seed)
+        queries, _ = make_queries(encodings, labels, args.queries, seed=args.seed + 1)
+        for backend in ("exact", "ivf"):
+            gallery = FaceGallery(capacity=size, index_backend=backend)
+            for label, encoding in zip(labels, encodings):
+                gallery.add(int(label), str(label), encoding)
+            gallery.match(queries[:4])  # train chỉ mục IVF trước khi đo
+            batches = [queries[i:i + 4] for i in range(0, len(queries), 4)]
+            seconds = timed(lambda: [gallery.match(batch) for batch in batches], args.repeat)
+            results[f"match/{backend}/n={size}/ms_per_face"] = seconds * 1000 / len(queries)
+    return results
+
+
+def _fill_data_dir(data_dir, size, seed):
+    """Tạo dữ liệu người dùng giả lập với encoding đã có sẵn trong cache (ảnh 1x1 px)"""
+    from src.storage import open_storage
+    store, encoding_cache = open_storage(config.STORAGE_BACKEND, data_dir)
+    encodings, _ = make_identities(size, 1, seed=seed)
+    image = np.zeros((1, 1, 3), dtype=np.uint8)
+    with store.batch():
+        for i, encoding in enumerate(encodings):
+            user_dir = os.path.join(data_dir, "known_faces", f"user_{i:06d}")
+            os.makedirs(user_dir, exist_ok=True)
+            image_path = os.path.join(user_dir, "0.jpg")
+            cv2.imwrite(image_path, image)
+            store.add_user(f"user_{i:06d}", {"name": f"person_{i}", "created_at": "0",
+                                              "images": [image_path], "additional_info": {}})
+            encoding_cache.put(image_path, encoding)
+    encoding_cache.save()
+    store.close()
+
+
+def bench_gallery_load(args):
+    """Thời gian DataManager.get_all_faces với cache đã đầy, theo số người dùng"""
+    from src.data_manager import DataManager
+    results = {}
+    for size in args.sizes:
+        data_dir = tempfile.mkdtemp(prefix="bench_gallery_")
+        try:
+            _fill_data_dir(data_dir, size, args.seed)
+            data_manager = DataManager(data_dir=data_dir)
+            seconds = timed(data_manager.get_all_faces, args.repeat)
+            results[f"gallery_load/n={size}/ms"] = seconds * 1000
+            data_manager.store.close()
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def bench_face_path(args):
+    """Độ trễ từng bước của luồng khuôn mặt trong FaceRecognitionApp trên ảnh mẫu"""
+    import face_recognition
+    from src.face_detectors import create_face_detector
+    from benchmarks.bench_face_detectors import load_images
+    images_dir = os.path.join(config.BASE_DIR, args.images)  # đường dẫn tuyệt đối được giữ nguyên
+    images = load_images(images_dir, args.frames)
+    if not images:
+        raise RuntimeError(f"Không có ảnh mẫu trong {images_dir}")
+
+    # Ảnh mẫu được đưa về kích thước frame camera rồi đi qua đúng các bước của recognize_faces
+    frames = [cv2.cvtColor(cv2.resize(image, (args.width, args.height)), cv2.COLOR_RGB2BGR)
+              for image in images]
+    detector = create_face_detector()
+    encodings, labels = make_identities(args.sizes[-1], 1, seed=args.seed)
+    gallery = FaceGallery(capacity=len(encodings))
+    for label, encoding in zip(labels, encodings):
+        gallery.add(int(label), str(label), encoding)
+
+    steps = {"resize": 0.0, "cvtcolor": 0.0, "detect": 0.0, "encode": 0.0, "match": 0.0}
+    found = 0
+    scale = config.FACE_SCALE_MAX
+    for frame in frames:
+        start = time.perf_counter()
+        small = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        t1 = time.perf_counter()
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        t2 = time.perf_counter()
+        locations = detector.detect(rgb)
+        t3 = time.perf_counter()
+        face_encodings = face_recognition.face_encodings(rgb, known_face_locations=locations, model="small")
+        t4 = time.perf_counter()
+        gallery.match(face_encodings)
+        t5 = time.perf_counter()
+        for step, seconds in zip(steps, (t1 - start, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            steps[step] += seconds
+        found += bool(locations)
+
+    results = {f"face_path/{step}/ms": seconds * 1000 / len(frames) for step, seconds in steps.items()}
+    results["face_path/total/ms"] = sum(steps.values()) * 1000 / len(frames)
+    results["face_path/detect_recall"] = found / len(frames)
+    return results
+
+
+def bench_objects(args):
+    """ObjectDetector.detect_objects ms/frame trên frame ngẫu nhiên"""
+    from benchmarks.bench_object_batch import make_frames
+    from src.object_detection import ObjectDetector
+    detector = ObjectDetector()
+    frames = make_frames(args.frames, args.width, args.height, seed=args.seed)
+    detector.detect_objects(frames[0].copy())
+    seconds = timed(lambda: [detector.detect_objects(frame.copy()) for frame in frames], args.repeat)
+    return {f"objects/{detector.backend}/ms_per_frame": seconds * 1000 / len(frames)}
+
+
+def bench_enroll(args):
+    """Thông lượng đăng ký hàng loạt (sao chép ảnh, cache encoding, ghi metadata)"""
+    from src.data_manager import DataManager
+    data_dir = tempfile.mkdtemp(prefix="bench_enroll_")
+    try:
+        source = os.path.join(data_dir, "source.jpg")
+        cv2.imwrite(source, np.zeros((64, 64, 3), dtype=np.uint8))
+        encodings, _ = make_identities(args.enroll_users, 1, seed=args.seed)
+        people = [(f"person_{i}", [(source, encoding)]) for i, encoding in enumerate(encodings)]
+        data_manager = DataManager(data_dir=data_dir)
+        data_manager.load_gallery()
+        start = time.perf_counter()
+        data_manager.add_users_bulk(people)
+        bulk_seconds = time.perf_counter() - start
+
+        frame = np.zeros((64, 64, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        for i in range(args.enroll_single):
+            data_manager.add_face(frame, f"single_{i}", encoding=encodings[i % len(encodings)])
+        single_seconds = time.perf_counter() - start
+        data_manager.store.close()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return {
+        "enroll/bulk/users_per_s": len(people) / bulk_seconds,
+        "enroll/single/ms": single_seconds * 1000 / args.enroll_single
+    }
+
+
+BENCHMARKS = {
+    "match": bench_match,
+    "gallery_load": bench_gallery_load,
+    "face_path": bench_face_path,
+    "objects": bench_objects,
+    "enroll": bench_enroll,
+}
+
+
+def environment():
+    """Thông tin máy và thư viện để đối chiếu kết quả giữa các lần chạy"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "face_index": config.FACE_INDEX_BACKEND,
+        "face_detector": config.FACE_DETECTOR,
+        "storage": config.STORAGE_BACKEND,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def portable_args(args):
+    """Tham số của lần chạy với đường dẫn trong repo ghi dạng tương đối (baseline không phụ thuộc máy)"""
+    portable = {}
+    for name, value in vars(args).items():
+        if isinstance(value, str) and os.path.isabs(value) and \
+                os.path.commonpath([value, config.BASE_DIR]) == config.BASE_DIR:
+            value = os.path.relpath(value, config.BASE_DIR)
+        portable[name] = value
+    return portable
+
+
+def compare(results, baseline, tolerance, benchmarks=None):
+    """So sánh với baseline
+
+    Trả về (hồi quy, thiếu): danh sách (metric, baseline, hiện tại, tỉ lệ thay đổi) bị hồi quy và
+    các metric của baseline thuộc benchmark đã chạy nhưng không có trong kết quả lần này.
+    """
+    regressions = []
+    missing = []
+    for metric, previous in baseline.get("results", {}).items():
+        current = results.get(metric)
+        if current is None:
+            if benchmarks is None or metric.split("/", 1)[0] in benchmarks:
+                missing.append(metric)
+            continue
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        if metric.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append((metric, previous, current, change))
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bộ benchmark pipeline nhận diện")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        help="Số người trong gallery (mặc định 1000 10000 100000)")
+    parser.add_argument("--queries", type=int)
+    parser.add_argument("--frames", type=int)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--enroll-users", type=int)
+    parser.add_argument("--enroll-single", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="Lấy trung vị của N lần chạy")
+    parser.add_argument("--threads", type=int, default=1, help="Số luồng OpenCV (cố định để tái lập)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true",
+                        help="Kích thước nhỏ để chạy nhanh (chỉ cho các tham số không truyền vào)")
+    parser.add_argument("--output", help="File JSON kết quả (mặc định: stdout)")
+    parser.add_argument("--baseline", help="File JSON baseline để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Tỉ lệ chậm hơn baseline được chấp nhận")
+    parser.add_argument("--update-baseline", metavar="PATH", help="Ghi kết quả làm baseline mới")
+    parser.add_argument("--allow-partial-baseline", action="store_true",
+                        help="Cho phép ghi baseline khi có benchmark bị bỏ qua")
+    parser.add_argument("--images", default=os.path.join("data", "known_faces"),
+                        help="Thư mục ảnh mẫu cho luồng khuôn mặt (tương đối so với thư mục repo)")
+    args = parser.parse_args()
+    # Giá trị truyền tường minh luôn được giữ, --quick chỉ đổi giá trị mặc định
+    defaults = QUICK_DEFAULTS if args.quick else FULL_DEFAULTS
+    for name, value in defaults.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
+    cv2.setNumThreads(args.threads)
+    results = {}
+    skipped = {}
+    for name in args.only:
+        print(f"Đang chạy {name}...", file=sys.stderr)
+        try:
+            results.update(BENCHMARKS[name](args))
+        except (ImportError, RuntimeError, OSError) as e:
+            # Thiếu thư viện hoặc dữ liệu mẫu: ghi nhận và chạy tiếp các benchmark khác
+            skipped[name] = str(e)
+            print(f"Bỏ qua {name}: {str(e)}", file=sys.stderr)
+
+    report = {"environment": environment(), "args": portable_args(args), "results": results, "skipped": skipped}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.update_baseline and skipped and not args.allow_partial_baseline:
+        print(f"KHÔNG ghi baseline: các benchmark {', '.join(skipped)} bị bỏ qua nên baseline sẽ không "
+              f"phát hiện được hồi quy của chúng (cài đủ thư viện hoặc dùng --allow-partial-baseline)",
+              file=sys.stderr)
+        sys.exit(1)
+    if args.update_baseline:
+        with open(args.update_baseline, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for name, reason in baseline.get("skipped", {}).items():
+            if name in args.only:
+                print(f"CẢNH BÁO: baseline không có số liệu cho {name} ({reason}), "
+                      f"không phát hiện được hồi quy của phần này", file=sys.stderr)
+        regressions, missing = compare(results, baseline, args.tolerance, args.only)
+        for metric, previous, current, change in regressions:
+            print(f"HỒI QUY {metric}: {previous:.4g} -> {current:.4g} ({change:+.0%})", file=sys.stderr)
+        for metric in missing:
+            print(f"THIẾU {metric}: có trong baseline nhưng lần chạy này không đo được", file=sys.stderr)
+        if regressions or missing:
+            sys.exit(1)
+        print(f"Không có hồi quy so với {args.baseline} (ngưỡng {args.tolerance:.0%})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import numpy as np
+
+# Thông số mô phỏng encoding của face_recognition: khoảng cách giữa hai người
+# khác nhau ~0.9, giữa hai ảnh của cùng một người ~0.35
+CENTER_STD = 0.056
+SAMPLE_STD = 0.022
+
+def make_identities(num_identities, images_per_identity, dim=128, seed=0):
+    """Sinh encoding giả lập, trả về (encodings (N, dim) float32, nhãn identity (N,))"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, CENTER_STD, size=(num_identities, dim)).astype(np.float32)
+    labels = np.repeat(np.arange(num_identities), images_per_identity)
+    noise = rng.normal(0, SAMPLE_STD, size=(len(labels), dim)).astype(np.float32)
+    return centers[labels] + noise, labels
+
+def make_queries(encodings, labels, num_queries, seed=1):
+    """Sinh ảnh truy vấn mới của các identity đã có, trả về (queries, nhãn đúng)"""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(encodings), num_queries)
+    noise = rng.normal(0, SAMPLE_STD, size=(num_queries, encodings.shape[1])).astype(np.float32)
+    return encodings[picks] + noise, labels[picks]
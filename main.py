@@ -1,8 +1,50 @@
+import argparse
 import cv2
-from src.face_recognition_app import FaceRecognitionApp
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ứng dụng nhận diện khuôn mặt và đồ vật")
+    parser.add_argument("--source", help="Chạy không giao diện trên file video, URL stream hoặc thư mục ảnh")
+    parser.add_argument("--output", help="File JSON lines để ghi kết quả (mặc định: stdout)")
+    parser.add_argument("--workers", type=int, help="Số worker process (mặc định: số CPU)")
+    parser.add_argument("--scale", type=float, help="Tỉ lệ thu nhỏ frame trước khi phát hiện khuôn mặt")
+    parser.add_argument("--no-objects", action="store_true", help="Tắt nhận diện đồ vật")
+    parser.add_argument("--enroll-dir",
+                        help="Đăng ký hàng loạt từ thư mục dạng <tên người>/*.jpg")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Encode lại song song các ảnh chưa có trong cache (tiếp tục được nếu bị ngắt)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Mở endpoint Prometheus tại http://127.0.0.1:<port>/metrics")
+    parser.add_argument("--cameras", nargs="+",
+                        help="Chạy nhiều camera (chỉ số thiết bị hoặc URL) với backend suy luận dùng chung")
+    return parser.parse_args()
 
 def main():
-    app = FaceRecognitionApp()
+    args = parse_args()
+    
+    if args.enroll_dir:
+        from src.bulk_enroll import bulk_enroll
+        from src.data_manager import DataManager
+        bulk_enroll(args.enroll_dir, DataManager(), args.workers)
+        return
+    
+    if args.rebuild:
+        from src.data_manager import DataManager
+        DataManager().rebuild_gallery(args.workers)
+        return
+    
+    if args.source:
+        from src.batch_runner import run_batch
+        run_batch(args.source, args.output, args.workers, not args.no_objects, args.scale)
+        return
+    
+    if args.cameras:
+        from src.multi_camera import MultiCameraApp
+        sources = [int(source) if source.isdigit() else source for source in args.cameras]
+        MultiCameraApp(sources).run()
+        return
+    
+    from src.face_recognition_app import FaceRecognitionApp
+    app = FaceRecognitionApp(metrics_port=args.metrics_port)
     try:
         app.run()
     except KeyboardInterrupt:
@@ -13,4 +55,4 @@ def main():
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,170 @@
+import os
+import sys
+import math
+import json
+import time
+from collections import deque
+from multiprocessing import Pool
+import cv2
+import numpy as np
+import face_recognition
+from src import config
+from src.face_detectors import create_face_detector
+from src.face_gallery import FaceGallery
+from src.gallery_file import load_gallery_file
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+# Trạng thái riêng của từng worker process (khởi tạo một lần trong _init_worker)
+_worker = {}
+
+
+def _init_worker(gallery_data, detect_objects, scale, tolerance):
+    """Khởi tạo gallery và model trong worker process
+
+    gallery_data là đường dẫn file gallery (memmap, các worker dùng chung page cache)
+    hoặc bộ (ma trận, user_id từng dòng, tên) khi không dùng file gallery.
+    """
+    # Mỗi process chỉ dùng một luồng để các worker không tranh CPU của nhau
+    cv2.setNumThreads(1)
+
+    if isinstance(gallery_data, str):
+        gallery = load_gallery_file(gallery_data)
+        if gallery is None:
+            # Process chính đã kiểm tra file trước khi tạo pool, file bị thay/xóa giữa chừng
+            raise RuntimeError(f"Không thể mở file gallery {gallery_data} (thiếu, bị cắt hoặc sai phiên bản)")
+    else:
+        matrix, row_users, names = gallery_data
+        user_rows = {}
+        for row, user_id in enumerate(row_users):
+            user_rows.setdefault(user_id, []).append(row)
+        gallery = FaceGallery(capacity=max(1, len(matrix)))
+        for user_id, name in names.items():
+            gallery.add(user_id, name, matrix[user_rows.get(user_id, [])])
+
+    object_detector = None
+    if detect_objects:
+        import torch
+        from src.object_detection import ObjectDetector
+        torch.set_num_threads(1)
+        object_detector = ObjectDetector()
+
+    _worker.update(gallery=gallery, object_detector=object_detector, face_detector=create_face_detector(),
+                   scale=scale, tolerance=tolerance)
+
+
+def _load_item(item):
+    """Lấy frame của một item (frame đã đọc sẵn hoặc đường dẫn ảnh)"""
+    index, source = item
+    if isinstance(source, str):
+        return index, source, cv2.imread(source)
+    return index, None, source
+
+
+def _process_item(item):
+    """Nhận diện khuôn mặt và đồ vật cho một frame, trả về dict kết quả"""
+    index, path, frame = _load_item(item)
+    result = {"frame": index}
+    if path is not None:
+        result["path"] = path
+    if frame is None:
+        result["error"] = "Không thể đọc ảnh"
+        return result
+
+    gallery = _worker["gallery"]
+    scale = _worker["scale"]
+    small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+    face_locations = _worker["face_detector"].detect(rgb_small_frame)
+    faces = []
+    if face_locations:
+        face_encodings = face_recognition.face_encodings(
+            rgb_small_frame,
+            known_face_locations=face_locations,
+            model="small"
+        )
+        user_ids, distances = gallery.match(face_encodings, _worker["tolerance"])
+        for location, user_id, distance in zip(face_locations, user_ids, distances):
+            faces.append({
+                "box": [int(v / scale) for v in location],  # top, right, bottom, left
+                "user_id": user_id,
+                "name": gallery.name_of(user_id) if user_id is not None else None,
+                "distance": round(float(distance), 4) if math.isfinite(distance) else None
+            })
+    result["faces"] = faces
+
+    object_detector = _worker["object_detector"]
+    if object_detector is not None:
+        detections = object_detector.predict(frame)
+        result["objects"] = [
+            {"box": box.tolist(), "class": object_detector.classes[int(cls)], "confidence": round(float(conf), 4)}
+            for box, cls, conf in zip(detections.boxes, detections.classes, detections.scores)
+        ]
+    return result
+
+
+def iter_source(source):
+    """Sinh (index, frame hoặc đường dẫn ảnh) từ thư mục ảnh, file video hoặc URL stream"""
+    if os.path.isdir(source):
+        files = sorted(f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for index, filename in enumerate(files):
+            yield index, os.path.join(source, filename)
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Không thể mở nguồn video: {source}")
+    index = 0
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def run_batch(source, output=None, workers=None, detect_objects=True, scale=None, tolerance=None):
+    """Chạy nhận diện không giao diện trên video/URL/thư mục ảnh, ghi kết quả dạng JSON lines"""
+    from src.data_manager import DataManager
+
+    workers = workers or os.cpu_count() or 1
+    scale = config.FACE_SCALE_MAX if scale is None else scale
+    tolerance = config.FACE_MATCH_TOLERANCE if tolerance is None else tolerance
+
+    # Gallery load một lần ở process chính; worker mở file gallery đã ghi (memmap) thay vì nhận bản sao
+    data_manager = DataManager()
+    gallery = data_manager.load_gallery()
+    # File chỉ được dùng khi mở được và khớp dữ liệu; nếu không thì gửi mảng trong bộ nhớ cho worker
+    gallery_data = data_manager.valid_gallery_file()
+    if gallery_data is None:
+        gallery_data = (np.asarray(gallery.matrix, dtype=np.float32), list(gallery.row_users),
+                        {user_id: gallery.name_of(user_id) for user_id in gallery.user_ids()})
+
+    out = open(output, 'w', encoding='utf-8') if output else sys.stdout
+    start = time.perf_counter()
+    frames = 0
+    try:
+        with Pool(workers, initializer=_init_worker,
+                  initargs=(gallery_data, detect_objects, scale, tolerance)) as pool:
+            # Giới hạn số frame đang xử lý để không đọc hết video vào bộ nhớ; giữ đúng thứ tự
+            pending = deque()
+            for item in iter_source(source):
+                pending.append(pool.apply_async(_process_item, (item,)))
+                if len(pending) >= workers * 4:
+                    out.write(json.dumps(pending.popleft().get(), ensure_ascii=False) + "\n")
+                    frames += 1
+            while pending:
+                out.write(json.dumps(pending.popleft().get(), ensure_ascii=False) + "\n")
+                frames += 1
+    finally:
+        if output:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Đã xử lý {frames} frame trong {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.1f} frame/s)",
+          file=sys.stderr)
+    return frames
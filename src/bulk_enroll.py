@@ -0,0 +1,92 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import face_recognition
+from src.face_detectors import create_face_detector
+from src.face_analysis import analyze_image
+from src.batch_runner import IMAGE_EXTENSIONS
+
+# Detector riêng của từng worker process
+_worker = {}
+
+
+def _init_worker():
+    """Khởi tạo detector trong worker process"""
+    cv2.setNumThreads(1)
+    _worker["face_detector"] = create_face_detector()
+
+
+def encode_face_file(image_path):
+    """Decode, phát hiện và mã hóa một ảnh; trả về (đường dẫn, encoding, lỗi)"""
+    try:
+        image = face_recognition.load_image_file(image_path)
+        face_locations = _worker["face_detector"].detect(image)
+        if not face_locations:
+            return image_path, None, "Không phát hiện khuôn mặt"
+        if len(face_locations) > 1:
+            return image_path, None, f"Có {len(face_locations)} khuôn mặt"
+
+        encoding = analyze_image(image, locations=face_locations).encoding
+        if encoding is None:
+            return image_path, None, "Không thể mã hóa khuôn mặt"
+        return image_path, encoding, None
+    except Exception as e:
+        return image_path, None, f"Lỗi khi xử lý ảnh: {str(e)}"
+
+
+def scan_directory(root_dir):
+    """Duyệt cây thư mục dạng <tên người>/*.jpg, trả về {tên: [đường dẫn ảnh]}"""
+    people = {}
+    for name in sorted(os.listdir(root_dir)):
+        person_dir = os.path.join(root_dir, name)
+        if not os.path.isdir(person_dir):
+            continue
+        images = [os.path.join(person_dir, f) for f in sorted(os.listdir(person_dir))
+                  if f.lower().endswith(IMAGE_EXTENSIONS)]
+        if images:
+            people[name] = images
+    return people
+
+
+def bulk_enroll(root_dir, data_manager, workers=None, chunksize=8):
+    """Đăng ký hàng loạt từ thư mục bằng process pool, metadata chỉ ghi một lần ở cuối"""
+    people = scan_directory(root_dir)
+    owners = {path: name for name, paths in people.items() for path in paths}
+    total = len(owners)
+    print(f"Tìm thấy {total} ảnh của {len(people)} người trong {root_dir}")
+
+    accepted = {}  # tên -> [(đường dẫn, encoding)]
+    failures = []  # (đường dẫn, lỗi)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker) as executor:
+        for done, (image_path, encoding, error) in enumerate(
+                executor.map(encode_face_file, owners, chunksize=chunksize), 1):
+            if error:
+                failures.append((image_path, error))
+            else:
+                accepted.setdefault(owners[image_path], []).append((image_path, encoding))
+            if done % 500 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"Đã xử lý {done}/{total} ảnh ({done / elapsed:.1f} ảnh/s)")
+    encode_time = time.perf_counter() - start
+
+    user_ids = data_manager.add_users_bulk(list(accepted.items()))
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "images": total,
+        "accepted": total - len(failures),
+        "rejected": len(failures),
+        "users": len(user_ids),
+        "seconds": round(elapsed, 2),
+        "images_per_second": round(total / max(encode_time, 1e-9), 1),
+        "failures": failures
+    }
+    print(f"Đã đăng ký {summary['users']} người từ {summary['accepted']}/{total} ảnh "
+          f"trong {elapsed:.1f}s ({summary['images_per_second']} ảnh/s), bỏ qua {len(failures)} ảnh")
+    for image_path, error in failures[:20]:
+        print(f"- {image_path}: {error}")
+    if len(failures) > 20:
+        print(f"... và {len(failures) - 20} ảnh khác")
+    return summary
@@ -0,0 +1,84 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class CommandWorker:
+    """Chạy lần lượt các lệnh quản trị (nhập liệu, thêm/xóa người dùng, training) trên một luồng nền"""
+
+    def __init__(self, name="commands"):
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._current = None  # tên lệnh đang chạy
+        self._waiting = []  # tên các lệnh đang xếp hàng
+        self._thread = None
+
+    def start(self):
+        """Khởi động luồng xử lý lệnh (daemon: lệnh đang chờ input() không giữ tiến trình khi thoát)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, name, func, *args, **kwargs):
+        """Xếp lệnh vào hàng đợi, trả về Future của kết quả"""
+        future = Future()
+        with self._lock:
+            self._waiting.append(name)
+        self._queue.put((name, future, func, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            name, future, func, args, kwargs = item
+            with self._lock:
+                self._waiting.remove(name)
+                self._current = name
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except Exception as e:
+                    print(f"Lỗi khi chạy lệnh '{name}': {str(e)}")
+                    future.set_exception(e)
+            with self._lock:
+                self._current = None
+
+    @property
+    def busy(self):
+        """Có lệnh đang chạy hoặc đang xếp hàng"""
+        with self._lock:
+            return self._current is not None or bool(self._waiting)
+
+    def status_text(self):
+        """Mô tả ngắn lệnh đang chạy/xếp hàng, chuỗi rỗng khi rảnh"""
+        with self._lock:
+            if self._current is None and not self._waiting:
+                return ""
+            text = f"lệnh {self._current}" if self._current is not None else "lệnh"
+            if self._waiting:
+                text += f" (chờ: {', '.join(self._waiting)})"
+            return text
+
+    def stop(self, timeout=None):
+        """Hủy các lệnh chưa chạy và dừng luồng sau lệnh hiện tại, trả về False nếu lệnh vẫn chạy sau timeout"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                name, future = item[0], item[1]
+                future.cancel()
+                with self._lock:
+                    self._waiting.remove(name)
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return False
+            self._thread = None
+        return True
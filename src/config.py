@@ -0,0 +1,85 @@
+import os
+
+# Cấu hình chung của ứng dụng
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Ngưỡng khoảng cách Euclidean để coi là cùng một người (thấp hơn = nghiêm ngặt hơn)
+FACE_MATCH_TOLERANCE = 0.4
+
+# Backend chỉ mục tìm kiếm khuôn mặt: "exact" (brute-force) hoặc "ivf" (xấp xỉ, cho gallery lớn)
+FACE_INDEX_BACKEND = "exact"
+FACE_INDEX_OPTIONS = {}  # ví dụ {"nprobe": 8} cho "ivf"
+
+# Số prototype cho mỗi người dùng trong gallery (0 = giữ mọi encoding, 1 = trung bình)
+FACE_PROTOTYPES = 0
+
+# Số frame tối đa chờ giữa các stage của pipeline (đầy thì bỏ frame cũ nhất)
+PIPELINE_QUEUE_SIZE = 2
+
+# Theo dõi khuôn mặt giữa các frame: chỉ mã hóa track mới hoặc mỗi N frame của một track
+TRACKER_IOU_THRESHOLD = 0.3
+TRACKER_MAX_MISSED = 5  # số frame liên tiếp mất dấu trước khi xóa track
+TRACKER_REENCODE_INTERVAL = 15
+TRACKER_VOTE_WINDOW = 7  # số lần so khớp gần nhất dùng để bỏ phiếu danh tính
+
+# Bộ lập lịch thích ứng: giữ FPS mục tiêu bằng cách đổi chu kỳ phát hiện và độ phân giải
+TARGET_FPS = 15
+FACE_SCALE_MAX = 0.25  # tỉ lệ thu nhỏ mặc định trước khi phát hiện khuôn mặt
+FACE_SCALE_MIN = 0.15
+FACE_INTERVAL_MAX = 5
+OBJECT_INTERVAL_MAX = 10
+SCHEDULER_ADJUST_EVERY = 15  # số frame giữa hai lần điều chỉnh
+
+# Backend suy luận của ObjectDetector: "pytorch" hoặc "onnx" (export tự động, chạy bằng onnxruntime)
+OBJECT_BACKEND = "pytorch"
+OBJECT_IMGSZ = 640  # kích thước ảnh đầu vào của YOLO
+OBJECT_INT8 = False  # lượng tử hóa INT8 cho backend ONNX
+# Provider của onnxruntime, ví dụ ["OpenVINOExecutionProvider", "CPUExecutionProvider"]
+OBJECT_ONNX_PROVIDERS = ["CPUExecutionProvider"]
+
+# Phát hiện chuyển động để bỏ qua detector trên cảnh tĩnh
+MOTION_GATE_ENABLED = True
+MOTION_WIDTH = 160  # chiều rộng frame thu nhỏ dùng để so sánh
+MOTION_THRESHOLD = 25  # ngưỡng chênh lệch mức xám của một điểm ảnh
+MOTION_MIN_AREA = 0.002  # diện tích vùng thay đổi tối thiểu (tỉ lệ so với frame)
+MOTION_LEARNING_RATE = 0.05  # tốc độ cập nhật nền
+MOTION_ROI_MARGIN = 40  # số pixel nới thêm quanh vùng thay đổi
+MOTION_FULL_FRAME_RATIO = 0.6  # vùng thay đổi lớn hơn tỉ lệ này thì quét cả frame
+
+# Backend phát hiện khuôn mặt: "hog" (dlib), "yunet" (OpenCV DNN) hoặc "haar" (OpenCV cascade)
+FACE_DETECTOR = "hog"
+YUNET_MODEL_PATH = os.path.join(BASE_DIR, "data", "models", "face_detection_yunet_2023mar.onnx")
+
+# Nơi lưu metadata người dùng: "json" (metadata.json) hoặc "sqlite" (metadata.db, tự chuyển đổi từ JSON)
+STORAGE_BACKEND = "json"
+
+# Rebuild encoding song song: số ảnh thiếu tối thiểu để dùng process pool khi load gallery,
+# và số ảnh giữa hai lần checkpoint cache
+REBUILD_PARALLEL_MIN = 32
+REBUILD_CHECKPOINT_EVERY = 200
+
+# Đo thời gian từng stage (p50/p95/p99 trên cửa sổ trượt)
+METRICS_ENABLED = False
+METRICS_WINDOW = 512  # số mẫu gần nhất của mỗi stage
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 0  # 0 = không mở HTTP endpoint; --metrics-port để bật
+
+# Dùng lại buffer frame giữa các vòng lặp (camera.read(image=...)) thay vì cấp phát mới mỗi frame
+FRAME_POOL_ENABLED = True
+
+# File gallery nhị phân (data/gallery.fgal) mở bằng memmap; "float16" giảm một nửa dung lượng
+GALLERY_FILE_ENABLED = True
+GALLERY_FILE_DTYPE = "float32"
+
+# Training YOLO chạy ở process riêng; model mới chỉ được thay vào detector khi không kém
+# hoặc chậm hơn model đang dùng trên tập val
+TRAIN_IMGSZ = 640
+TRAIN_BATCH = 16
+TRAIN_WORKERS = 2  # số worker nạp dữ liệu của ultralytics
+TRAIN_PATIENCE = 10
+TRAIN_BASE_WEIGHTS = "yolov8n.pt"
+TRAIN_VAL_EVERY = 5  # cứ N ảnh chụp thì một ảnh vào tập val
+TRAIN_MAX_SLOWDOWN = 1.2  # model mới chậm hơn quá tỉ lệ này thì giữ model cũ
+TRAIN_MAP_TOLERANCE = 0.0  # mAP50-95 của model mới được phép thấp hơn model cũ tối đa bấy nhiêu
+TRAIN_LATENCY_SAMPLES = 20  # số ảnh val dùng để đo độ trễ predict
@@ -1,41 +1,144 @@
 import os
 import cv2
-import face_recognition
 import json
+import shutil
+import hashlib
+import functools
+import threading
+import numpy as np
 from datetime import datetime
+from src.storage import open_storage
+from src import config
+from src.face_gallery import FaceGallery
+from src.gallery_file import save_gallery_file, load_gallery_file
+from src.face_detectors import create_face_detector
+from src.face_analysis import analyze_image
+from src import gallery_rebuild
+from utils.vector_utils import compute_prototypes
+
+def _locked(method):
+    """Chạy method trong lock của DataManager"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class DataManager:
-    def __init__(self):
+    def __init__(self, prototypes=None, storage=None, data_dir=None):
         self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.data_dir = os.path.join(self.base_dir, "data")
+        self.data_dir = data_dir or os.path.join(self.base_dir, "data")
         self.known_faces_dir = os.path.join(self.data_dir, "known_faces")
         self.training_data_dir = os.path.join(self.data_dir, "training_data")
-        self.metadata_file = os.path.join(self.data_dir, "metadata.json")
         
         # Tạo các thư mục cần thiết
         self._create_directories()
         
-        # Load metadata
-        self.metadata = self._load_metadata()
+        # Store metadata và cache encoding (JSON hoặc SQLite, tự chuyển đổi từ JSON)
+        self.storage = storage or config.STORAGE_BACKEND
+        self.store, self.encoding_cache = open_storage(self.storage, self.data_dir)
+        
+        # Detector dùng cho đăng ký và load ảnh (chạy trên luồng gọi DataManager)
+        self.face_detector = create_face_detector()
+        
+        # Số prototype mỗi người dùng (0 = dùng toàn bộ encoding)
+        self.prototypes = config.FACE_PROTOTYPES if prototypes is None else prototypes
+        
+        # Gallery trong bộ nhớ, chỉ được build lần đầu bởi load_gallery()
+        self.gallery = FaceGallery()
+        self._gallery_loaded = False
+        # Bản chụp gallery dạng nhị phân, mở bằng memmap ở lần chạy sau nếu dữ liệu không đổi
+        self.gallery_file = os.path.join(self.data_dir, "gallery.fgal")
+        
+        # Job rebuild chạy ở luồng nền cùng lúc với các thao tác quản trị trên cache/store
+        self.lock = threading.RLock()
         
     def _create_directories(self):
         """Tạo cấu trúc thư mục cần thiết"""
         os.makedirs(self.known_faces_dir, exist_ok=True)
         os.makedirs(self.training_data_dir, exist_ok=True)
         
-    def _load_metadata(self):
-        """Load metadata từ file JSON"""
-        if os.path.exists(self.metadata_file):
-            with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {"users": {}}
-    
-    def _save_metadata(self):
-        """Lưu metadata vào file JSON"""
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=4)
+    def analyze_face(self, rgb_image, max_faces=None):
+        """Phát hiện, lấy landmark và mã hóa khuôn mặt trong một lượt (detector của DataManager)"""
+        return analyze_image(rgb_image, self.face_detector, max_faces=max_faces)
+    
+    def _encode_image(self, image_path):
+        """Tính encoding cho khuôn mặt đầu tiên trong ảnh (None nếu không có)"""
+        import face_recognition
+        
+        # Load ảnh và chỉ mã hóa khuôn mặt đầu tiên
+        image = face_recognition.load_image_file(image_path)
+        return self.analyze_face(image, max_faces=1).encoding
+    
+    def _get_encoding(self, image_path):
+        """Lấy encoding từ cache, chỉ encode lại khi ảnh mới hoặc đã thay đổi"""
+        found, encoding = self.encoding_cache.lookup(image_path)
+        if not found:
+            encoding = self._encode_image(image_path)
+            self.encoding_cache.put(image_path, encoding)
+        return encoding
+    
+    def _cache_encoding(self, image_path, encoding=None):
+        """Lưu encoding của ảnh vừa đăng ký vào cache và trả về encoding"""
+        try:
+            if encoding is None:
+                encoding = self._encode_image(image_path)
+            self.encoding_cache.put(image_path, encoding)
+            return encoding
+        except Exception as e:
+            print(f"Lỗi khi mã hóa ảnh {image_path}: {str(e)}")
+            return None
+    
+    def _load_user_encodings(self, user_data):
+        """Lấy encoding cho tất cả ảnh của một người dùng"""
+        encodings = []
+        for image_path in user_data["images"]:
+            if os.path.exists(image_path):
+                try:
+                    encoding = self._get_encoding(image_path)
+                    
+                    if encoding is not None:
+                        encodings.append(encoding)
+                        
+                except Exception as e:
+                    print(f"Lỗi khi xử lý ảnh {image_path}: {str(e)}")
+                    continue
+        return encodings
+    
+    def _user_gallery_encodings(self, user_id, user_data):
+        """Encoding của người dùng đưa vào gallery (toàn bộ hoặc prototype đã nén)"""
+        encodings = self._load_user_encodings(user_data)
+        if not self.prototypes or not encodings:
+            return encodings
+        
+        # Prototype được lưu trong cache, chỉ tính lại khi tập ảnh thay đổi
+        key = self.encoding_cache.prototype_key(user_data["images"], self.prototypes)
+        prototypes = self.encoding_cache.get_prototypes(user_id, key)
+        if prototypes is None:
+            prototypes = compute_prototypes(encodings, self.prototypes)
+            self.encoding_cache.put_prototypes(user_id, key, prototypes)
+        return prototypes
+    
+    def _gallery_add(self, user_id, encodings):
+        """Thêm encoding của một người dùng vào gallery trong bộ nhớ"""
+        if not self._gallery_loaded:
+            return
+        user_data = self.store.get_user(user_id)
+        if self.prototypes:
+            # Tính lại prototype từ các ảnh của riêng người dùng này
+            self.gallery.remove(user_id)
+            encodings = self._user_gallery_encodings(user_id, user_data)
+        self.gallery.add(user_id, user_data["name"], encodings)
+    
+    def _gallery_remove(self, user_id):
+        """Xóa một người dùng khỏi gallery trong bộ nhớ"""
+        self.encoding_cache.remove_prototypes(user_id)
+        if self._gallery_loaded:
+            self.gallery.remove(user_id)
             
-    def add_face(self, frame, name, additional_info=None):
+    @_locked
+    def add_face(self, frame, name, additional_info=None, encoding=None):
         """Thêm khuôn mặt mới vào cơ sở dữ liệu"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         user_id = f"user_{timestamp}"
@@ -49,68 +152,151 @@ class DataManager:
         cv2.imwrite(image_path, frame)
         
         # Cập nhật metadata
-        self.metadata["users"][user_id] = {
+        self.store.add_user(user_id, {
             "name": name,
             "created_at": timestamp,
             "images": [image_path],
             "additional_info": additional_info or {}
-        }
+        })
         
-        self._save_metadata()
+        encoding = self._cache_encoding(image_path, encoding)
+        self._gallery_add(user_id, [encoding] if encoding is not None else [])
+        # Chỉ nối encoding mới vào journal, không ghi lại toàn bộ cache
+        self.encoding_cache.checkpoint()
         return user_id
     
-    def get_all_faces(self):
-        """Lấy tất cả khuôn mặt đã biết và encoding"""
-        known_face_encodings = []
-        known_face_names = []
+    @_locked
+    def add_users_bulk(self, people):
+        """Thêm nhiều người dùng với encoding đã tính sẵn, chỉ ghi metadata và cache một lần
+
+        people: danh sách (tên, [(đường dẫn ảnh gốc, encoding)])
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        user_ids = []
+        # Toàn bộ người dùng được ghi trong một lần (một transaction với SQLite)
+        with self.store.batch():
+            for i, (name, images) in enumerate(people):
+                user_id = f"user_{timestamp}_{i:05d}"
+                user_dir = os.path.join(self.known_faces_dir, user_id)
+                os.makedirs(user_dir, exist_ok=True)
+            
+                # Sao chép ảnh vào thư mục người dùng và lưu encoding vào cache
+                image_paths = []
+                encodings = []
+                for source_path, encoding in images:
+                    image_path = os.path.join(user_dir, os.path.basename(source_path))
+                    shutil.copy2(source_path, image_path)
+                    self.encoding_cache.put(image_path, encoding)
+                    image_paths.append(image_path)
+                    encodings.append(encoding)
+            
+                self.store.add_user(user_id, {
+                    "name": name,
+                    "created_at": timestamp,
+                    "images": image_paths,
+                    "additional_info": {}
+                })
+                self._gallery_add(user_id, encodings)
+                user_ids.append(user_id)
         
-        for user_id, user_data in self.metadata["users"].items():
-            for image_path in user_data["images"]:
-                if os.path.exists(image_path):
-                    try:
-                        # Load ảnh
-                        image = face_recognition.load_image_file(image_path)
-                        
-                        # Phát hiện vị trí khuôn mặt
-                        face_locations = face_recognition.face_locations(image, model="hog")
-                        
-                        if face_locations:
-                            # Lấy face landmarks
-                            face_landmarks_list = face_recognition.face_landmarks(image, face_locations)
-                            
-                            if face_landmarks_list:
-                                # Lấy encoding cho khuôn mặt đầu tiên
-                                face_encodings = face_recognition.face_encodings(
-                                    image,
-                                    known_face_locations=face_locations,
-                                    model="small"
-                                )
-                                
-                                if face_encodings:
-                                    known_face_encodings.append(face_encodings[0])
-                                    known_face_names.append(user_data["name"])
-                                    
-                    except Exception as e:
-                        print(f"Lỗi khi xử lý ảnh {image_path}: {str(e)}")
-                        continue
-                    
-        return known_face_encodings, known_face_names
+        self.encoding_cache.checkpoint()
+        return user_ids
+    
+    def _build_gallery(self, gallery):
+        """Nạp toàn bộ người dùng vào gallery (encoding lấy từ cache)"""
+        for user_id, user_data in self.store.iter_users():
+            gallery.add(user_id, user_data["name"], self._user_gallery_encodings(user_id, user_data))
+        
+        # Ghi lại các encoding mới tính (nếu có)
+        self.encoding_cache.save()
+        return gallery
+    
+    def _gallery_key(self):
+        """Khóa của dữ liệu nguồn gallery: generation của store và cache encoding cùng thiết lập encoding
+
+        Không phụ thuộc số ảnh: store/cache tăng generation sau mỗi thay đổi người dùng, ảnh hay encoding.
+        """
+        return hashlib.sha1(json.dumps(
+            [config.FACE_DETECTOR, self.encoding_cache.model, self.prototypes, config.GALLERY_FILE_DTYPE,
+             self.store.generation, self.encoding_cache.generation]).encode()).hexdigest()
     
+    def _save_gallery_file(self):
+        """Ghi bản chụp gallery hiện tại (lỗi ghi file không ảnh hưởng tới gallery trong bộ nhớ)"""
+        if not config.GALLERY_FILE_ENABLED:
+            return
+        try:
+            save_gallery_file(self.gallery_file, self.gallery, config.GALLERY_FILE_DTYPE, self._gallery_key())
+        except OSError as e:
+            print(f"Không thể ghi file gallery: {str(e)}")
+    
+    def valid_gallery_file(self):
+        """Đường dẫn file gallery nếu file mở được và khớp dữ liệu hiện tại, None nếu không"""
+        if not config.GALLERY_FILE_ENABLED:
+            return None
+        with self.lock:
+            if load_gallery_file(self.gallery_file, self._gallery_key()) is None:
+                return None
+        return self.gallery_file
+    
+    def load_gallery(self):
+        """Build lại gallery từ toàn bộ người dùng, encode song song khi cache thiếu nhiều ảnh"""
+        if config.GALLERY_FILE_ENABLED:
+            # Dữ liệu không đổi từ lần ghi trước: mở file bằng memmap thay vì build lại
+            with self.lock:
+                loaded = load_gallery_file(self.gallery_file, self._gallery_key())
+                if loaded is not None:
+                    self.gallery.swap(loaded)
+                    self._gallery_loaded = True
+                    return self.gallery
+        
+        if len(gallery_rebuild.missing_images(self)) >= config.REBUILD_PARALLEL_MIN:
+            gallery_rebuild.encode_missing(self)
+        with self.lock:
+            self.gallery.clear()
+            self._build_gallery(self.gallery)
+            self._gallery_loaded = True
+            self._save_gallery_file()
+        return self.gallery
+    
+    @_locked
+    def swap_gallery(self):
+        """Build gallery mới ở bên cạnh rồi thay gallery đang dùng trong một bước"""
+        if not self._gallery_loaded:
+            return self.load_gallery()
+        self.gallery.swap(self._build_gallery(FaceGallery()))
+        self._save_gallery_file()
+        return self.gallery
+    
+    def rebuild_gallery(self, workers=None, progress=gallery_rebuild.print_progress, stop_event=None):
+        """Encode lại song song các ảnh thiếu trong cache (tiếp tục được nếu bị ngắt) rồi thay gallery"""
+        return gallery_rebuild.rebuild_gallery(self, workers, progress, stop_event)
+    
+    def get_all_faces(self):
+        """Lấy tất cả khuôn mặt đã biết và encoding (danh sách encoding, danh sách tên)"""
+        gallery = self.load_gallery()
+        with self.lock:
+            encodings = [row.astype(np.float64) for row in gallery.matrix]
+            names = [gallery.name_of(user_id) for user_id in gallery.row_users]
+        return encodings, names
+    
+    @_locked
     def update_user_info(self, user_id, new_info):
         """Cập nhật thông tin người dùng"""
-        if user_id in self.metadata["users"]:
-            self.metadata["users"][user_id].update(new_info)
-            self._save_metadata()
+        if user_id in self.store:
+            user_data = self.store.update_user(user_id, new_info)
+            self.gallery.rename(user_id, user_data["name"])
             return True
         return False
 
+    @_locked
     def delete_user(self, user_id):
         """Xóa người dùng khỏi cơ sở dữ liệu"""
-        if user_id in self.metadata["users"]:
-            user_data = self.metadata["users"][user_id]
+        user_data = self.store.get_user(user_id)
+        if user_data is not None:
             
             # Xóa các ảnh
             for image_path in user_data["images"]:
+                self.encoding_cache.remove(image_path)
                 if os.path.exists(image_path):
                     os.remove(image_path)
             
@@ -120,14 +306,16 @@ class DataManager:
                 os.rmdir(user_dir)
             
             # Xóa metadata
-            del self.metadata["users"][user_id]
-            self._save_metadata()
+            self.store.delete_user(user_id)
+            self._gallery_remove(user_id)
+            self.encoding_cache.checkpoint()
             return True
         return False
 
-    def add_face_image(self, user_id, frame):
+    @_locked
+    def add_face_image(self, user_id, frame, encoding=None):
         """Thêm ảnh mới cho người dùng đã tồn tại"""
-        if user_id in self.metadata["users"]:
+        if user_id in self.store:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             user_dir = os.path.join(self.known_faces_dir, user_id)
             
@@ -136,18 +324,25 @@ class DataManager:
             cv2.imwrite(image_path, frame)
             
             # Cập nhật metadata
-            self.metadata["users"][user_id]["images"].append(image_path)
-            self._save_metadata()
+            self.store.add_image(user_id, image_path)
+            encoding = self._cache_encoding(image_path, encoding)
+            if encoding is not None:
+                self._gallery_add(user_id, [encoding])
+            self.encoding_cache.checkpoint()
             return True
         return False
 
     def get_user_info(self, user_id):
         """Lấy thông tin chi tiết của người dùng"""
-        return self.metadata["users"].get(user_id)
+        return self.store.get_user(user_id)
 
     def list_all_users(self):
         """Liệt kê tất cả người dùng"""
-        return [(user_id, data["name"]) for user_id, data in self.metadata["users"].items()]
+        return self.store.list_users()
+
+    def find_users_by_name(self, name):
+        """Tìm user_id theo tên (dùng index khi lưu bằng SQLite)"""
+        return self.store.find_users_by_name(name)
 
     def add_face_from_path(self, image_path, name, additional_info=None):
         """Thêm khuôn mặt mới từ đường dẫn ảnh"""
@@ -159,9 +354,14 @@ class DataManager:
             frame = cv2.imread(image_path)
             if frame is None:
                 return None, "Không thể đọc file ảnh"
+            
+            # Mã hóa ngay trên ảnh gốc thay vì đọc lại file JPEG vừa lưu
+            encoding = self.analyze_face(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), max_faces=1).encoding
+            if encoding is None:
+                return None, "Không phát hiện khuôn mặt trong ảnh"
                 
             # Thêm khuôn mặt như bình thường
-            user_id = self.add_face(frame, name, additional_info)
+            user_id = self.add_face(frame, name, additional_info, encoding)
             return user_id, None
             
         except Exception as e:
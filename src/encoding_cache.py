@@ -0,0 +1,329 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+ENCODING_DIM = 128
+CACHE_VERSION = 1
+JOURNAL_MIN_ROWS = 4096  # journal dài hơn ma trận chính (và quá ngưỡng này) thì gộp lại bằng save()
+
+
+def initial_generation():
+    """Giá trị đầu của bộ đếm generation khi tạo mới dữ liệu
+
+    Ngẫu nhiên để store/cache bị tạo lại không trùng generation đã ghi trong file gallery cũ.
+    """
+    return int.from_bytes(os.urandom(6), "big")
+
+
+class EncodingCache:
+    """Cache encoding khuôn mặt trên đĩa (ma trận .npy + index JSON)"""
+
+    def __init__(self, data_dir, model="small"):
+        self.matrix_file = os.path.join(data_dir, "encodings.npy")
+        self.prototypes_file = os.path.join(data_dir, "prototypes.npy")
+        self.index_file = os.path.join(data_dir, "encodings_index.json")
+        # Journal chỉ ghi thêm: checkpoint() nối các thay đổi mới, save() gộp vào ma trận chính rồi xóa
+        self.journal_file = os.path.join(data_dir, "encodings_journal.jsonl")
+        self.journal_rows_file = os.path.join(data_dir, "encodings_journal.bin")
+        self.model = model
+
+        # image_path -> {"row", "mtime", "size", "sha1"}; row = -1 nghĩa là ảnh không có khuôn mặt
+        self._entries = {}
+        self._matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._pending = {}  # image_path -> encoding mới chưa ghi xuống đĩa
+        
+        # Prototype nén theo người dùng: user_id -> {"key", "start", "count"}
+        self._prototypes = {}
+        self._prototype_matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._pending_prototypes = {}  # user_id -> (key, ma trận prototype mới)
+        self._dirty = False
+        self._journal_ops = []  # thay đổi chưa nối vào journal: (bản ghi, ma trận hàng hoặc None)
+        self._journal_rows = 0  # số hàng đang nằm trong file journal
+        # Tăng sau mỗi thay đổi encoding/prototype (khóa file gallery dựa vào đây thay vì stat từng ảnh)
+        self.generation = initial_generation()
+
+        self._load()
+        self._replay_journal()
+
+    def _load(self):
+        """Load index và ma trận encoding (memory-mapped)"""
+        if not (os.path.exists(self.index_file) and os.path.exists(self.matrix_file)):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            # Đổi model hoặc định dạng thì toàn bộ cache không còn hợp lệ
+            if index.get("version") != CACHE_VERSION or index.get("model") != self.model:
+                self._dirty = True
+                self._remove_journal()
+                return
+            self._matrix = np.load(self.matrix_file, mmap_mode='r')
+            self._entries = index.get("entries", {})
+            if "generation" in index:
+                self.generation = index["generation"]
+            else:
+                self._dirty = True  # cache của phiên bản cũ: lưu generation ở lần save() tới
+            if os.path.exists(self.prototypes_file):
+                self._prototype_matrix = np.load(self.prototypes_file, mmap_mode='r')
+                self._prototypes = index.get("prototypes", {})
+        except (OSError, ValueError) as e:
+            print(f"Không thể đọc cache encoding, sẽ tạo lại: {str(e)}")
+            self._entries = {}
+            self._matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+            self._prototypes = {}
+            self._prototype_matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+            self._dirty = True
+            self._remove_journal()
+
+    @staticmethod
+    def _file_hash(image_path):
+        """Tính SHA1 nội dung file"""
+        sha1 = hashlib.sha1()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def _is_valid(self, image_path, entry):
+        """Kiểm tra entry còn khớp với file trên đĩa (mtime/size, sau đó tới hash)"""
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return False
+        if stat.st_mtime_ns == entry["mtime"] and stat.st_size == entry["size"]:
+            return True
+        if stat.st_size != entry["size"] or self._file_hash(image_path) != entry["sha1"]:
+            return False
+        # File chỉ bị touch, nội dung không đổi: cập nhật lại mtime
+        entry["mtime"] = stat.st_mtime_ns
+        self._dirty = True
+        return True
+
+    def lookup(self, image_path):
+        """Tra cứu encoding, trả về (có trong cache, encoding hoặc None)"""
+        if image_path in self._pending:
+            return True, self._pending[image_path]
+        entry = self._entries.get(image_path)
+        if entry is None:
+            return False, None
+        if not self._is_valid(image_path, entry):
+            self.remove(image_path)
+            return False, None
+        if entry["row"] < 0:
+            return True, None
+        return True, np.asarray(self._matrix[entry["row"]])
+
+    def put(self, image_path, encoding):
+        """Lưu encoding của một ảnh (encoding=None nếu ảnh không có khuôn mặt)"""
+        stat = os.stat(image_path)
+        self._entries[image_path] = {
+            "row": -1,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha1": self._file_hash(image_path)
+        }
+        if encoding is not None:
+            self._pending[image_path] = np.asarray(encoding, dtype=np.float32)
+        else:
+            self._pending.pop(image_path, None)
+        self._dirty = True
+        self.generation += 1
+        entry = self._entries[image_path]
+        self._journal_ops.append((
+            {"op": "put", "path": image_path, "mtime": entry["mtime"], "size": entry["size"], "sha1": entry["sha1"],
+             "generation": self.generation},
+            None if encoding is None else self._pending[image_path].reshape(1, ENCODING_DIM)
+        ))
+
+    def remove(self, image_path):
+        """Xóa encoding của một ảnh khỏi cache"""
+        if self._entries.pop(image_path, None) is not None:
+            self._dirty = True
+            self.generation += 1
+            self._journal_ops.append(({"op": "remove", "path": image_path, "generation": self.generation}, None))
+        self._pending.pop(image_path, None)
+
+    def prototype_key(self, image_paths, k):
+        """Khóa nhận diện tập ảnh của người dùng (đổi ảnh thì prototype cũ hết hiệu lực)"""
+        sha1 = hashlib.sha1(f"k={k}".encode())
+        for image_path in sorted(image_paths):
+            entry = self._entries.get(image_path)
+            if entry is not None:
+                sha1.update(entry["sha1"].encode())
+        return sha1.hexdigest()
+
+    def get_prototypes(self, user_id, key):
+        """Lấy prototype đã lưu của người dùng, None nếu chưa có hoặc đã cũ"""
+        if user_id in self._pending_prototypes:
+            key_pending, prototypes = self._pending_prototypes[user_id]
+            return prototypes if key_pending == key else None
+        entry = self._prototypes.get(user_id)
+        if entry is None or entry["key"] != key:
+            return None
+        return np.asarray(self._prototype_matrix[entry["start"]:entry["start"] + entry["count"]])
+
+    def put_prototypes(self, user_id, key, prototypes):
+        """Lưu prototype của người dùng"""
+        self._pending_prototypes[user_id] = (key, np.asarray(prototypes, dtype=np.float32))
+        self._dirty = True
+        self.generation += 1
+        self._journal_ops.append((
+            {"op": "prototypes", "user_id": user_id, "key": key, "generation": self.generation},
+            self._pending_prototypes[user_id][1].reshape(-1, ENCODING_DIM)
+        ))
+
+    def remove_prototypes(self, user_id):
+        """Xóa prototype của người dùng"""
+        removed = self._prototypes.pop(user_id, None) is not None
+        if self._pending_prototypes.pop(user_id, None) is not None or removed:
+            self._dirty = True
+            self.generation += 1
+            self._journal_ops.append(({"op": "remove_prototypes", "user_id": user_id, "generation": self.generation}, None))
+
+    def _collect_prototypes(self):
+        """Gộp prototype cũ và mới thành một ma trận liên tục"""
+        blocks = []
+        prototypes = {}
+        start = 0
+        for user_id in set(self._prototypes) | set(self._pending_prototypes):
+            if user_id in self._pending_prototypes:
+                key, block = self._pending_prototypes[user_id]
+            else:
+                entry = self._prototypes[user_id]
+                key = entry["key"]
+                block = self._prototype_matrix[entry["start"]:entry["start"] + entry["count"]]
+            prototypes[user_id] = {"key": key, "start": start, "count": len(block)}
+            blocks.append(np.asarray(block, dtype=np.float32))
+            start += len(block)
+        matrix = np.concatenate(blocks) if blocks else np.empty((0, ENCODING_DIM), dtype=np.float32)
+        return matrix, prototypes
+
+    def save(self):
+        """Ghi cache xuống đĩa (chỉ khi có thay đổi)"""
+        if not self._dirty:
+            return
+
+        rows = []
+        entries = {}
+        for image_path, entry in self._entries.items():
+            entry = dict(entry)
+            if image_path in self._pending:
+                encoding = self._pending[image_path]
+            elif entry["row"] >= 0:
+                encoding = self._matrix[entry["row"]]
+            else:
+                encoding = None
+            if encoding is not None:
+                entry["row"] = len(rows)
+                rows.append(encoding)
+            entries[image_path] = entry
+
+        matrix = np.array(rows, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        prototype_matrix, prototypes = self._collect_prototypes()
+        # Giải phóng memmap cũ trước khi ghi đè file
+        self._matrix = matrix
+        self._prototype_matrix = prototype_matrix
+
+        tmp_matrix = self.matrix_file + ".tmp.npy"
+        tmp_prototypes = self.prototypes_file + ".tmp.npy"
+        tmp_index = self.index_file + ".tmp"
+        np.save(tmp_matrix, matrix)
+        np.save(tmp_prototypes, prototype_matrix)
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_VERSION, "model": self.model, "generation": self.generation,
+                       "entries": entries, "prototypes": prototypes}, f, ensure_ascii=False)
+        os.replace(tmp_matrix, self.matrix_file)
+        os.replace(tmp_prototypes, self.prototypes_file)
+        os.replace(tmp_index, self.index_file)
+        # Mọi thay đổi trong journal đã nằm trong file chính (replay lại cũng không đổi kết quả)
+        self._remove_journal()
+
+        self._entries = entries
+        self._pending = {}
+        self._prototypes = prototypes
+        self._pending_prototypes = {}
+        self._dirty = False
+
+    def checkpoint(self):
+        """Ghi nhanh các thay đổi từ lần ghi trước vào journal (chi phí theo số thay đổi, không theo kích thước cache)
+
+        Journal được gộp vào ma trận chính ở save(), hoặc tự động khi journal đã dài bằng ma trận chính.
+        """
+        if self._journal_ops:
+            self._repair_journal()
+            # Hàng ghi trước, dòng index ghi sau: dòng đầy đủ luôn trỏ tới hàng đã có trên đĩa
+            with open(self.journal_rows_file, 'ab') as rows_file, \
+                    open(self.journal_file, 'a', encoding='utf-8') as journal:
+                offset = rows_file.tell() // (ENCODING_DIM * 4)
+                lines = []
+                for record, rows in self._journal_ops:
+                    if rows is not None:
+                        rows_file.write(np.ascontiguousarray(rows, dtype=np.float32).tobytes())
+                        record = dict(record, offset=offset, count=len(rows))
+                        offset += len(rows)
+                    lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+                rows_file.flush()
+                journal.writelines(lines)
+            self._journal_rows = offset
+            self._journal_ops = []
+        if self._journal_rows > max(len(self._matrix), JOURNAL_MIN_ROWS):
+            self.save()
+
+    def _repair_journal(self):
+        """Cắt phần hàng ghi dở và kết thúc dòng ghi dở của lần checkpoint bị ngắt"""
+        row_bytes = ENCODING_DIM * 4
+        if os.path.exists(self.journal_rows_file):
+            size = os.path.getsize(self.journal_rows_file)
+            if size % row_bytes:
+                os.truncate(self.journal_rows_file, size - size % row_bytes)
+        if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def _replay_journal(self):
+        """Áp dụng lại các thay đổi trong journal của lần chạy trước (bỏ dòng cuối bị ghi dở)"""
+        if not (os.path.exists(self.journal_file) and os.path.exists(self.journal_rows_file)):
+            return
+        rows = np.fromfile(self.journal_rows_file, dtype=np.float32)
+        rows = rows[:len(rows) // ENCODING_DIM * ENCODING_DIM].reshape(-1, ENCODING_DIM)
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # dòng ghi dở
+                block = None
+                if "offset" in record:
+                    block = rows[record["offset"]:record["offset"] + record["count"]]
+                    if len(block) != record["count"]:
+                        continue
+                op = record["op"]
+                # Journal có thể có trước file index (cache mới): generation lấy từ bản ghi
+                self.generation = record.get("generation", self.generation + 1)
+                if op == "put":
+                    self._entries[record["path"]] = {"row": -1, "mtime": record["mtime"],
+                                                     "size": record["size"], "sha1": record["sha1"]}
+                    if block is not None:
+                        self._pending[record["path"]] = block[0].copy()
+                    else:
+                        self._pending.pop(record["path"], None)
+                elif op == "remove":
+                    self._entries.pop(record["path"], None)
+                    self._pending.pop(record["path"], None)
+                elif op == "prototypes":
+                    self._pending_prototypes[record["user_id"]] = (record["key"], block.copy())
+                elif op == "remove_prototypes":
+                    self._prototypes.pop(record["user_id"], None)
+                    self._pending_prototypes.pop(record["user_id"], None)
+        self._journal_rows = len(rows)
+        self._dirty = True
+
+    def _remove_journal(self):
+        for path in (self.journal_file, self.journal_rows_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self._journal_ops = []
+        self._journal_rows = 0
@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+
+# Predictor landmark và bộ mã hóa của face_recognition là đối tượng dlib toàn cục, không an toàn
+# khi nhiều luồng cùng gọi (stage nhận diện, luồng lệnh đăng ký, các camera): mọi lời gọi đi qua lock này.
+# Phát hiện khuôn mặt không cần lock vì mỗi detector có đối tượng dlib riêng.
+DLIB_LOCK = threading.Lock()
+
+
+class FaceAnalysis:
+    """Kết quả phân tích một ảnh: vị trí, landmark và encoding của từng khuôn mặt"""
+    __slots__ = ("locations", "shapes", "encodings")
+
+    def __init__(self, locations, shapes, encodings):
+        self.locations = locations  # [(top, right, bottom, left)]
+        # landmark thô của dlib (5 điểm với model "small", 68 điểm với "large"); dict {bộ phận: [(x, y)]}
+        # của face_recognition.face_landmarks() khi không dùng được API nội bộ
+        self.shapes = shapes
+        self.encodings = encodings  # [ndarray (128,)]
+
+    def __len__(self):
+        return len(self.locations)
+
+    @property
+    def landmarks(self):
+        """Landmark của từng khuôn mặt dạng mảng (số điểm, 2) int32 (x, y)"""
+        return [np.array([point for points in shape.values() for point in points], dtype=np.int32)
+                if isinstance(shape, dict) else
+                np.array([(point.x, point.y) for point in shape.parts()], dtype=np.int32)
+                for shape in self.shapes]
+
+    @property
+    def encoding(self):
+        """Encoding của khuôn mặt đầu tiên, None nếu không có khuôn mặt"""
+        return self.encodings[0] if self.encodings else None
+
+
+def _raw_api():
+    """(_raw_face_landmarks, face_encoder) nội bộ của face_recognition, None nếu phiên bản đã cài không có"""
+    try:
+        from face_recognition.api import _raw_face_landmarks, face_encoder
+    except ImportError:
+        return None
+    return _raw_face_landmarks, face_encoder
+
+
+def analyze_image(rgb_image, face_detector=None, locations=None, max_faces=None, model="small",
+                  num_jitters=1):
+    """Phát hiện, lấy landmark và mã hóa khuôn mặt trong một lượt
+
+    face_recognition.face_landmarks() rồi face_encodings() sẽ chạy predictor landmark hai lần;
+    ở đây landmark thô được tính một lần và dùng lại cho bộ mã hóa. Truyền locations nếu đã
+    có sẵn vị trí khuôn mặt để bỏ qua bước phát hiện. Nếu face_recognition không còn API nội bộ
+    đó thì quay về face_landmarks() và face_encodings() công khai (chậm hơn, cùng kết quả).
+    """
+    if locations is None:
+        locations = face_detector.detect(rgb_image)
+    locations = list(locations[:max_faces])
+    if not locations:
+        return FaceAnalysis(locations, [], [])
+    raw_api = _raw_api()
+    if raw_api is None:
+        import face_recognition
+        with DLIB_LOCK:
+            shapes = face_recognition.face_landmarks(rgb_image, locations, model=model)
+            encodings = face_recognition.face_encodings(rgb_image, known_face_locations=locations,
+                                                        num_jitters=num_jitters, model=model)
+        return FaceAnalysis(locations, shapes, encodings)
+
+    raw_face_landmarks, face_encoder = raw_api
+    with DLIB_LOCK:
+        shapes = raw_face_landmarks(rgb_image, locations, model)
+        encodings = [np.array(face_encoder.compute_face_descriptor(rgb_image, shape, num_jitters))
+                     for shape in shapes]
+    return FaceAnalysis(locations, shapes, encodings)
+
+
+def encode_faces(rgb_image, locations, model="small", num_jitters=1):
+    """face_recognition.face_encodings() qua DLIB_LOCK (dùng từ các luồng xử lý frame)"""
+    import face_recognition
+    with DLIB_LOCK:
+        return face_recognition.face_encodings(rgb_image, known_face_locations=locations,
+                                               num_jitters=num_jitters, model=model)
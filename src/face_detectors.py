@@ -0,0 +1,88 @@
+import os
+import cv2
+from src import config
+
+# Mọi detector nhận ảnh RGB và trả về box dạng (top, right, bottom, left) như face_recognition
+
+
+class HogFaceDetector:
+    """Detector HOG của dlib (mặc định của face_recognition)
+
+    Mỗi instance có detector dlib riêng: face_recognition.face_locations dùng chung một detector
+    toàn cục, không an toàn khi nhiều luồng (stage nhận diện, luồng lệnh, từng camera) cùng gọi.
+    """
+    name = "hog"
+
+    def __init__(self, upsample=1):
+        import dlib  # dlib nặng, chỉ import khi dùng HOG
+        self._detector = dlib.get_frontal_face_detector()
+        self.upsample = upsample
+
+    def detect(self, rgb_image):
+        h, w = rgb_image.shape[:2]
+        # Giống face_recognition.face_locations: đổi rect sang (top, right, bottom, left) và cắt theo ảnh
+        return [(max(rect.top(), 0), min(rect.right(), w), min(rect.bottom(), h), max(rect.left(), 0))
+                for rect in self._detector(rgb_image, self.upsample)]
+
+
+class HaarFaceDetector:
+    """Haar cascade của OpenCV: rất nhanh trên CPU nhưng kém chính xác hơn"""
+    name = "haar"
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=20):
+        cascade_path = cascade_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        if self.classifier.empty():
+            raise FileNotFoundError(f"Không thể load Haar cascade: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def detect(self, rgb_image):
+        gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        rects = self.classifier.detectMultiScale(gray, self.scale_factor, self.min_neighbors,
+                                                 minSize=self.min_size)
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in rects]
+
+
+class YuNetFaceDetector:
+    """Detector YuNet (CNN nhỏ) qua cv2.FaceDetectorYN, cần file model ONNX"""
+    name = "yunet"
+
+    def __init__(self, model_path=None, score_threshold=0.7):
+        model_path = model_path or config.YUNET_MODEL_PATH
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Không tìm thấy model YuNet: {model_path}")
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+        self._input_size = (320, 320)
+
+    def detect(self, rgb_image):
+        h, w = rgb_image.shape[:2]
+        if (w, h) != self._input_size:
+            self.detector.setInputSize((w, h))
+            self._input_size = (w, h)
+        _, faces = self.detector.detect(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        locations = []
+        for x, y, bw, bh in faces[:, :4]:
+            # Cắt box theo kích thước ảnh để face_encodings không vượt biên
+            left, top = max(0, int(x)), max(0, int(y))
+            right, bottom = min(w, int(x + bw)), min(h, int(y + bh))
+            locations.append((top, right, bottom, left))
+        return locations
+
+
+FACE_DETECTORS = {
+    "hog": HogFaceDetector,
+    "haar": HaarFaceDetector,
+    "yunet": YuNetFaceDetector
+}
+
+
+def create_face_detector(name=None, **kwargs):
+    """Tạo detector theo tên (mặc định config.FACE_DETECTOR); mỗi luồng phải dùng instance riêng"""
+    name = name or config.FACE_DETECTOR
+    if name not in FACE_DETECTORS:
+        raise ValueError(f"Không hỗ trợ face detector: {name}")
+    return FACE_DETECTORS[name](**kwargs)
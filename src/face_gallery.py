@@ -0,0 +1,192 @@
+import functools
+import itertools
+import threading
+import numpy as np
+from src import config
+from src.face_index import create_index
+
+ENCODING_DIM = 128
+
+
+def _locked(method):
+    """Chạy method trong lock của gallery"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class FaceGallery:
+    """Gallery encoding khuôn mặt lưu trong một ma trận float32 liên tục"""
+
+    def __init__(self, dim=ENCODING_DIM, capacity=1024, index_backend=None, index_options=None):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)  # bình phương norm từng dòng
+        self._size = 0
+        self._row_users = []  # user_id của từng dòng
+        self._user_rows = {}  # user_id -> set các dòng; None = chưa build (gallery nạp từ file)
+        self._names = {}  # user_id -> tên
+        # Gallery được cập nhật từ luồng chính trong khi luồng nhận diện đang so khớp
+        self._lock = threading.RLock()
+        
+        if index_backend is None:
+            index_backend = config.FACE_INDEX_BACKEND
+            index_options = config.FACE_INDEX_OPTIONS if index_options is None else index_options
+        self.index = create_index(index_backend, self, **(index_options or {}))
+
+    @classmethod
+    def from_arrays(cls, matrix, sq_norms, identities, index_backend=None, index_options=None):
+        """Tạo gallery dùng trực tiếp ma trận có sẵn (ví dụ np.memmap float32/float16) không sao chép
+
+        identities: danh sách (user_id, tên, dòng bắt đầu, số dòng), các dòng của một người liên tiếp.
+        Ma trận chỉ được chép ra bộ nhớ (float32) khi gallery bị thay đổi lần đầu.
+        """
+        gallery = cls(dim=matrix.shape[1], capacity=0, index_backend=index_backend, index_options=index_options)
+        gallery._matrix = matrix
+        gallery._sq_norms = sq_norms
+        gallery._size = len(matrix)
+        gallery._row_users = list(itertools.chain.from_iterable(
+            itertools.repeat(user_id, count) for user_id, _, _, count in identities))
+        gallery._names = {user_id: name for user_id, name, _, _ in identities}
+        gallery._user_rows = None
+        gallery.index.on_add(0, gallery._size)
+        return gallery
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        """View (N, dim) của các encoding hiện có"""
+        return self._matrix[:self._size]
+
+    @property
+    def sq_norms(self):
+        """Bình phương norm của từng dòng"""
+        return self._sq_norms[:self._size]
+
+    @property
+    def row_users(self):
+        """Danh sách user_id tương ứng với từng dòng của ma trận"""
+        return self._row_users
+
+    def user_ids(self):
+        """Danh sách user_id có trong gallery"""
+        return list(self._names)
+
+    def name_of(self, user_id):
+        """Lấy tên của người dùng"""
+        return self._names.get(user_id)
+
+    def _prepare_write(self):
+        """Chép ma trận chỉ đọc (memmap) ra bộ nhớ và build chỉ mục dòng trước lần sửa đầu tiên"""
+        if self._user_rows is None:
+            self._user_rows = {}
+            for row, user_id in enumerate(self._row_users):
+                self._user_rows.setdefault(user_id, set()).add(row)
+        if self._matrix.dtype != np.float32 or not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+            self._sq_norms = np.array(self._sq_norms, dtype=np.float32)
+
+    def _reserve(self, capacity):
+        """Mở rộng vùng nhớ (gấp đôi) khi hết chỗ"""
+        if capacity <= len(self._matrix):
+            return
+        new_capacity = max(capacity, 2 * len(self._matrix))
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        sq_norms = np.zeros(new_capacity, dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._matrix, self._sq_norms = matrix, sq_norms
+
+    @_locked
+    def clear(self):
+        """Xóa toàn bộ gallery (giữ lại vùng nhớ đã cấp phát)"""
+        if self._matrix.dtype != np.float32 or not self._matrix.flags.writeable:
+            # Không ghi vào memmap chỉ đọc: bắt đầu lại với vùng nhớ riêng
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._size = 0
+        self._row_users = []
+        self._user_rows = {}
+        self._names = {}
+        self.index.reset()
+
+    @_locked
+    def add(self, user_id, name, encodings):
+        """Thêm các encoding của một người dùng"""
+        self._prepare_write()
+        self._names[user_id] = name
+        rows = self._user_rows.setdefault(user_id, set())
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if not len(encodings):
+            return
+
+        start = self._size
+        end = start + len(encodings)
+        self._reserve(end)
+        self._matrix[start:end] = encodings
+        self._sq_norms[start:end] = np.einsum('ij,ij->i', encodings, encodings)
+        self._row_users.extend([user_id] * len(encodings))
+        rows.update(range(start, end))
+        self._size = end
+        self.index.on_add(start, end)
+
+    @_locked
+    def remove(self, user_id):
+        """Xóa một người dùng, chi phí tỉ lệ với số encoding của người đó"""
+        self._prepare_write()
+        self._names.pop(user_id, None)
+        rows = self._user_rows.pop(user_id, set())
+
+        # Đưa dòng cuối vào chỗ trống, duyệt từ dòng lớn nhất để không đụng dòng sắp xóa
+        for row in sorted(rows, reverse=True):
+            last = self._size - 1
+            self.index.on_remove(row)
+            if row != last:
+                moved_user = self._row_users[last]
+                self._matrix[row] = self._matrix[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._row_users[row] = moved_user
+                moved_rows = self._user_rows[moved_user]
+                moved_rows.discard(last)
+                moved_rows.add(row)
+                self.index.on_move(last, row)
+            self._row_users.pop()
+            self._size = last
+
+    @_locked
+    def swap(self, other):
+        """Thay toàn bộ nội dung bằng một gallery đã build sẵn (other không được dùng tiếp)"""
+        self._matrix, self._sq_norms, self._size = other._matrix, other._sq_norms, other._size
+        self._row_users, self._user_rows, self._names = other._row_users, other._user_rows, other._names
+        self.index = other.index
+        self.index.gallery = self
+
+    @_locked
+    def rename(self, user_id, name):
+        """Đổi tên hiển thị của người dùng"""
+        if user_id in self._names:
+            self._names[user_id] = name
+
+    @_locked
+    def match(self, encodings, tolerance=None):
+        """So khớp tất cả khuôn mặt trong frame qua chỉ mục của gallery
+
+        Trả về (ids, distances): user_id gần nhất (None nếu vượt ngưỡng) và
+        khoảng cách Euclidean tương ứng cho từng encoding.
+        """
+        if tolerance is None:
+            tolerance = config.FACE_MATCH_TOLERANCE
+
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if not len(queries) or not self._size:
+            return [None] * len(queries), np.full(len(queries), np.inf, dtype=np.float32)
+
+        best_rows, sq_dists = self.index.search(queries)
+        distances = np.sqrt(np.maximum(sq_dists, 0))
+        ids = [self._row_users[row] if distance < tolerance else None
+               for row, distance in zip(best_rows, distances)]
+        return ids, distances
@@ -0,0 +1,135 @@
+import numpy as np
+from utils.vector_utils import squared_distances, kmeans, CHUNK_ROWS
+
+
+class ExactIndex:
+    """Tìm kiếm chính xác (brute-force) trên toàn bộ ma trận của gallery"""
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+
+    def reset(self):
+        pass
+
+    def on_add(self, start, end):
+        pass
+
+    def on_move(self, src, dst):
+        pass
+
+    def on_remove(self, row):
+        pass
+
+    def search(self, queries):
+        """Trả về (dòng gần nhất, bình phương khoảng cách) cho từng query"""
+        sq_dist = squared_distances(queries, self.gallery.matrix, self.gallery.sq_norms)
+        rows = np.argmin(sq_dist, axis=1)
+        return rows, sq_dist[np.arange(len(queries)), rows]
+
+
+class IVFIndex:
+    """Chỉ mục xấp xỉ IVF: chia gallery thành các cụm k-means, chỉ quét nprobe cụm gần nhất"""
+
+    def __init__(self, gallery, nlist=None, nprobe=8, min_train_size=2048):
+        self.gallery = gallery
+        self.nlist = nlist  # None = tự chọn ~ sqrt(N)
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.reset()
+
+    def reset(self):
+        self._centroids = None
+        self._labels = np.zeros(0, dtype=np.int64)  # cụm của từng dòng
+        self._order = None  # các dòng sắp xếp theo cụm, build lại khi gallery thay đổi
+        self._offsets = None
+        self._trained_size = 0
+
+    def _train(self):
+        """Huấn luyện lại tâm cụm và phân bổ toàn bộ các dòng"""
+        matrix = self.gallery.matrix
+        nlist = self.nlist or max(1, int(np.sqrt(len(matrix))))
+        sample = matrix
+        if len(matrix) > 64 * nlist:
+            rng = np.random.default_rng(0)
+            sample = matrix[rng.choice(len(matrix), 64 * nlist, replace=False)]
+        self._centroids, _ = kmeans(sample, nlist)
+        self._labels = np.zeros(len(self.gallery._matrix), dtype=np.int64)
+        self._trained_size = len(matrix)
+        self._assign_rows(0, len(matrix))
+
+    def _assign_rows(self, start, end):
+        """Gán các dòng [start, end) vào cụm gần nhất"""
+        if end > len(self._labels):
+            labels = np.zeros(max(end, 2 * len(self._labels)), dtype=np.int64)
+            labels[:len(self._labels)] = self._labels
+            self._labels = labels
+        # Gán theo khối để ma trận khoảng cách không phình theo kích thước gallery
+        matrix = self.gallery.matrix
+        for chunk in range(start, end, CHUNK_ROWS):
+            chunk_end = min(end, chunk + CHUNK_ROWS)
+            self._labels[chunk:chunk_end] = np.argmin(
+                squared_distances(matrix[chunk:chunk_end], self._centroids), axis=1
+            )
+        self._order = None
+
+    def on_add(self, start, end):
+        if self._centroids is not None:
+            self._assign_rows(start, end)
+
+    def on_move(self, src, dst):
+        if self._centroids is not None:
+            self._labels[dst] = self._labels[src]
+            self._order = None
+
+    def on_remove(self, row):
+        # Dòng bị xóa nằm ngoài [0, N) sau khi gallery dồn dòng cuối vào
+        self._order = None
+
+    def _build_lists(self):
+        """Build danh sách dòng theo từng cụm (inverted lists) dạng mảng liên tục"""
+        labels = self._labels[:len(self.gallery)]
+        self._order = np.argsort(labels, kind='stable')
+        self._offsets = np.searchsorted(labels[self._order], np.arange(len(self._centroids) + 1))
+
+    def search(self, queries):
+        """Trả về (dòng gần nhất, bình phương khoảng cách) cho từng query"""
+        size = len(self.gallery)
+        if size < self.min_train_size:
+            return ExactIndex(self.gallery).search(queries)
+        # Gallery lớn lên nhiều so với lúc train thì train lại để các cụm cân bằng
+        if self._centroids is None or size > 4 * self._trained_size:
+            self._train()
+        if self._order is None:
+            self._build_lists()
+
+        queries = np.asarray(queries, dtype=np.float32)
+        nprobe = min(self.nprobe, len(self._centroids))
+        probes = np.argsort(squared_distances(queries, self._centroids), axis=1)[:, :nprobe]
+
+        rows = np.zeros(len(queries), dtype=np.int64)
+        sq_dists = np.full(len(queries), np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate(
+                [self._order[self._offsets[label]:self._offsets[label + 1]] for label in probes[i]]
+            )
+            if not len(candidates):
+                continue
+            sq_dist = squared_distances(query[None], self.gallery.matrix[candidates],
+                                        self.gallery.sq_norms[candidates])[0]
+            best = np.argmin(sq_dist)
+            rows[i] = candidates[best]
+            sq_dists[i] = sq_dist[best]
+        return rows, sq_dists
+
+
+INDEX_BACKENDS = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex
+}
+
+
+def create_index(backend, gallery, **kwargs):
+    """Tạo chỉ mục theo tên backend"""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Không hỗ trợ backend chỉ mục: {backend}")
+    return INDEX_BACKENDS[backend](gallery, **kwargs)
@@ -1,28 +1,112 @@
+import os
+import time
+import threading
 import cv2
-import face_recognition
-import numpy as np
-from src.data_manager import DataManager
-from src.object_detection import ObjectDetector
-from src.object_trainer import ObjectTrainer
-from utils.image_utils import resize_with_aspect_ratio, draw_text_with_background
+from src import config
+from src.pipeline import FramePipeline
+from src.frame_pool import FramePool, ScratchBuffers
+from src.face_tracker import FaceTracker
+from src.startup import BackgroundLoader
+from src.face_analysis import encode_faces
+from src.command_worker import CommandWorker
+from src.scheduler import AdaptiveScheduler
+from src.motion_gate import MotionGate, union_box
+from src.metrics import Metrics, MetricsServer
+from src.training_job import METRIC_MAP50, install_candidate, print_progress as print_train_progress
+from utils.image_utils import draw_text_with_background, draw_face_box
 
 class FaceRecognitionApp:
-    def __init__(self):
-        # Khởi tạo data manager
-        self.data_manager = DataManager()
+    def __init__(self, metrics_port=None):
+        # Các thành phần nặng được nạp nền; stage/chức năng tương ứng tự bật khi sẵn sàng
+        self.data_manager = None
+        self.gallery = None  # gallery được DataManager cập nhật tại chỗ
+        self.face_detector = None  # dùng riêng cho stage nhận diện
+        self.object_detector = None
+        self.object_trainer = None
+        self.loader = BackgroundLoader()
+        self.loader.add("faces", self._load_face_detector, self._on_face_detector_ready)
+        self.loader.add("gallery", self._load_gallery, self._on_gallery_ready)
+        self.loader.add("objects", self._load_object_detector, self._on_object_detector_ready)
+        self.loader.add("trainer", self._load_trainer, self._on_trainer_ready)
         
-        # Khởi tạo object detector và trainer
-        self.object_detector = ObjectDetector()
-        self.object_trainer = ObjectTrainer()
+        self.tolerance = config.FACE_MATCH_TOLERANCE
+        self.face_tracker = FaceTracker()
+        self.scheduler = AdaptiveScheduler()
+        self._face_scale = self.scheduler.face_scale
+        self.show_status = False  # vẽ thiết lập của scheduler lên frame
+        self.motion_gate = MotionGate() if config.MOTION_GATE_ENABLED else None
+        self._scratch = ScratchBuffers()  # buffer resize/cvtColor của stage nhận diện
         
-        # Load các khuôn mặt đã biết
-        self.known_face_encodings, self.known_face_names = self.data_manager.get_all_faces()
+        # Đo thời gian từng stage; bật sẵn khi mở endpoint metrics
+        self.metrics_port = config.METRICS_PORT if metrics_port is None else metrics_port
+        self.metrics = Metrics(enabled=config.METRICS_ENABLED or bool(self.metrics_port))
+        self.metrics_server = None
+        self.show_metrics = False  # vẽ p50/p95/p99 từng stage lên frame
+        
+        # Job rebuild encoding chạy nền, gallery cũ vẫn được dùng cho tới khi thay
+        self.rebuild_thread = None
+        self.rebuild_stop = threading.Event()
+        self.rebuild_progress = None  # (đã xong, tổng, ảnh/s)
+        
+        # Training YOLO chạy ở process riêng, luồng training chỉ theo dõi tiến độ rồi thay model
+        self.train_thread = None
+        self.train_stop = threading.Event()
+        self.train_progress = None  # (epoch, tổng epoch, mAP50)
+        
+        # Lệnh quản trị (input(), ghi dữ liệu, training) chạy trên luồng riêng để không chặn render
+        self.commands = CommandWorker()
+        self.capture_session = None  # phiên chụp ảnh training, điều khiển bằng phím ở luồng chính
         
         # Khởi tạo camera
+        start = time.perf_counter()
         self.camera = cv2.VideoCapture(0)
+        self.loader.record("camera", time.perf_counter() - start)
+        self.pipeline = None  # chỉ tồn tại khi run() đang chạy
         
         self.is_running = True
         
+    def _load_face_detector(self):
+        """Import dlib/face_recognition và tạo face detector (luồng nền)"""
+        import face_recognition  # noqa: F401 - nạp trước để frame đầu tiên không phải chờ import
+        from src.face_detectors import create_face_detector
+        return create_face_detector()
+    
+    def _on_face_detector_ready(self, face_detector):
+        self.face_detector = face_detector
+    
+    def _load_gallery(self):
+        """Mở cơ sở dữ liệu và load gallery (luồng nền)"""
+        from src.data_manager import DataManager
+        data_manager = DataManager()
+        return data_manager, data_manager.load_gallery()
+    
+    def _on_gallery_ready(self, result):
+        self.data_manager, self.gallery = result
+    
+    def _load_object_detector(self):
+        """Import ultralytics và load YOLO (luồng nền)"""
+        from src.object_detection import ObjectDetector
+        return ObjectDetector()
+    
+    def _on_object_detector_ready(self, object_detector):
+        self.object_detector = object_detector
+    
+    def _load_trainer(self):
+        """Tạo trainer (luồng nền, tạo các thư mục dataset)"""
+        from src.object_trainer import ObjectTrainer
+        return ObjectTrainer()
+    
+    def _on_trainer_ready(self, object_trainer):
+        self.object_trainer = object_trainer
+    
+    def _require(self, *components):
+        """Kiểm tra các thành phần đã sẵn sàng, báo cho người dùng nếu chưa"""
+        missing = [name for name in components if not self.loader.is_ready(name)]
+        for name in missing:
+            status = "không tải được" if name in self.loader.errors else "đang được tải, thử lại sau"
+            print(f"Chức năng cần '{name}' {status}")
+        return not missing
+    
     def show_menu(self):
         """Hiển thị menu chức năng"""
         print("\n=== MENU ===")
@@ -34,7 +118,10 @@ class FaceRecognitionApp:
         print("6. Bật/tắt nhận diện đồ vật (o)")
         print("7. Thêm class đồ vật mới (c)")
         print("8. Training model nhận diện đồ vật (t)")
-        print("9. Thoát (q)")
+        print("9. Bật/tắt hiển thị trạng thái hiệu năng (s)")
+        print("10. Rebuild encoding khuôn mặt ở chế độ nền (r)")
+        print("11. Bật/tắt hiển thị độ trễ từng stage (m)")
+        print("12. Thoát (q)")
         print("============")
     
     def delete_user(self):
@@ -51,28 +138,35 @@ class FaceRecognitionApp:
         user_id = input("\nNhập ID người dùng cần xóa: ")
         if self.data_manager.delete_user(user_id):
             print("Đã xóa người dùng thành công!")
-            # Cập nhật lại danh sách khuôn mặt
-            self.known_face_encodings, self.known_face_names = self.data_manager.get_all_faces()
         else:
             print("Không tìm thấy người dùng!")
     
-    def process_frame(self, frame):
-        """Xử lý frame để phù hợp với face_recognition"""
+    def process_frame(self, frame, dst=None):
+        """Xử lý frame để phù hợp với face_recognition (ghi vào dst nếu có)"""
         # Chuyển BGR sang RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=dst)
         return rgb_frame
         
+    def _capture_still(self, warmup=10):
+        """Chụp một frame sau khi đợi camera ổn định"""
+        if self.pipeline is None:
+            for _ in range(warmup):
+                self.camera.read()
+                cv2.waitKey(100)  # Đợi 100ms
+            ret, frame = self.camera.read()
+            return frame if ret else None
+        
+        # Luồng capture đang giữ camera: lấy frame mới nhất của nó
+        # (chạy trên luồng lệnh nên chỉ ngủ, waitKey chỉ được gọi từ luồng chính)
+        time.sleep(warmup * 0.1)
+        return self.pipeline.latest_frame()
+        
     def add_new_face(self):
         """Thêm khuôn mặt mới vào cơ sở dữ liệu"""
         print("\nĐang chụp ảnh... Hãy nhìn vào camera và giữ yên.")
         
-        # Đợi camera ổn định
-        for _ in range(10):
-            self.camera.read()
-            cv2.waitKey(100)  # Đợi 100ms
-            
-        ret, frame = self.camera.read()
-        if not ret:
+        frame = self._capture_still()
+        if frame is None:
             print("Không thể chụp ảnh!")
             return
             
@@ -80,28 +174,14 @@ class FaceRecognitionApp:
         rgb_frame = self.process_frame(frame)
         
         try:
-            # Phát hiện khuôn mặt với model HOG
-            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
+            # Phát hiện, lấy landmark và mã hóa trong một lượt (detector của luồng chính)
+            analysis = self.data_manager.analyze_face(rgb_frame, max_faces=1)
             
-            if not face_locations:
+            if not analysis.locations:
                 print("Không phát hiện khuôn mặt trong ảnh!")
                 return
             
-            # Lấy face landmarks
-            face_landmarks_list = face_recognition.face_landmarks(rgb_frame, face_locations)
-            
-            if not face_landmarks_list:
-                print("Không thể nhận dạng đặc điểm khuôn mặt!")
-                return
-            
-            # Thử encode khuôn mặt
-            face_encodings = face_recognition.face_encodings(
-                rgb_frame,
-                known_face_locations=face_locations,
-                model="small"
-            )
-            
-            if not face_encodings:
+            if analysis.encoding is None:
                 print("Không thể mã hóa khuôn mặt!")
                 return
             
@@ -117,10 +197,7 @@ class FaceRecognitionApp:
             }
             
             # Lưu vào cơ sở dữ liệu
-            user_id = self.data_manager.add_face(frame, name, additional_info)
-            
-            # Cập nhật danh sách khuôn mặt
-            self.known_face_encodings, self.known_face_names = self.data_manager.get_all_faces()
+            user_id = self.data_manager.add_face(frame, name, additional_info, analysis.encoding)
             
             print(f"Đã thêm khuôn mặt mới cho {name} (ID: {user_id})")
             
@@ -143,26 +220,22 @@ class FaceRecognitionApp:
         
         print("\nĐang chụp ảnh... Hãy nhìn vào camera và giữ yên.")
         # Đợi một chút để người dùng chuẩn bị
-        for _ in range(10):
-            self.camera.read()
-            
-        ret, frame = self.camera.read()
-        if not ret:
+        frame = self._capture_still()
+        if frame is None:
             print("Không thể chụp ảnh!")
             return
             
         # Xử lý frame
         rgb_frame = self.process_frame(frame)
         
-        # Phát hiện khuôn mặt
-        face_locations = face_recognition.face_locations(rgb_frame)
-        if not face_locations:
+        # Phát hiện và mã hóa một lần, encoding được dùng lại khi lưu ảnh
+        analysis = self.data_manager.analyze_face(rgb_frame, max_faces=1)
+        if analysis.encoding is None:
             print("Không phát hiện khuôn mặt trong ảnh!")
             return
             
-        if self.data_manager.add_face_image(user_id, frame):
+        if self.data_manager.add_face_image(user_id, frame, analysis.encoding):
             print("Đã thêm ảnh mới thành công!")
-            self.known_face_encodings, self.known_face_names = self.data_manager.get_all_faces()
         else:
             print("Không tìm thấy người dùng!")
     
@@ -219,8 +292,6 @@ class FaceRecognitionApp:
             print(f"Lỗi: {error}")
         else:
             print(f"Đã thêm khuôn mặt mới cho {name} (ID: {user_id})")
-            # Cập nhật danh sách khuôn mặt
-            self.known_face_encodings, self.known_face_names = self.data_manager.get_all_faces()
     
     def add_object_class(self):
         """Thêm class đồ vật mới và chụp ảnh training"""
@@ -237,14 +308,28 @@ class FaceRecognitionApp:
             
         print("\nChuẩn bị chụp ảnh training...")
         print("- Đặt đồ vật ở các góc độ khác nhau")
-        print("- Nhấn SPACE để chụp ảnh")
+        print("- Nhấn SPACE (trong cửa sổ nhận diện) để chụp ảnh")
         print("- Nhấn Q để kết thúc")
         
-        self.object_trainer.capture_training_images(class_name, num_images)
-        print(f"\nĐã thêm class {class_name} với {num_images} ảnh")
+        if self.pipeline is None:
+            self.object_trainer.capture_training_images(class_name, num_images)
+            print(f"\nĐã thêm class {class_name} với {num_images} ảnh")
+            return
+        
+        # Pipeline đang chạy: phím SPACE/Q được xử lý ở cửa sổ nhận diện, luồng lệnh chỉ đợi
+        session = self.object_trainer.start_capture(class_name, num_images)
+        self.capture_session = session
+        try:
+            captured = session.wait()
+        finally:
+            self.capture_session = None
+        print(f"\nĐã thêm class {class_name} với {captured} ảnh")
         
     def train_object_detection(self):
-        """Training model nhận diện đồ vật"""
+        """Hỏi số epochs rồi bắt đầu training nền"""
+        if self.train_thread is not None:
+            print("Training đang chạy")
+            return
         if not self.object_trainer.classes:
             print("Chưa có class nào được thêm vào! Hãy thêm class trước khi training.")
             return
@@ -259,18 +344,275 @@ class FaceRecognitionApp:
         except:
             epochs = 50
             
-        print("\nBắt đầu training...")
-        model_path = self.object_trainer.train_model(epochs)
-        
-        if model_path:
-            print("Training hoàn tất!")
-            print("Đang tải lại model...")
-            if self.object_detector.reload_model():
-                print("Đã tải model mới thành công!")
+        self.start_training(epochs)
+    
+    def _run_training(self, epochs):
+        """Thân luồng training: đợi process training, kiểm tra rồi thay model của detector"""
+        current = self.object_detector.model_path if os.path.exists(self.object_detector.model_path) else None
+        try:
+            result = self.object_trainer.train_model(epochs, current, progress=self._on_train_progress,
+                                                     stop_event=self.train_stop)
+            if result and result["completed"]:
+                # Detector nạp xong model mới mới thay, không bỏ frame nào
+                if install_candidate(self.object_detector, result):
+                    print("Đã tải model mới thành công!")
             else:
-                print("Không thể tải model mới!")
+                print("Training thất bại!")
+        except Exception as e:
+            print(f"Lỗi khi training: {str(e)}")
+        finally:
+            self.train_thread = None
+            self.train_progress = None
+    
+    def start_training(self, epochs):
+        """Bắt đầu training ở luồng riêng để luồng lệnh rảnh cho các lệnh quản trị khác"""
+        if self.train_thread is not None:
+            print("Training đang chạy")
+            return
+        print("\nBắt đầu training (process riêng, nhận diện và các lệnh khác vẫn chạy)...")
+        self.train_stop.clear()
+        self.train_thread = threading.Thread(target=self._run_training, args=(epochs,), name="train", daemon=True)
+        self.train_thread.start()
+    
+    def stop_training(self):
+        """Dừng training, lần sau tiếp tục từ checkpoint"""
+        thread = self.train_thread
+        if thread is not None:
+            self.train_stop.set()
+            thread.join()
+    
+    def _on_train_progress(self, epoch, epochs, metrics):
+        """Ghi nhận tiến độ training để vẽ lên frame"""
+        self.train_progress = (epoch, epochs, metrics.get(METRIC_MAP50, 0.0))
+        print_train_progress(epoch, epochs, metrics)
+    
+    def detect_motion(self, packet):
+        """Stage phát hiện thay đổi: đánh dấu vùng cần chạy detector"""
+        with self.metrics.timer("motion"):
+            packet.rois = self.motion_gate.update(packet.frame)
+    
+    def _face_search_region(self, packet):
+        """Vùng cần phát hiện khuôn mặt (x1, y1, x2, y2) theo tọa độ frame gốc, None nếu bỏ qua"""
+        h, w = packet.frame.shape[:2]
+        if packet.rois is None:
+            return 0, 0, w, h
+        if not packet.rois:
+            return None
+        
+        # Gộp vùng thay đổi với các khuôn mặt đang theo dõi để không mất người đứng yên
+        scale = self._face_scale
+        boxes = list(packet.rois) + [
+            (int(left / scale), int(top / scale), int(right / scale), int(bottom / scale))
+            for top, right, bottom, left in (track.box for track in self.face_tracker.tracks if track.missed == 0)
+        ]
+        x1, y1, x2, y2 = union_box(boxes, packet.frame.shape, config.MOTION_ROI_MARGIN)
+        if (x2 - x1) * (y2 - y1) > config.MOTION_FULL_FRAME_RATIO * w * h:
+            return 0, 0, w, h
+        # Làm tròn ra bội số của 32 để kích thước vùng lặp lại và buffer tạm được dùng lại
+        x1, y1 = x1 // 32 * 32, y1 // 32 * 32
+        x2, y2 = min(w, -(-x2 // 32) * 32), min(h, -(-y2 // 32) * 32)
+        return x1, y1, x2, y2
+    
+    def recognize_faces(self, packet):
+        """Stage nhận diện khuôn mặt: phát hiện, mã hóa và so khớp với gallery"""
+        if self.gallery is None or self.face_detector is None:
+            # Model và gallery còn đang được nạp nền
+            packet.faces = []
+            return
+        
+        start = time.perf_counter()
+        region = self._face_search_region(packet) if self.scheduler.should_run("faces") else None
+        
+        if region is None:
+            # Frame bỏ qua phát hiện (theo lịch hoặc cảnh tĩnh): giữ nguyên các track đang thấy
+            tracks = [track for track in self.face_tracker.tracks if track.missed == 0]
+            face_locations = [track.box for track in tracks]
         else:
-            print("Training thất bại!")
+            # Box của tracker tính theo tỉ lệ cũ nên phải bỏ khi đổi tỉ lệ
+            scale = self.scheduler.face_scale
+            if scale != self._face_scale:
+                self.face_tracker.reset()
+                self._face_scale = scale
+            
+            # Chỉ xử lý vùng có thay đổi, thu nhỏ để tăng hiệu suất
+            x1, y1, x2, y2 = region
+            size = (max(1, round((x2 - x1) * scale)), max(1, round((y2 - y1) * scale)))
+            with self.metrics.timer("resize"):
+                small_frame = cv2.resize(packet.frame[y1:y2, x1:x2], size,
+                                         dst=self._scratch.get("small", (size[1], size[0], 3)))
+            with self.metrics.timer("cvtcolor"):
+                rgb_small_frame = self.process_frame(small_frame, self._scratch.get("rgb", small_frame.shape))
+            
+            # Phát hiện và nhận dạng khuôn mặt
+            with self.metrics.timer("face_detect"):
+                face_locations = self.face_detector.detect(rgb_small_frame)
+            
+            # Chỉ mã hóa các khuôn mặt có track mới hoặc đến lượt kiểm tra lại
+            offset_x, offset_y = int(x1 * scale), int(y1 * scale)
+            frame_locations = [(top + offset_y, right + offset_x, bottom + offset_y, left + offset_x)
+                               for top, right, bottom, left in face_locations]
+            tracks = self.face_tracker.update(frame_locations)
+            pending = [i for i, track in enumerate(tracks) if self.face_tracker.needs_encoding(track)]
+            
+            if pending and len(self.gallery):
+                with self.metrics.timer("face_encode"):
+                    face_encodings = encode_faces(rgb_small_frame, [face_locations[i] for i in pending])
+                
+                # So khớp tất cả khuôn mặt cần mã hóa trong frame cùng lúc
+                with self.metrics.timer("face_match"):
+                    user_ids, distances = self.gallery.match(face_encodings, self.tolerance)
+                for i, user_id, distance in zip(pending, user_ids, distances):
+                    self.face_tracker.observe(tracks[i], user_id, distance)
+            face_locations = frame_locations
+        
+        # Scale lại vị trí về kích thước frame gốc
+        scale = self._face_scale
+        packet.faces = [
+            (tuple(int(v / scale) for v in location), track.user_id, track.distance)
+            for location, track in zip(face_locations, tracks)
+        ]
+        elapsed = time.perf_counter() - start
+        self.scheduler.record("faces", elapsed)
+        self.metrics.record("faces_total", elapsed)
+    
+    def detect_objects(self, packet):
+        """Stage nhận diện đồ vật"""
+        start = time.perf_counter()
+        # Cảnh tĩnh thì vẽ lại kết quả cũ thay vì chạy YOLO
+        run_model = self.scheduler.should_run("objects") and packet.rois != []
+        detector = self.object_detector
+        if detector is not None and detector.is_enabled:
+            if run_model:
+                with self.metrics.timer("yolo"):
+                    detector.last_detections = detector.predict(packet.frame)
+            with self.metrics.timer("draw_objects"):
+                packet.frame = detector.draw(packet.frame, detector.last_detections)
+        elapsed = time.perf_counter() - start
+        self.scheduler.record("objects", elapsed)
+        self.metrics.record("objects_total", elapsed)
+    
+    def draw_faces(self, frame, faces):
+        """Vẽ khung và tên cho các khuôn mặt đã nhận diện"""
+        for box, user_id, distance in faces:
+            name = "Không nhận dạng"
+            known_name = self.gallery.name_of(user_id) if user_id is not None and self.gallery is not None else None
+            
+            if known_name is not None:
+                # Thêm độ tin cậy vào tên hiển thị
+                confidence = round((1 - distance) * 100)
+                name = f"{known_name} ({confidence}%)"
+            
+            # Vẽ khung và tên
+            draw_face_box(frame, box, name, known_name is not None)
+    
+    def status_text(self):
+        """Dòng trạng thái hiệu năng vẽ lên frame"""
+        text = self.scheduler.status_text()
+        if self.motion_gate is not None:
+            text += f" | motion skip {self.motion_gate.skip_ratio:.0%}"
+        text += f" | encode {self.face_tracker.encode_ratio:.0%}"
+        pending = self.loader.pending()
+        if pending:
+            text += f" | đang tải {', '.join(pending)}"
+        if self.rebuild_progress is not None and self.rebuild_thread is not None:
+            done, total, rate = self.rebuild_progress
+            text += f" | rebuild {done}/{total} ({rate:.0f}/s)"
+        if self.train_progress is not None:
+            epoch, epochs, map50 = self.train_progress
+            text += f" | train {epoch}/{epochs} (mAP50 {map50:.2f})"
+        command = self.commands.status_text()
+        if command:
+            text += f" | {command}"
+        return text
+    
+    def draw_metrics(self, frame):
+        """Vẽ p50/p95/p99 của từng stage lên frame (dưới dòng trạng thái)"""
+        y = 50 if self.show_status else 25
+        for line in self.metrics.overlay_lines():
+            draw_text_with_background(frame, line, (10, y), font_scale=0.5)
+            y += 20
+    
+    def _on_rebuild_progress(self, done, total, rate):
+        """Ghi nhận tiến độ rebuild để vẽ lên frame"""
+        self.rebuild_progress = (done, total, rate)
+        print(f"Rebuild encoding: {done}/{total} ảnh ({rate:.1f} ảnh/s)")
+    
+    def _run_rebuild(self):
+        """Thân luồng rebuild: encode lại rồi thay gallery (face tracker giữ nhãn cũ tới lần encode sau)"""
+        try:
+            self.data_manager.rebuild_gallery(progress=self._on_rebuild_progress, stop_event=self.rebuild_stop)
+        except Exception as e:
+            print(f"Lỗi khi rebuild encoding: {str(e)}")
+        finally:
+            self.rebuild_thread = None
+            self.rebuild_progress = None
+    
+    def start_rebuild(self):
+        """Bắt đầu rebuild encoding ở luồng nền (bỏ qua nếu đang chạy)"""
+        if self.rebuild_thread is not None:
+            print("Rebuild encoding đang chạy")
+            return
+        self.rebuild_stop.clear()
+        self.rebuild_thread = threading.Thread(target=self._run_rebuild, name="rebuild", daemon=True)
+        self.rebuild_thread.start()
+    
+    def stop_rebuild(self):
+        """Dừng rebuild, phần đã encode được giữ lại trong cache"""
+        thread = self.rebuild_thread
+        if thread is not None:
+            self.rebuild_stop.set()
+            thread.join()
+    
+    def submit_command(self, name, func):
+        """Đưa lệnh quản trị sang luồng lệnh, báo nếu phải xếp hàng sau lệnh khác"""
+        if self.commands.busy:
+            print(f"Lệnh '{name}' được xếp hàng sau {self.commands.status_text()}")
+        return self.commands.submit(name, func)
+    
+    def handle_capture_key(self, key):
+        """Phím của phiên chụp ảnh training: SPACE chụp frame sạch mới nhất, Q kết thúc"""
+        session = self.capture_session
+        if key == ord(' '):
+            # Không dùng frame đang hiển thị: khung/nhãn của detector đã được vẽ lên nó
+            session.capture(self.pipeline.latest_frame())
+        elif key == ord('q'):
+            session.finish()
+    
+    def handle_key(self, key):
+        """Xử lý phím nhấn"""
+        if self.capture_session is not None:
+            self.handle_capture_key(key)
+        elif key == ord('q'):
+            self.is_running = False
+        elif key == ord('h'):
+            self.show_menu()
+        elif key == ord('a') and self._require("faces", "gallery"):
+            self.submit_command("thêm khuôn mặt", self.add_new_face)
+        elif key == ord('f') and self._require("gallery"):
+            self.submit_command("thêm từ file", self.add_face_from_file)
+        elif key == ord('d') and self._require("gallery"):
+            self.submit_command("xóa người dùng", self.delete_user)
+        elif key == ord('i') and self._require("faces", "gallery"):
+            self.submit_command("thêm ảnh", self.add_face_to_existing_user)
+        elif key == ord('v') and self._require("gallery"):
+            self.submit_command("xem thông tin", self.view_user_info)
+        elif key == ord('o') and self._require("objects"):
+            is_enabled = self.object_detector.toggle()
+            print(f"Nhận diện đồ vật: {'Bật' if is_enabled else 'Tắt'}")
+        elif key == ord('c') and self._require("trainer"):
+            self.submit_command("chụp ảnh đồ vật", self.add_object_class)
+        elif key == ord('t') and self._require("trainer", "objects"):
+            self.submit_command("training", self.train_object_detection)
+        elif key == ord('s'):
+            self.show_status = not self.show_status
+            print(f"Trạng thái: {self.status_text()}")
+        elif key == ord('r') and self._require("gallery"):
+            self.start_rebuild()
+        elif key == ord('m'):
+            self.show_metrics = not self.show_metrics
+            # Overlay cần số liệu nên bật đo đạc theo (không tắt lại khi endpoint đang mở)
+            self.metrics.enabled = self.show_metrics or self.metrics_server is not None
+            print(f"Độ trễ từng stage: {'Bật' if self.show_metrics else 'Tắt'}")
     
     def run(self):
         """Chạy ứng dụng nhận diện khuôn mặt"""
@@ -278,96 +620,65 @@ class FaceRecognitionApp:
         print("Nhấn 'h' để hiển thị menu trợ giúp")
         print("Nhấn 'o' để bật/tắt nhận diện đồ vật")
         
-        while self.is_running:
-            ret, frame = self.camera.read()
-            if not ret:
-                break
-                
-            # Xử lý frame để tăng hiệu suất
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            rgb_small_frame = self.process_frame(small_frame)
-            
-            try:
-                # Phát hiện và nhận dạng khuôn mặt
-                face_locations = face_recognition.face_locations(rgb_small_frame, model="hog")
-                
-                if face_locations and self.known_face_encodings:
-                    face_encodings = face_recognition.face_encodings(
-                        rgb_small_frame,
-                        known_face_locations=face_locations,
-                        model="small"
-                    )
+        # Capture, nhận diện khuôn mặt và nhận diện đồ vật chạy trên các luồng riêng;
+        # luồng chính chỉ render vì imshow/waitKey phải gọi từ luồng chính
+        stages = [("faces", self.recognize_faces), ("objects", self.detect_objects)]
+        if self.motion_gate is not None:
+            stages.insert(0, ("motion", self.detect_motion))
+        pool = None
+        if config.FRAME_POOL_ENABLED:
+            pool = FramePool(FramePipeline.buffers_needed(len(stages), config.PIPELINE_QUEUE_SIZE))
+        self.pipeline = FramePipeline(self.camera, stages, queue_size=config.PIPELINE_QUEUE_SIZE, pool=pool)
+        self.pipeline.start()
+        self.commands.start()
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_port).start()
+        
+        try:
+            while self.is_running and self.pipeline.is_alive:
+                packet = self.pipeline.get()
+                if packet is not None:
+                    with self.metrics.timer("draw_faces"):
+                        self.draw_faces(packet.frame, packet.faces)
+                    if self.show_status:
+                        draw_text_with_background(packet.frame, self.status_text(), (10, 25))
+                    if self.show_metrics:
+                        self.draw_metrics(packet.frame)
+                    session = self.capture_session
+                    if session is not None:
+                        draw_text_with_background(packet.frame, session.status_text(),
+                                                  (10, packet.frame.shape[0] - 15))
                     
-                    # Xử lý từng khuôn mặt
-                    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                        name = "Không nhận dạng"
-                        
-                        if self.known_face_encodings:
-                            # Tính toán khoảng cách Euclidean với tất cả khuôn mặt đã biết
-                            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                            
-                            # Tìm khoảng cách nhỏ nhất và index tương ứng
-                            min_distance_idx = np.argmin(face_distances)
-                            min_distance = face_distances[min_distance_idx]
-                            
-                            # Chỉ nhận dạng nếu khoảng cách đủ nhỏ (tolerance thấp hơn để nghiêm ngặt hơn)
-                            if min_distance < 0.4:  # Giảm tolerance từ 0.6 xuống 0.4
-                                name = self.known_face_names[min_distance_idx]
-                                # Thêm độ tin cậy vào tên hiển thị
-                                confidence = round((1 - min_distance) * 100)
-                                name = f"{name} ({confidence}%)"
-                            else:
-                                # Nếu khoảng cách quá lớn, đánh dấu là không nhận dạng
-                                name = "Không nhận dạng"
-                        
-                        # Scale lại vị trí
-                        top *= 4
-                        right *= 4
-                        bottom *= 4
-                        left *= 4
-                        
-                        # Vẽ khung và tên
-                        color = (0, 255, 0) if name != "Không nhận dạng" else (0, 0, 255)
-                        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                        draw_text_with_background(frame, name, (left + 6, bottom - 6))
+                    # Hiển thị frame (imshow + waitKey là chi phí render của luồng chính)
+                    with self.metrics.timer("imshow"):
+                        cv2.imshow('Face Recognition', packet.frame)
+                        key = cv2.waitKey(1) & 0xFF
                     
-            except Exception as e:
-                print(f"Lỗi khi xử lý frame: {str(e)}")
-                continue
+                    # imshow đã chép frame nên buffer có thể trả về pool ngay
+                    packet.release()
+                else:
+                    key = cv2.waitKey(1) & 0xFF
                 
-            # Nhận diện đồ vật
-            frame = self.object_detector.detect_objects(frame)
-            
-            # Hiển thị frame
-            cv2.imshow('Face Recognition', frame)
-            
-            # Xử lý phím nhấn
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                self.is_running = False
-            elif key == ord('h'):
-                self.show_menu()
-            elif key == ord('a'):
-                self.add_new_face()
-            elif key == ord('f'):
-                self.add_face_from_file()
-            elif key == ord('d'):
-                self.delete_user()
-            elif key == ord('i'):
-                self.add_face_to_existing_user()
-            elif key == ord('v'):
-                self.view_user_info()
-            elif key == ord('o'):
-                is_enabled = self.object_detector.toggle()
-                print(f"Nhận diện đồ vật: {'Bật' if is_enabled else 'Tắt'}")
-            elif key == ord('c'):
-                self.add_object_class()
-            elif key == ord('t'):
-                self.train_object_detection()
-        
-        # Giải phóng tài nguyên
-        self.camera.release()
-        cv2.destroyAllWindows()
+                # Xử lý phím nhấn
+                self.handle_key(key)
+        finally:
+            session = self.capture_session
+            if session is not None:
+                session.finish()
+            if not self.commands.stop(timeout=1.0):
+                # Luồng lệnh là daemon: lệnh đang đợi input() bị bỏ khi thoát
+                print("Lệnh quản trị chưa xong, bị hủy khi thoát")
+            self.stop_training()
+            self.stop_rebuild()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+                self.metrics_server = None
+            self.pipeline.stop()
+            self.pipeline = None
+            
+            # Giải phóng tài nguyên
+            self.camera.release()
+            cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     app = FaceRecognitionApp()
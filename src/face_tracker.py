@@ -0,0 +1,110 @@
+from collections import Counter, deque
+import numpy as np
+from src import config
+
+
+def box_iou(boxes_a, boxes_b):
+    """Ma trận IoU giữa hai danh sách box dạng (top, right, bottom, left)"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+class FaceTrack:
+    """Một khuôn mặt được theo dõi qua nhiều frame"""
+
+    def __init__(self, track_id, box, vote_window):
+        self.track_id = track_id
+        self.box = box
+        self.votes = deque(maxlen=vote_window)  # (user_id, distance) của các lần so khớp gần nhất
+        self.user_id = None
+        self.distance = float("inf")
+        self.frames_since_encode = 0
+        self.missed = 0
+
+    def add_vote(self, user_id, distance):
+        """Thêm kết quả so khớp và làm mượt danh tính bằng bỏ phiếu đa số"""
+        self.votes.append((user_id, float(distance)))
+        self.frames_since_encode = 0
+        self.user_id, _ = Counter(vote for vote, _ in self.votes).most_common(1)[0]
+        distances = [d for vote, d in self.votes if vote == self.user_id]
+        self.distance = sum(distances) / len(distances)
+
+
+class FaceTracker:
+    """Theo dõi khuôn mặt bằng IoU để chỉ mã hóa lại khi có track mới hoặc sau mỗi N frame"""
+
+    def __init__(self, iou_threshold=None, max_missed=None, reencode_interval=None, vote_window=None):
+        self.iou_threshold = config.TRACKER_IOU_THRESHOLD if iou_threshold is None else iou_threshold
+        self.max_missed = config.TRACKER_MAX_MISSED if max_missed is None else max_missed
+        self.reencode_interval = (config.TRACKER_REENCODE_INTERVAL
+                                  if reencode_interval is None else reencode_interval)
+        self.vote_window = config.TRACKER_VOTE_WINDOW if vote_window is None else vote_window
+        self.tracks = []
+        self._next_id = 0
+
+        # Thống kê số khuôn mặt phải mã hóa so với tổng số khuôn mặt
+        self.faces_seen = 0
+        self.faces_encoded = 0
+
+    def reset(self):
+        """Xóa toàn bộ track (ví dụ khi gallery thay đổi)"""
+        self.tracks = []
+
+    def update(self, boxes):
+        """Gán các box của frame hiện tại vào track, trả về track tương ứng với từng box"""
+        assigned = [None] * len(boxes)
+        unmatched_tracks = set(range(len(self.tracks)))
+
+        if boxes and self.tracks:
+            iou = box_iou(boxes, [track.box for track in self.tracks])
+            # Ghép tham lam theo IoU giảm dần
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                box_idx, track_idx = np.unravel_index(flat, iou.shape)
+                if iou[box_idx, track_idx] < self.iou_threshold:
+                    break
+                if assigned[box_idx] is not None or track_idx not in unmatched_tracks:
+                    continue
+                track = self.tracks[track_idx]
+                track.box = boxes[box_idx]
+                track.missed = 0
+                track.frames_since_encode += 1
+                assigned[box_idx] = track
+                unmatched_tracks.discard(track_idx)
+
+        # Track không còn thấy quá lâu thì bỏ
+        for track_idx in unmatched_tracks:
+            self.tracks[track_idx].missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for box_idx, box in enumerate(boxes):
+            if assigned[box_idx] is None:
+                track = FaceTrack(self._next_id, box, self.vote_window)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[box_idx] = track
+
+        self.faces_seen += len(boxes)
+        return assigned
+
+    def needs_encoding(self, track):
+        """Track mới hoặc đã quá N frame kể từ lần mã hóa gần nhất"""
+        return not track.votes or track.frames_since_encode >= self.reencode_interval
+
+    def observe(self, track, user_id, distance):
+        """Ghi nhận kết quả so khớp của track"""
+        track.add_vote(user_id, distance)
+        self.faces_encoded += 1
+
+    @property
+    def encode_ratio(self):
+        """Tỉ lệ khuôn mặt thực sự phải mã hóa"""
+        return self.faces_encoded / self.faces_seen if self.faces_seen else 0.0
@@ -0,0 +1,67 @@
+import threading
+from collections import deque
+import numpy as np
+
+
+class FramePool:
+    """Các buffer frame cấp phát sẵn, được camera.read(image=...) ghi đè thay vì cấp phát mới
+
+    Buffer được trả lại pool khi packet bị bỏ (hàng đợi đầy) hoặc đã hiển thị xong. Nếu mọi
+    buffer đang được dùng thì cấp phát thêm một buffer, nên sau lúc khởi động bộ nhớ giữ ổn định.
+    """
+
+    def __init__(self, size):
+        self.size = size  # số buffer cấp phát sẵn khi biết kích thước frame
+        self.shape = None
+        self.dtype = None
+        self.allocated = 0  # tổng số buffer đã cấp phát
+        self._free = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Lấy một buffer rảnh, None nếu chưa biết kích thước frame (camera tự cấp phát)"""
+        with self._lock:
+            if self._free:
+                return self._free.popleft()
+            if self.shape is None:
+                return None
+            self.allocated += 1
+        return np.empty(self.shape, dtype=self.dtype)
+
+    def adopt(self, frame):
+        """Ghi nhận kích thước frame thực tế và cấp phát sẵn toàn bộ pool ở frame đầu tiên"""
+        if frame.shape == self.shape and frame.dtype == self.dtype:
+            return
+        with self._lock:
+            # Đổi độ phân giải: bỏ các buffer cũ không còn dùng được
+            self.shape, self.dtype = frame.shape, frame.dtype
+            self._free = deque(np.empty(self.shape, dtype=self.dtype) for _ in range(self.size - 1))
+            self.allocated += self.size - 1
+
+    def release(self, buffer):
+        """Trả buffer về pool"""
+        with self._lock:
+            if buffer.shape == self.shape and buffer.dtype == self.dtype:
+                self._free.append(buffer)
+
+    @property
+    def free(self):
+        return len(self._free)
+
+
+class ScratchBuffers:
+    """Buffer tạm theo tên cho các bước resize/cvtColor, chỉ cấp phát lại khi kích thước đổi
+
+    Chỉ dùng trong một luồng (mỗi stage giữ một bộ riêng).
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.allocated = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+            self.allocated += 1
+        return buffer
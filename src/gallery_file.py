@@ -0,0 +1,103 @@
+import os
+import json
+import struct
+import numpy as np
+from src.face_gallery import FaceGallery
+
+# Định dạng file gallery (little-endian):
+#   header 64 byte: magic, version, kiểu encoding, dim, số dòng, số người, vị trí/kích thước
+#                   bảng identity, vị trí khối sq_norms (float32) và khối encoding
+#   bảng identity: JSON {"key": ..., "identities": [[user_id, tên, dòng bắt đầu, số dòng], ...]}
+#   khối sq_norms và khối encoding được căn 64 byte để np.memmap đọc trực tiếp
+MAGIC = b"FGAL"
+VERSION = 1
+HEADER = struct.Struct("<4sHBBIQQQQQQ")
+HEADER_SIZE = 64
+ALIGN = 64
+DTYPES = {"float32": (0, np.float32), "float16": (1, np.float16)}
+DTYPE_CODES = {code: dtype for code, dtype in DTYPES.values()}
+
+
+def _align(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def save_gallery_file(path, gallery, dtype="float32", key=None):
+    """Ghi gallery ra file nhị phân (ghi file tạm rồi đổi tên để tiến trình khác không đọc file dở)"""
+    code, np_dtype = DTYPES[dtype]
+    with gallery._lock:
+        # Sắp xếp dòng theo người dùng để mỗi người là một đoạn liên tiếp
+        rows_by_user = {}
+        for row, user_id in enumerate(gallery.row_users):
+            rows_by_user.setdefault(user_id, []).append(row)
+        identities = []
+        order = []
+        for user_id in gallery.user_ids():
+            rows = rows_by_user.get(user_id, [])
+            identities.append([user_id, gallery.name_of(user_id), len(order), len(rows)])
+            order.extend(rows)
+        matrix = np.asarray(gallery.matrix[order], dtype=np.float32)
+        dim = gallery.dim
+
+    encodings = matrix.astype(np_dtype)
+    # Norm tính trên giá trị đã lưu để khoảng cách khớp với ma trận float16
+    stored = encodings.astype(np.float32)
+    sq_norms = np.einsum('ij,ij->i', stored, stored).astype(np.float32)
+    table = json.dumps({"key": key, "identities": identities}, ensure_ascii=False).encode("utf-8")
+
+    table_offset = HEADER_SIZE
+    norms_offset = _align(table_offset + len(table))
+    block_offset = _align(norms_offset + sq_norms.nbytes)
+    header = HEADER.pack(MAGIC, VERSION, code, 0, dim, len(encodings), len(identities),
+                         table_offset, len(table), norms_offset, block_offset)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(table)
+        f.seek(norms_offset)
+        f.write(sq_norms.tobytes())
+        f.seek(block_offset)
+        f.write(encodings.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """Đọc header và bảng identity, None nếu file không tồn tại hoặc sai định dạng/phiên bản"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read(HEADER_SIZE)
+            if len(raw) < HEADER.size:
+                return None
+            (magic, version, code, _, dim, rows, users, table_offset, table_size,
+             norms_offset, block_offset) = HEADER.unpack(raw[:HEADER.size])
+            if magic != MAGIC or version != VERSION or code not in DTYPE_CODES:
+                return None
+            f.seek(table_offset)
+            table = json.loads(f.read(table_size).decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+    return {"dtype": DTYPE_CODES[code], "dim": dim, "rows": rows, "users": users,
+            "norms_offset": norms_offset, "block_offset": block_offset,
+            "key": table["key"], "identities": table["identities"]}
+
+
+def load_gallery_file(path, key=None, index_backend=None, index_options=None):
+    """Mở file gallery bằng np.memmap (nhiều tiến trình dùng chung page cache)
+
+    Trả về None nếu file không dùng được hoặc key không khớp (dữ liệu nguồn đã đổi).
+    """
+    header = read_header(path)
+    if header is None or (key is not None and header["key"] != key):
+        return None
+    rows, dim = header["rows"], header["dim"]
+    # File bị cắt (ví dụ ghi dở bằng công cụ khác) thì memmap sẽ lỗi: coi như không dùng được
+    if os.path.getsize(path) < header["block_offset"] + rows * dim * np.dtype(header["dtype"]).itemsize:
+        return None
+    if rows:
+        sq_norms = np.memmap(path, dtype=np.float32, mode='r', offset=header["norms_offset"], shape=(rows,))
+        matrix = np.memmap(path, dtype=header["dtype"], mode='r', offset=header["block_offset"], shape=(rows, dim))
+    else:
+        sq_norms = np.zeros(0, dtype=np.float32)
+        matrix = np.zeros((0, dim), dtype=np.float32)
+    return FaceGallery.from_arrays(matrix, sq_norms, header["identities"], index_backend, index_options)
@@ -0,0 +1,119 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from src import config
+from src.face_detectors import create_face_detector
+from src.face_analysis import analyze_image
+
+# Detector riêng của từng worker process
+_worker = {}
+
+
+def _init_worker():
+    """Khởi tạo detector trong worker process"""
+    cv2.setNumThreads(1)
+    _worker["face_detector"] = create_face_detector()
+
+
+def encode_first_face(image_path):
+    """Mã hóa khuôn mặt đầu tiên trong ảnh giống DataManager; trả về (đường dẫn, encoding, lỗi)
+
+    Ảnh không có khuôn mặt cho encoding None và không có lỗi (vẫn được ghi vào cache).
+    """
+    import face_recognition
+    try:
+        image = face_recognition.load_image_file(image_path)
+        return image_path, analyze_image(image, _worker["face_detector"], max_faces=1).encoding, None
+    except Exception as e:
+        return image_path, None, f"Lỗi khi xử lý ảnh: {str(e)}"
+
+
+def print_progress(done, total, rate):
+    """In tiến độ mặc định của rebuild"""
+    eta = (total - done) / rate if rate > 0 else 0
+    print(f"Rebuild encoding: {done}/{total} ảnh ({rate:.1f} ảnh/s, còn khoảng {eta:.0f}s)")
+
+
+def missing_images(data_manager):
+    """Danh sách ảnh chưa có encoding hợp lệ trong cache"""
+    with data_manager.lock:
+        pending = []
+        for _, user_data in data_manager.store.iter_users():
+            for image_path in user_data["images"]:
+                if os.path.exists(image_path) and not data_manager.encoding_cache.lookup(image_path)[0]:
+                    pending.append(image_path)
+        return pending
+
+
+def _checkpoint(data_manager, results):
+    """Nối một lô kết quả vào journal của cache để lần chạy sau tiếp tục từ đây"""
+    with data_manager.lock:
+        for image_path, encoding in results:
+            data_manager.encoding_cache.put(image_path, encoding)
+        data_manager.encoding_cache.checkpoint()
+    results.clear()
+
+
+def encode_missing(data_manager, workers=None, chunksize=4, checkpoint_every=None,
+                   progress=print_progress, stop_event=None):
+    """Encode song song các ảnh còn thiếu trong cache, checkpoint định kỳ
+
+    Trả về tóm tắt {"images", "encoded", "errors", "seconds", "completed"}; completed=False
+    khi bị dừng giữa chừng qua stop_event (phần đã xong vẫn nằm trong cache).
+    """
+    checkpoint_every = checkpoint_every or config.REBUILD_CHECKPOINT_EVERY
+    pending = missing_images(data_manager)
+    total = len(pending)
+    summary = {"images": total, "encoded": 0, "errors": [], "seconds": 0.0, "completed": True}
+    if not total:
+        return summary
+
+    # spawn thay vì fork: process cha có thể đang chạy luồng camera/pipeline
+    context = multiprocessing.get_context("spawn")
+    results = []
+    start = time.perf_counter()
+    last_report = start
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context,
+                             initializer=_init_worker) as executor:
+        for done, (image_path, encoding, error) in enumerate(
+                executor.map(encode_first_face, pending, chunksize=chunksize), 1):
+            if error:
+                summary["errors"].append((image_path, error))
+            else:
+                results.append((image_path, encoding))
+                summary["encoded"] += 1
+            if len(results) >= checkpoint_every:
+                _checkpoint(data_manager, results)
+
+            now = time.perf_counter()
+            if progress is not None and (now - last_report >= 1.0 or done == total):
+                progress(done, total, done / (now - start))
+                last_report = now
+            if stop_event is not None and stop_event.is_set():
+                summary["completed"] = False
+                executor.shutdown(wait=True, cancel_futures=True)
+                break
+    _checkpoint(data_manager, results)
+    # Gộp journal vào ma trận chính một lần ở cuối
+    with data_manager.lock:
+        data_manager.encoding_cache.save()
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def rebuild_gallery(data_manager, workers=None, progress=print_progress, stop_event=None):
+    """Encode lại các ảnh còn thiếu rồi thay gallery đang dùng bằng gallery mới trong một bước
+
+    Trong lúc encode, ứng dụng vẫn so khớp trên gallery cũ.
+    """
+    summary = encode_missing(data_manager, workers, progress=progress, stop_event=stop_event)
+    if summary["completed"]:
+        data_manager.swap_gallery()
+    print(f"Rebuild {'hoàn tất' if summary['completed'] else 'tạm dừng (chạy lại để tiếp tục)'}: "
+          f"{summary['encoded']}/{summary['images']} ảnh trong {summary['seconds']}s, "
+          f"{len(summary['errors'])} lỗi")
+    for image_path, error in summary["errors"][:20]:
+        print(f"- {image_path}: {error}")
+    return summary
@@ -0,0 +1,161 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from src import config
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _NullTimer:
+    """Timer rỗng dùng khi tắt đo đạc (không tốn chi phí cấp phát)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    """Context manager đo thời gian một lần chạy stage"""
+
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class LatencyWindow:
+    """Cửa sổ trượt các mẫu độ trễ gần nhất (ring buffer) cùng tổng tích lũy"""
+
+    def __init__(self, size):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.filled = 0
+        self.position = 0
+        self.count = 0  # tổng số mẫu từ lúc khởi động
+        self.total = 0.0  # tổng thời gian từ lúc khởi động (giây)
+
+    def add(self, seconds):
+        self.samples[self.position] = seconds
+        self.position = (self.position + 1) % len(self.samples)
+        self.filled = min(self.filled + 1, len(self.samples))
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self):
+        """p50/p95/p99 của cửa sổ hiện tại (giây)"""
+        if not self.filled:
+            return [0.0] * len(QUANTILES)
+        return list(np.quantile(self.samples[:self.filled], QUANTILES))
+
+
+class Metrics:
+    """Bộ đếm thời gian theo stage với p50/p95/p99 trên cửa sổ trượt"""
+
+    def __init__(self, enabled=None, window=None):
+        self.enabled = config.METRICS_ENABLED if enabled is None else enabled
+        self.window = window or config.METRICS_WINDOW
+        self._stages = {}  # stage -> LatencyWindow, giữ thứ tự stage xuất hiện
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        """Context manager đo một stage; gần như không tốn gì khi đang tắt"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def record(self, stage, seconds):
+        """Ghi nhận thời gian của một stage (giây)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            window = self._stages.get(stage)
+            if window is None:
+                window = self._stages[stage] = LatencyWindow(self.window)
+            window.add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def snapshot(self):
+        """{stage: {"count", "sum", "p50", "p95", "p99"}} với thời gian tính bằng giây"""
+        with self._lock:
+            stages = [(stage, window.count, window.total, window.quantiles())
+                      for stage, window in self._stages.items()]
+        return {
+            stage: dict(count=count, sum=total, **{f"p{round(q * 100)}": value
+                                                    for q, value in zip(QUANTILES, quantiles)})
+            for stage, count, total, quantiles in stages
+        }
+
+    def overlay_lines(self):
+        """Các dòng mô tả độ trễ từng stage để vẽ lên frame"""
+        return [f"{stage}: p50 {s['p50'] * 1000:.1f} p95 {s['p95'] * 1000:.1f} "
+                f"p99 {s['p99'] * 1000:.1f} ms"
+                for stage, s in self.snapshot().items()]
+
+    def prometheus_text(self, prefix="face_app"):
+        """Xuất dạng text của Prometheus (kiểu summary)"""
+        name = f"{prefix}_stage_seconds"
+        lines = [f"# HELP {name} Thời gian xử lý theo stage (cửa sổ {self.window} mẫu gần nhất)",
+                 f"# TYPE {name} summary"]
+        for stage, s in self.snapshot().items():
+            for q in QUANTILES:
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {s[f"p{round(q * 100)}"]:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {s["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {s["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP endpoint cục bộ trả về metrics dạng Prometheus tại /metrics"""
+
+    def __init__(self, metrics, port=None, host=None):
+        self.metrics = metrics
+        self.port = config.METRICS_PORT if port is None else port
+        self.host = host or config.METRICS_HOST
+        self._server = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics: http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,68 @@
+import threading
+import cv2
+import numpy as np
+from src import config
+
+
+class MotionGate:
+    """Phát hiện thay đổi rẻ trên frame thu nhỏ để bỏ qua hoặc khoanh vùng các detector tốn kém"""
+
+    def __init__(self, width=None, threshold=None, min_area=None, learning_rate=None):
+        self.width = config.MOTION_WIDTH if width is None else width
+        self.threshold = config.MOTION_THRESHOLD if threshold is None else threshold
+        self.min_area = config.MOTION_MIN_AREA if min_area is None else min_area
+        self.learning_rate = config.MOTION_LEARNING_RATE if learning_rate is None else learning_rate
+
+        self._background = None  # nền cập nhật dần (float32, ảnh xám thu nhỏ)
+        self._kernel = np.ones((3, 3), dtype=np.uint8)
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.static_frames = 0  # số frame không có thay đổi (detector được bỏ qua)
+
+    def update(self, frame):
+        """Cập nhật nền và trả về các vùng thay đổi [(x1, y1, x2, y2)] theo tọa độ frame gốc"""
+        h, w = frame.shape[:2]
+        ratio = self.width / float(w)
+        small = cv2.resize(frame, (self.width, int(h * ratio)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        with self._lock:
+            self.frames += 1
+            if self._background is None or self._background.shape != gray.shape:
+                # Frame đầu tiên: chưa có nền, coi như cả frame thay đổi
+                self._background = gray.astype(np.float32)
+                return [(0, 0, w, h)]
+
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+            cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_area = self.min_area * mask.shape[0] * mask.shape[1]
+        rois = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area:
+                continue
+            x, y, bw, bh = cv2.boundingRect(contour)
+            rois.append((int(x / ratio), int(y / ratio), int((x + bw) / ratio), int((y + bh) / ratio)))
+
+        if not rois:
+            with self._lock:
+                self.static_frames += 1
+        return rois
+
+    @property
+    def skip_ratio(self):
+        """Tỉ lệ frame tĩnh mà detector được bỏ qua"""
+        return self.static_frames / self.frames if self.frames else 0.0
+
+
+def union_box(boxes, frame_shape, margin=0):
+    """Box bao tất cả các box (x1, y1, x2, y2), nới thêm margin và cắt theo kích thước frame"""
+    h, w = frame_shape[:2]
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    x1, y1 = boxes[:, :2].min(axis=0) - margin
+    x2, y2 = boxes[:, 2:].max(axis=0) + margin
+    return max(0, int(x1)), max(0, int(y1)), min(w, int(x2)), min(h, int(y2))
@@ -0,0 +1,190 @@
+import time
+import queue
+import threading
+import cv2
+from src import config
+from src.face_detectors import create_face_detector
+from src.face_analysis import encode_faces
+from src.data_manager import DataManager
+from src.object_detection import ObjectDetector, Detections
+from src.face_tracker import FaceTracker
+from src.pipeline import DropOldestQueue, CaptureThread
+from utils.image_utils import draw_text_with_background, draw_face_box
+
+
+class CameraSource:
+    """Một camera: luồng capture riêng, tracker riêng và thống kê FPS/độ trễ"""
+
+    def __init__(self, camera_id, source, stop_event):
+        self.camera_id = camera_id
+        self.source = source
+        self.camera = cv2.VideoCapture(source)
+        self.queue = DropOldestQueue(1)  # chỉ giữ frame mới nhất
+        self.capture = CaptureThread(self.camera, self.queue, stop_event)
+        self.tracker = FaceTracker()
+
+        self.latest = None  # packet đã xử lý gần nhất
+        self.rendered_frame_id = None  # frame_id đã hiển thị, để không vẽ lại cùng một packet
+        self.fps = 0.0
+        self.latency = 0.0  # giây từ lúc đọc frame tới lúc có kết quả
+        self.processed = 0
+        self._last_publish = None
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Lấy frame mới nhất chưa xử lý, None nếu chưa có"""
+        try:
+            return self.queue.get(timeout=0)
+        except queue.Empty:
+            return None
+
+    def publish(self, packet):
+        """Lưu kết quả và cập nhật thống kê"""
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_publish is not None:
+                fps = 1.0 / max(now - self._last_publish, 1e-6)
+                self.fps = fps if not self.processed else 0.9 * self.fps + 0.1 * fps
+            latency = now - packet.timestamp
+            self.latency = latency if not self.processed else 0.9 * self.latency + 0.1 * latency
+            self._last_publish = now
+            self.processed += 1
+            self.latest = packet
+
+    def stats(self):
+        with self._lock:
+            return {
+                "camera": self.camera_id,
+                "fps": round(self.fps, 1),
+                "latency_ms": round(self.latency * 1000, 1),
+                "processed": self.processed,
+                "dropped": self.queue.dropped
+            }
+
+
+class InferenceService(threading.Thread):
+    """Một luồng suy luận dùng chung cho mọi camera: một gallery, một model YOLO"""
+
+    def __init__(self, cameras, gallery, object_detector, stop_event, tolerance=None, scale=None):
+        super().__init__(daemon=True)
+        self.cameras = cameras
+        self.gallery = gallery
+        self.object_detector = object_detector
+        self.stop_event = stop_event
+        self.tolerance = config.FACE_MATCH_TOLERANCE if tolerance is None else tolerance
+        self.scale = config.FACE_SCALE_MAX if scale is None else scale
+        self.face_detector = create_face_detector()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            batch = [(camera, packet) for camera in self.cameras
+                     for packet in [camera.poll()] if packet is not None]
+            if not batch:
+                time.sleep(0.002)
+                continue
+            try:
+                self.process(batch)
+            except Exception as e:
+                print(f"Lỗi khi xử lý frame: {str(e)}")
+
+    def process(self, batch):
+        """Xử lý một frame của mỗi camera; mọi khuôn mặt được so khớp trong một lần"""
+        encodings = []
+        owners = []  # (camera, track) của từng encoding
+        located = []
+        for camera, packet in batch:
+            small_frame = cv2.resize(packet.frame, (0, 0), fx=self.scale, fy=self.scale)
+            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+            face_locations = self.face_detector.detect(rgb_small_frame)
+
+            # Mỗi camera có tracker riêng, chỉ mã hóa track mới hoặc đến lượt kiểm tra lại
+            tracks = camera.tracker.update(face_locations)
+            pending = [i for i, track in enumerate(tracks) if camera.tracker.needs_encoding(track)]
+            if pending and len(self.gallery):
+                encodings.extend(encode_faces(rgb_small_frame, [face_locations[i] for i in pending]))
+                owners.extend((camera, tracks[i]) for i in pending)
+            located.append((face_locations, tracks))
+
+        if encodings:
+            user_ids, distances = self.gallery.match(encodings, self.tolerance)
+            for (camera, track), user_id, distance in zip(owners, user_ids, distances):
+                camera.tracker.observe(track, user_id, distance)
+
+        # Một lần gọi YOLO cho frame của mọi camera
+        if self.object_detector.is_enabled:
+            detections = self.object_detector.detect_batch([packet.frame for _, packet in batch])
+        else:
+            detections = [Detections.empty()] * len(batch)
+
+        for (camera, packet), (face_locations, tracks), objects in zip(batch, located, detections):
+            packet.faces = [
+                (tuple(int(v / self.scale) for v in location), track.user_id, track.distance)
+                for location, track in zip(face_locations, tracks)
+            ]
+            packet.objects = objects
+            camera.publish(packet)
+
+
+class MultiCameraApp:
+    """Nhận diện trên nhiều camera với một backend suy luận dùng chung"""
+
+    def __init__(self, sources):
+        self.data_manager = DataManager()
+        self.gallery = self.data_manager.load_gallery()
+        self.object_detector = ObjectDetector()
+
+        self.stop_event = threading.Event()
+        self.cameras = [CameraSource(i, source, self.stop_event) for i, source in enumerate(sources)]
+        self.service = InferenceService(self.cameras, self.gallery, self.object_detector, self.stop_event)
+
+    def render(self, camera):
+        """Vẽ kết quả gần nhất của camera lên cửa sổ riêng"""
+        packet = camera.latest
+        # Chưa có packet mới kể từ lần hiển thị trước: cửa sổ vẫn giữ ảnh cũ, bỏ qua copy và imshow
+        if packet is None or packet.frame_id == camera.rendered_frame_id:
+            return
+        camera.rendered_frame_id = packet.frame_id
+        frame = packet.frame.copy()
+        for box, user_id, distance in packet.faces:
+            known_name = self.gallery.name_of(user_id) if user_id is not None else None
+            label = f"{known_name} ({round((1 - distance) * 100)}%)" if known_name else "Không nhận dạng"
+            draw_face_box(frame, box, label, known_name is not None)
+        self.object_detector.draw(frame, packet.objects)
+
+        stats = camera.stats()
+        draw_text_with_background(frame, f"cam {camera.camera_id}: {stats['fps']} fps, "
+                                         f"{stats['latency_ms']} ms", (10, 25))
+        cv2.imshow(f"Camera {camera.camera_id}", frame)
+
+    def run(self):
+        """Chạy capture cho từng camera, suy luận dùng chung và hiển thị"""
+        print(f"Khởi động {len(self.cameras)} camera... Nhấn 'q' để thoát, 'o' để bật/tắt nhận diện đồ vật")
+        for camera in self.cameras:
+            camera.capture.start()
+        self.service.start()
+
+        last_report = time.perf_counter()
+        try:
+            while any(not camera.capture.failed for camera in self.cameras):
+                for camera in self.cameras:
+                    self.render(camera)
+
+                # In thống kê từng camera định kỳ
+                if time.perf_counter() - last_report >= 5:
+                    last_report = time.perf_counter()
+                    for camera in self.cameras:
+                        print(camera.stats())
+
+                key = cv2.waitKey(10) & 0xFF
+                if key == ord('q'):
+                    break
+                elif key == ord('o'):
+                    is_enabled = self.object_detector.toggle()
+                    print(f"Nhận diện đồ vật: {'Bật' if is_enabled else 'Tắt'}")
+        finally:
+            self.stop_event.set()
+            self.service.join(timeout=1)
+            for camera in self.cameras:
+                camera.capture.join(timeout=1)
+                camera.camera.release()
+            cv2.destroyAllWindows()
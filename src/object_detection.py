@@ -1,51 +1,125 @@
-import cv2
 import os
 import numpy as np
-from ultralytics import YOLO
+from src import config
+from utils.image_utils import draw_detections
+
+CONFIDENCE_THRESHOLD = 0.5
+
+class Detections:
+    """Kết quả nhận diện của một frame dưới dạng mảng NumPy gọn"""
+    __slots__ = ("boxes", "classes", "scores", "names")
+    
+    def __init__(self, boxes, classes, scores, names=None):
+        self.boxes = boxes  # (N, 4) int32: x1, y1, x2, y2
+        self.classes = classes  # (N,) int32
+        self.scores = scores  # (N,) float32
+        self.names = names  # tên class của model đã tạo ra kết quả (đúng cả khi model vừa bị thay)
+        
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), dtype=np.int32), np.zeros(0, dtype=np.int32),
+                   np.zeros(0, dtype=np.float32))
+        
+    def __len__(self):
+        return len(self.scores)
 
 class ObjectDetector:
-    def __init__(self):
+    def __init__(self, backend=None):
         """Khởi tạo model YOLO"""
         self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.model_path = os.path.join(self.base_dir, "data", "models", "train", "weights", "best.pt")
+        self.backend = config.OBJECT_BACKEND if backend is None else backend
+        self.imgsz = config.OBJECT_IMGSZ
         
         # Nếu có custom model thì dùng, không thì dùng model mặc định
         if os.path.exists(self.model_path):
-            self.model = YOLO(self.model_path)
+            self._load_model(self.model_path)
         else:
-            self.model = YOLO('yolov8n.pt')
+            self._load_model('yolov8n.pt')
             
-        self.classes = self.model.names
         self.is_enabled = True  # flag để bật/tắt nhận diện đồ vật
+        self.last_detections = Detections.empty()  # kết quả gần nhất, vẽ lại ở các frame bỏ qua YOLO
+        
+    def _load_model(self, weights):
+        """Load weights, chuẩn bị backend ONNX (nếu được chọn) và warm-up"""
+        from ultralytics import YOLO  # import chậm (kéo theo torch), chỉ nạp khi cần model
+        model = YOLO(weights)
+        onnx_backend = None
+        
+        if self.backend == "onnx":
+            try:
+                from src.onnx_backend import OnnxYoloBackend, export_onnx
+                weights_path = getattr(model, "ckpt_path", None) or weights
+                onnx_path = export_onnx(model, weights_path, self.imgsz, config.OBJECT_INT8)
+                onnx_backend = OnnxYoloBackend(onnx_path, self.imgsz, config.OBJECT_ONNX_PROVIDERS)
+            except Exception as e:
+                print(f"Không thể dùng backend ONNX, chuyển về PyTorch: {str(e)}")
+        
+        # Warm-up trên model mới trước khi thay: stage nhận diện đồ vật vẫn đang gọi model cũ
+        # (predictor của ultralytics không an toàn khi dùng từ nhiều luồng)
+        self._warmup(model, onnx_backend)
+        # Một phép gán duy nhất: luồng khác không thấy model mới đi cùng class/backend cũ
+        self._loaded = (model, model.names, onnx_backend)
+        
+    @property
+    def model(self):
+        return self._loaded[0]
+        
+    @property
+    def classes(self):
+        return self._loaded[1]
+        
+    @property
+    def onnx_backend(self):
+        return self._loaded[2]
         
-    def detect_objects(self, frame):
-        """Nhận diện đồ vật trong frame"""
+    def _warmup(self, model, onnx_backend):
+        """Chạy thử một frame rỗng để lần suy luận đầu tiên không bị chậm"""
+        self._run_model(model, onnx_backend, [np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)])
+        
+    def detect_batch(self, frames):
+        """Chạy model trên nhiều frame trong một lần gọi, trả về list[Detections]"""
+        model, classes, onnx_backend = self._loaded
+        detections = self._run_model(model, onnx_backend, frames)
+        for result in detections:
+            result.names = classes
+        return detections
+        
+    def _run_model(self, model, onnx_backend, frames):
+        if not len(frames):
+            return []
+        if onnx_backend is not None:
+            return onnx_backend.detect_batch(frames, CONFIDENCE_THRESHOLD)
+        results = model(list(frames), conf=CONFIDENCE_THRESHOLD, imgsz=self.imgsz, verbose=False)
+        
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            detections.append(Detections(
+                boxes.xyxy.cpu().numpy().astype(np.int32),
+                boxes.cls.cpu().numpy().astype(np.int32),
+                boxes.conf.cpu().numpy().astype(np.float32)
+            ))
+        return detections
+        
+    def predict(self, frame):
+        """Chạy model trên một frame, trả về Detections"""
+        return self.detect_batch([frame])[0]
+        
+    def detect_objects(self, frame, run_model=True):
+        """Nhận diện đồ vật trong frame (run_model=False: vẽ lại kết quả gần nhất)"""
         if not self.is_enabled:
             return frame
             
-        # Thực hiện dự đoán
-        results = self.model(frame, conf=0.5)  # confidence threshold 0.5
+        if run_model:
+            self.last_detections = self.predict(frame)
         
-        # Vẽ kết quả lên frame
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Lấy tọa độ
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                
-                # Lấy class và confidence
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                
-                # Tên class và độ tin cậy
-                label = f"{self.classes[cls]} ({conf:.2f})"
-                
-                # Vẽ khung và label
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                cv2.putText(frame, label, (x1, y1 - 10), 
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-                
-        return frame
+        return self.draw(frame, self.last_detections)
+        
+    def draw(self, frame, detections):
+        """Vẽ kết quả nhận diện lên frame"""
+        names = detections.names if detections.names is not None else self.classes
+        return draw_detections(frame, detections, names)
         
     def toggle(self):
         """Bật/tắt nhận diện đồ vật"""
@@ -55,7 +129,9 @@ class ObjectDetector:
     def reload_model(self):
         """Tải lại model sau khi train"""
         if os.path.exists(self.model_path):
-            self.model = YOLO(self.model_path)
-            self.classes = self.model.names
+            # Backend ONNX được export lại từ weights mới
+            # Kết quả cũ mang theo tên class của model cũ nên vẫn vẽ đúng tới lần predict kế tiếp
+            self._load_model(self.model_path)
+            self.last_detections = Detections.empty()
             return True
         return False 
\ No newline at end of file
@@ -2,7 +2,8 @@ import os
 import cv2
 import yaml
 import shutil
-from ultralytics import YOLO
+import threading
+from src import config
 
 class ObjectTrainer:
     def __init__(self):
@@ -48,42 +49,61 @@ class ObjectTrainer:
             return len(self.classes) - 1  # trả về index của class mới
         return self.classes.index(class_name)
         
-    def capture_training_images(self, class_name, num_images=30):
-        """Chụp ảnh training cho một class"""
+    def capture_training_images(self, class_name, num_images=30, frame_source=None):
+        """Chụp ảnh training cho một class (frame_source: hàm trả về frame từ camera dùng chung)"""
         class_idx = self.add_class(class_name)
         
-        # Khởi tạo camera
-        cap = cv2.VideoCapture(0)
+        # Khởi tạo camera nếu không có nguồn frame dùng chung
+        cap = cv2.VideoCapture(0) if frame_source is None else None
         
         images_captured = 0
         while images_captured < num_images:
-            ret, frame = cap.read()
+            if cap is not None:
+                ret, frame = cap.read()
+            else:
+                frame = frame_source()
+                ret = frame is not None
             if not ret:
                 break
                 
-            # Hiển thị frame
-            cv2.imshow('Capture Training Images', frame)
-            cv2.putText(frame, f"Press SPACE to capture ({images_captured}/{num_images})", 
+            # Hiển thị frame (vẽ hướng dẫn lên bản sao để ảnh lưu không dính chữ)
+            preview = frame.copy()
+            cv2.putText(preview, f"Press SPACE to capture ({images_captured}/{num_images})", 
                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            cv2.imshow('Capture Training Images', preview)
             
             key = cv2.waitKey(1) & 0xFF
             if key == ord('q'):
                 break
             elif key == ord(' '):  # space key
-                # Lưu ảnh
-                timestamp = f"{images_captured:04d}"
-                image_path = os.path.join(self.images_dir, "train", 
-                                        f"{class_name}_{timestamp}.jpg")
-                cv2.imwrite(image_path, frame)
-                
-                # Tạo label file
-                self._create_label_file(image_path, class_idx)
-                
+                self.save_training_image(class_name, class_idx, frame, images_captured)
                 images_captured += 1
                 print(f"Đã chụp {images_captured}/{num_images} ảnh")
         
-        cap.release()
-        cv2.destroyAllWindows()
+        if cap is not None:
+            cap.release()
+            cv2.destroyAllWindows()
+        else:
+            # Chỉ đóng cửa sổ chụp ảnh, giữ cửa sổ nhận diện đang chạy
+            try:
+                cv2.destroyWindow('Capture Training Images')
+            except cv2.error:
+                pass
+        
+    def save_training_image(self, class_name, class_idx, frame, index):
+        """Lưu một ảnh training kèm label file (cứ TRAIN_VAL_EVERY ảnh thì một ảnh vào tập val)"""
+        timestamp = f"{index:04d}"
+        split = "val" if (index + 1) % config.TRAIN_VAL_EVERY == 0 else "train"
+        image_path = os.path.join(self.images_dir, split, f"{class_name}_{timestamp}.jpg")
+        cv2.imwrite(image_path, frame)
+        
+        # Tạo label file
+        self._create_label_file(image_path, class_idx)
+        return image_path
+        
+    def start_capture(self, class_name, num_images=30):
+        """Tạo phiên chụp ảnh training do vòng lặp hiển thị của app điều khiển"""
+        return CaptureSession(self, class_name, num_images)
         
     def _create_label_file(self, image_path, class_idx):
         """Tạo file label cho ảnh training"""
@@ -111,30 +131,80 @@ class ObjectTrainer:
             
         return yaml_path
         
-    def train_model(self, epochs=50):
-        """Training model"""
+    def val_images(self):
+        """Danh sách ảnh của tập val (held-out)"""
+        val_dir = os.path.join(self.images_dir, "val")
+        return sorted(os.path.join(val_dir, name) for name in os.listdir(val_dir) if name.endswith('.jpg'))
+        
+    def _ensure_val_split(self):
+        """Dataset cũ chỉ có ảnh train: chuyển một phần sang val để đánh giá model"""
+        if self.val_images():
+            return
+        train_dir = os.path.join(self.images_dir, "train")
+        names = sorted(name for name in os.listdir(train_dir) if name.endswith('.jpg'))
+        for i, name in enumerate(names):
+            if (i + 1) % config.TRAIN_VAL_EVERY:
+                continue
+            image_path = os.path.join(train_dir, name)
+            label_path = image_path.replace('images', 'labels').replace('.jpg', '.txt')
+            shutil.move(image_path, os.path.join(self.images_dir, "val", name))
+            if os.path.exists(label_path):
+                shutil.move(label_path, os.path.join(self.labels_dir, "val", os.path.basename(label_path)))
+        
+    def train_model(self, epochs=50, current_weights=None, progress=None, stop_event=None, **options):
+        """Training model trong process riêng rồi đánh giá trên tập val
+
+        options ghi đè imgsz/batch/workers/patience/base_weights của config. Trả về kết quả
+        của training_job.run_training, None nếu chưa có class.
+        """
         if not self.classes:
             print("Chưa có classes nào được thêm vào!")
-            return
+            return None
             
-        # Tạo file data.yaml
-        data_yaml = self.create_data_yaml()
-        
-        # Khởi tạo model
-        model = YOLO('yolov8n.pt')  # load model cơ bản
-        
-        # Training
-        try:
-            model.train(
-                data=data_yaml,
-                epochs=epochs,
-                imgsz=640,
-                batch=16,
-                patience=10,
-                project=self.model_dir
-            )
+        from src import training_job
+        self._ensure_val_split()
+        result = training_job.run_training(
+            self, training_job.training_options(epochs, **options), current_weights,
+            progress=progress or training_job.print_progress, stop_event=stop_event)
+        if result["completed"]:
             print("Training hoàn tất!")
-            return os.path.join(self.model_dir, 'train', 'weights', 'best.pt')
-        except Exception as e:
-            print(f"Lỗi khi training: {str(e)}")
-            return None 
\ No newline at end of file
+        else:
+            print(f"Lỗi khi training: {result['error']}")
+        return result
+
+class CaptureSession:
+    """Phiên chụp ảnh training: luồng chính gọi capture()/finish(), luồng lệnh đợi wait()"""
+    
+    def __init__(self, trainer, class_name, num_images):
+        self.trainer = trainer
+        self.class_name = class_name
+        self.class_idx = trainer.add_class(class_name)
+        self.num_images = num_images
+        self.captured = 0
+        self._finished = threading.Event()
+        
+    @property
+    def done(self):
+        return self._finished.is_set()
+        
+    def capture(self, frame):
+        """Lưu frame làm ảnh training, tự kết thúc khi đủ số ảnh"""
+        if frame is None or self.done:
+            return
+        self.trainer.save_training_image(self.class_name, self.class_idx, frame, self.captured)
+        self.captured += 1
+        print(f"Đã chụp {self.captured}/{self.num_images} ảnh")
+        if self.captured >= self.num_images:
+            self.finish()
+            
+    def finish(self):
+        """Kết thúc phiên chụp"""
+        self._finished.set()
+        
+    def wait(self, timeout=None):
+        """Đợi phiên chụp kết thúc, trả về số ảnh đã chụp"""
+        self._finished.wait(timeout)
+        return self.captured
+        
+    def status_text(self):
+        return f"Chụp '{self.class_name}' {self.captured}/{self.num_images} (SPACE chụp, Q kết thúc)"
@@ -0,0 +1,101 @@
+import os
+import cv2
+import numpy as np
+from src.object_detection import Detections
+
+NMS_IOU_THRESHOLD = 0.7  # giống mặc định của ultralytics
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+def export_onnx(model, weights_path, imgsz=640, int8=False):
+    """Export model YOLO sang ONNX (có cache theo imgsz), tùy chọn lượng tử hóa INT8"""
+    stem = os.path.splitext(weights_path)[0]
+    onnx_path = f"{stem}_{imgsz}.onnx"
+
+    # Chỉ export lại khi weights mới hơn file ONNX đã có (ví dụ sau khi train lại)
+    if not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(weights_path):
+        exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        os.replace(exported, onnx_path)
+
+    if not int8:
+        return onnx_path
+
+    int8_path = f"{stem}_{imgsz}_int8.onnx"
+    if not os.path.exists(int8_path) or os.path.getmtime(int8_path) < os.path.getmtime(onnx_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+class OnnxYoloBackend:
+    """Chạy YOLO đã export sang ONNX bằng onnxruntime (CPU hoặc provider khác như OpenVINO)"""
+
+    def __init__(self, onnx_path, imgsz=640, providers=None, threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads  # 0 = để onnxruntime tự chọn
+        self.session = ort.InferenceSession(
+            onnx_path, options, providers=providers or ["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.onnx_path = onnx_path
+
+    def _letterbox(self, frame):
+        """Resize giữ tỉ lệ và thêm viền về imgsz x imgsz, trả về (ảnh, tỉ lệ, (pad_x, pad_y))"""
+        h, w = frame.shape[:2]
+        ratio = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_x, pad_y = (self.imgsz - new_w) // 2, (self.imgsz - new_h) // 2
+
+        image = np.full((self.imgsz, self.imgsz, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        image[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(
+            frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR
+        )
+        return image, ratio, (pad_x, pad_y)
+
+    def _postprocess(self, output, frame_shape, ratio, pad, conf):
+        """Lọc theo confidence, NMS theo class và đưa box về tọa độ frame gốc"""
+        predictions = output.T  # (anchors, 4 + số class)
+        class_scores = predictions[:, 4:]
+        classes = np.argmax(class_scores, axis=1)
+        scores = class_scores[np.arange(len(classes)), classes]
+        keep = scores >= conf
+        if not keep.any():
+            return Detections.empty()
+        predictions, classes, scores = predictions[keep], classes[keep], scores[keep]
+
+        # cx, cy, w, h -> x, y, w, h trong ảnh letterbox
+        boxes = predictions[:, :4].copy()
+        boxes[:, 0] -= boxes[:, 2] / 2
+        boxes[:, 1] -= boxes[:, 3] / 2
+        indices = cv2.dnn.NMSBoxesBatched(boxes.tolist(), scores.tolist(), classes.tolist(),
+                                          conf, NMS_IOU_THRESHOLD)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        boxes, classes, scores = boxes[indices], classes[indices], scores[indices]
+
+        # Bỏ viền letterbox và scale về kích thước frame gốc
+        h, w = frame_shape[:2]
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = (boxes[:, 0] - pad[0]) / ratio
+        xyxy[:, 1] = (boxes[:, 1] - pad[1]) / ratio
+        xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] - pad[0]) / ratio
+        xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] - pad[1]) / ratio
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+        return Detections(xyxy.astype(np.int32), classes.astype(np.int32), scores.astype(np.float32))
+
+    def detect_batch(self, frames, conf):
+        """Chạy một batch frame qua ONNX, trả về list[Detections]"""
+        letterboxed = [self._letterbox(frame) for frame in frames]
+        # BGR HWC uint8 -> RGB NCHW float32 [0, 1]
+        batch = np.stack([image for image, _, _ in letterboxed])[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [
+            self._postprocess(output, frame.shape, ratio, pad, conf)
+            for output, frame, (_, ratio, pad) in zip(outputs, frames, letterboxed)
+        ]
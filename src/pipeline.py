@@ -0,0 +1,177 @@
+import threading
+import queue
+import time
+
+
+class DropOldestQueue:
+    """Hàng đợi giới hạn: khi đầy thì bỏ phần tử cũ nhất để luôn giữ frame mới"""
+
+    def __init__(self, maxsize=2, on_drop=None):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.on_drop = on_drop  # gọi với phần tử bị bỏ (ví dụ để trả buffer frame về pool)
+
+    def put(self, item):
+        """Thêm phần tử, bỏ phần tử cũ nhất nếu hàng đợi đầy"""
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                    self.dropped += 1
+                    if self.on_drop is not None:
+                        self.on_drop(dropped)
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Lấy phần tử, ném queue.Empty nếu quá thời gian chờ"""
+        return self._queue.get(timeout=timeout)
+
+
+class FramePacket:
+    """Frame cùng với kết quả xử lý, gắn frame_id để overlay luôn khớp đúng frame"""
+    __slots__ = ("frame_id", "timestamp", "frame", "faces", "objects", "rois", "_pool")
+
+    def __init__(self, frame_id, frame, pool=None):
+        self.frame_id = frame_id
+        self.timestamp = time.perf_counter()
+        self.frame = frame
+        self._pool = pool  # pool sở hữu buffer của frame (nếu có)
+        self.faces = []  # [(top, right, bottom, left), user_id, distance]
+        self.objects = None  # Detections của frame (nếu có)
+        self.rois = None  # vùng thay đổi [(x1, y1, x2, y2)]; None = chưa kiểm tra, xử lý cả frame
+
+    def release(self):
+        """Trả buffer frame về pool; sau đó không được dùng packet.frame nữa"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.release(self.frame)
+
+
+class CaptureThread(threading.Thread):
+    """Luồng đọc camera liên tục, chỉ giữ các frame mới nhất"""
+
+    def __init__(self, camera, output_queue, stop_event, pool=None):
+        super().__init__(daemon=True)
+        self.camera = camera
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+        self.pool = pool  # FramePool: đọc thẳng vào buffer có sẵn thay vì cấp phát frame mới
+        self.failed = False
+        # Ảnh chụp theo yêu cầu: chỉ chép frame khi có người cần (stage vẽ overlay lên frame của packet)
+        self._snapshot = None
+        self._snapshot_wanted = threading.Event()
+        self._snapshot_ready = threading.Event()
+        self._request_lock = threading.Lock()
+
+    def run(self):
+        frame_id = 0
+        while not self.stop_event.is_set():
+            buffer = self.pool.acquire() if self.pool is not None else None
+            ret, frame = self.camera.read(buffer) if buffer is not None else self.camera.read()
+            if not ret:
+                self.failed = True
+                break
+            if self._snapshot_wanted.is_set():
+                # Chép trước khi đẩy đi: sau đó frame bị vẽ khung/nhãn tại chỗ
+                self._snapshot = frame.copy()
+                self._snapshot_wanted.clear()
+                self._snapshot_ready.set()
+            if self.pool is not None:
+                self.pool.adopt(frame)
+            self.output_queue.put(FramePacket(frame_id, frame, self.pool))
+            frame_id += 1
+
+    def latest_frame(self, timeout=1.0):
+        """Bản sao chưa vẽ overlay của frame kế tiếp (dùng khi chụp ảnh đăng ký/training)
+
+        Đợi tối đa timeout giây cho luồng capture đọc frame mới, None nếu không có.
+        """
+        with self._request_lock:
+            self._snapshot_ready.clear()
+            self._snapshot_wanted.set()
+            if not self._snapshot_ready.wait(timeout):
+                self._snapshot_wanted.clear()
+                return None
+            snapshot, self._snapshot = self._snapshot, None
+            return snapshot
+
+
+class StageWorker(threading.Thread):
+    """Luồng xử lý một stage: lấy packet, gọi hàm xử lý rồi đẩy sang stage kế tiếp"""
+
+    def __init__(self, name, process, input_queue, output_queue, stop_event):
+        super().__init__(name=name, daemon=True)
+        self.process = process
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                packet = self.input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                self.process(packet)
+            except Exception as e:
+                print(f"Lỗi ở stage {self.name}: {str(e)}")
+            self.output_queue.put(packet)
+
+
+class FramePipeline:
+    """Pipeline capture -> các stage xử lý -> render, nối bằng hàng đợi bỏ frame cũ"""
+
+    def __init__(self, camera, stages, queue_size=2, pool=None):
+        self.stop_event = threading.Event()
+        self.capture_queue = DropOldestQueue(queue_size, on_drop=FramePacket.release)
+        self.capture = CaptureThread(camera, self.capture_queue, self.stop_event, pool)
+        self.pool = pool
+
+        self.workers = []
+        input_queue = self.capture_queue
+        for name, process in stages:
+            output_queue = DropOldestQueue(queue_size, on_drop=FramePacket.release)
+            self.workers.append(StageWorker(name, process, input_queue, output_queue, self.stop_event))
+            input_queue = output_queue
+        self.output_queue = input_queue
+        self._last_frame_id = -1
+
+    def start(self):
+        self.capture.start()
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.capture.join(timeout=1)
+        for worker in self.workers:
+            worker.join(timeout=1)
+
+    @property
+    def is_alive(self):
+        return not self.capture.failed
+
+    def get(self, timeout=0.1):
+        """Lấy packet đã xử lý xong tiếp theo, None nếu chưa có; bỏ qua packet cũ hơn frame đã hiển thị"""
+        try:
+            packet = self.output_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if packet.frame_id <= self._last_frame_id:
+            packet.release()
+            return None
+        self._last_frame_id = packet.frame_id
+        return packet
+
+    def latest_frame(self):
+        return self.capture.latest_frame()
+
+    @staticmethod
+    def buffers_needed(num_stages, queue_size):
+        """Số frame có thể cùng tồn tại: các hàng đợi, mỗi stage một frame, frame đang đọc và đang hiển thị"""
+        return (num_stages + 1) * queue_size + num_stages + 2
@@ -0,0 +1,80 @@
+import threading
+from src import config
+
+
+class AdaptiveScheduler:
+    """Điều chỉnh chu kỳ phát hiện, tỉ lệ thu nhỏ và chu kỳ YOLO để giữ FPS mục tiêu"""
+
+    def __init__(self, target_fps=None):
+        self.target_fps = config.TARGET_FPS if target_fps is None else target_fps
+        self.frame_budget = 1.0 / self.target_fps
+
+        # Các thiết lập hiện tại (được hiển thị cho người vận hành)
+        self.face_interval = 1  # phát hiện khuôn mặt mỗi N frame
+        self.face_scale = config.FACE_SCALE_MAX  # tỉ lệ thu nhỏ frame trước khi phát hiện
+        self.object_interval = 1  # chạy YOLO mỗi N frame
+
+        self._latency = {}  # stage -> độ trễ trung bình (EMA, giây/frame)
+        self._counters = {}  # stage -> số frame đã qua stage
+        self._frames_since_adjust = 0
+        self._lock = threading.Lock()
+
+    def should_run(self, stage):
+        """Stage có cần chạy model ở frame này không (theo chu kỳ hiện tại)"""
+        interval = self.face_interval if stage == "faces" else self.object_interval
+        with self._lock:
+            count = self._counters.get(stage, 0)
+            self._counters[stage] = count + 1
+        return count % interval == 0
+
+    def record(self, stage, seconds):
+        """Ghi nhận thời gian xử lý một frame của stage (kể cả frame bỏ qua)"""
+        with self._lock:
+            previous = self._latency.get(stage)
+            self._latency[stage] = seconds if previous is None else 0.9 * previous + 0.1 * seconds
+            if stage == "faces":
+                self._frames_since_adjust += 1
+                if self._frames_since_adjust >= config.SCHEDULER_ADJUST_EVERY:
+                    self._frames_since_adjust = 0
+                    self._adjust()
+
+    def _adjust(self):
+        """Mỗi stage chạy trên luồng riêng nên stage chậm nhất quyết định FPS"""
+        face_latency = self._latency.get("faces", 0.0)
+        object_latency = self._latency.get("objects", 0.0)
+
+        if face_latency > self.frame_budget:
+            # Quá tải: giãn chu kỳ phát hiện trước, sau đó mới giảm độ phân giải
+            if self.face_interval < config.FACE_INTERVAL_MAX:
+                self.face_interval += 1
+            elif self.face_scale > config.FACE_SCALE_MIN:
+                self.face_scale = max(config.FACE_SCALE_MIN, round(self.face_scale - 0.05, 2))
+        elif face_latency < 0.5 * self.frame_budget:
+            # Còn dư: khôi phục độ phân giải trước, sau đó phát hiện dày hơn
+            if self.face_scale < config.FACE_SCALE_MAX:
+                self.face_scale = min(config.FACE_SCALE_MAX, round(self.face_scale + 0.05, 2))
+            elif self.face_interval > 1:
+                self.face_interval -= 1
+
+        if object_latency > self.frame_budget and self.object_interval < config.OBJECT_INTERVAL_MAX:
+            self.object_interval += 1
+        elif object_latency < 0.5 * self.frame_budget and self.object_interval > 1:
+            self.object_interval -= 1
+
+    def status(self):
+        """Thiết lập và độ trễ hiện tại"""
+        with self._lock:
+            return {
+                "target_fps": self.target_fps,
+                "face_interval": self.face_interval,
+                "face_scale": self.face_scale,
+                "object_interval": self.object_interval,
+                "latency_ms": {stage: round(value * 1000, 1) for stage, value in self._latency.items()}
+            }
+
+    def status_text(self):
+        """Một dòng mô tả thiết lập để vẽ lên frame"""
+        status = self.status()
+        latency = " ".join(f"{stage}={ms}ms" for stage, ms in status["latency_ms"].items())
+        return (f"target {status['target_fps']}fps | face 1/{status['face_interval']} "
+                f"x{status['face_scale']} | yolo 1/{status['object_interval']} | {latency}")
@@ -0,0 +1,75 @@
+import time
+import threading
+
+
+class BackgroundLoader:
+    """Nạp các thành phần nặng trên luồng nền, ghi nhận thời gian khởi động từng thành phần"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.times = {}  # thành phần -> số giây để sẵn sàng
+        self.errors = {}  # thành phần -> lỗi khi nạp
+        self._events = {}
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def add(self, name, factory, on_ready=None):
+        """Chạy factory() trên một luồng riêng, gọi on_ready(kết quả) khi xong"""
+        event = self._events[name] = threading.Event()
+
+        def load():
+            start = time.perf_counter()
+            try:
+                result = factory()
+                if on_ready is not None:
+                    on_ready(result)
+            except Exception as e:
+                with self._lock:
+                    self.errors[name] = e
+                print(f"Không thể tải {name}: {str(e)}")
+            else:
+                with self._lock:
+                    self.times[name] = time.perf_counter() - start
+                print(f"{name} sẵn sàng sau {self.times[name]:.2f}s")
+            finally:
+                event.set()
+                self._report_when_done()
+
+        threading.Thread(target=load, name=f"load-{name}", daemon=True).start()
+
+    def _report_when_done(self):
+        """In tóm tắt một lần khi thành phần cuối cùng nạp xong"""
+        with self._lock:
+            if self._reported or any(not event.is_set() for event in self._events.values()):
+                return
+            self._reported = True
+        print(f"{self.report()} (tổng {time.perf_counter() - self.started_at:.2f}s)")
+
+    def record(self, name, seconds):
+        """Ghi nhận thời gian của thành phần được nạp đồng bộ (ví dụ camera)"""
+        with self._lock:
+            self.times[name] = seconds
+
+    def is_ready(self, name):
+        """Thành phần đã nạp xong và không lỗi"""
+        event = self._events.get(name)
+        return event is not None and event.is_set() and name not in self.errors
+
+    def wait(self, name, timeout=None):
+        """Đợi thành phần nạp xong, trả về True nếu sẵn sàng"""
+        event = self._events.get(name)
+        if event is not None:
+            event.wait(timeout)
+        return self.is_ready(name)
+
+    def pending(self):
+        """Danh sách thành phần chưa nạp xong"""
+        return [name for name, event in self._events.items() if not event.is_set()]
+
+    def report(self):
+        """Một dòng tóm tắt thời gian khởi động từng thành phần"""
+        with self._lock:
+            parts = [f"{name} {seconds:.2f}s" for name, seconds in self.times.items()]
+            parts += [f"{name} lỗi" for name in self.errors]
+        parts += [f"{name} đang tải" for name in self.pending()]
+        return "Khởi động: " + ", ".join(parts)
@@ -0,0 +1,394 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+from src.encoding_cache import EncodingCache, ENCODING_DIM, CACHE_VERSION, initial_generation
+
+# Mọi store trao đổi thông tin người dùng dưới dạng dict giống metadata.json:
+# {"name", "created_at", "images": [...], "additional_info": {...}}
+# Mỗi store/cache có bộ đếm generation được lưu cùng dữ liệu và tăng sau mỗi thay đổi.
+
+
+class JsonMetadataStore:
+    """Lưu metadata trong một file JSON (ghi lại toàn bộ file sau mỗi thay đổi)"""
+
+    def __init__(self, metadata_file):
+        self.metadata_file = metadata_file
+        self._batch_depth = 0
+        self.metadata = self._load()
+
+    def _load(self):
+        """Load metadata từ file JSON"""
+        if os.path.exists(self.metadata_file):
+            with open(self.metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if "generation" not in metadata:
+                # File của phiên bản cũ: ghi generation ngay để các lần chạy sau dùng cùng giá trị
+                metadata["generation"] = initial_generation()
+                self.metadata = metadata
+                self._save()
+            return metadata
+        return {"users": {}, "generation": initial_generation()}
+
+    @property
+    def generation(self):
+        return self.metadata["generation"]
+
+    def _save(self):
+        """Lưu metadata vào file JSON (bỏ qua khi đang trong batch)"""
+        self.metadata["generation"] += 1
+        if self._batch_depth:
+            return
+        tmp_file = self.metadata_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.metadata, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_file, self.metadata_file)
+
+    @contextmanager
+    def batch(self):
+        """Gộp nhiều thay đổi thành một lần ghi"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self._save()
+
+    def __contains__(self, user_id):
+        return user_id in self.metadata["users"]
+
+    def get_user(self, user_id):
+        return self.metadata["users"].get(user_id)
+
+    def iter_users(self):
+        return list(self.metadata["users"].items())
+
+    def list_users(self):
+        return [(user_id, data["name"]) for user_id, data in self.metadata["users"].items()]
+
+    def find_users_by_name(self, name):
+        return [user_id for user_id, data in self.metadata["users"].items() if data["name"] == name]
+
+    def add_user(self, user_id, user_data):
+        self.metadata["users"][user_id] = user_data
+        self._save()
+
+    def add_image(self, user_id, image_path):
+        self.metadata["users"][user_id]["images"].append(image_path)
+        self._save()
+
+    def update_user(self, user_id, new_info):
+        self.metadata["users"][user_id].update(new_info)
+        self._save()
+        return self.metadata["users"][user_id]
+
+    def delete_user(self, user_id):
+        del self.metadata["users"][user_id]
+        self._save()
+
+    def close(self):
+        pass
+
+
+class SqliteMetadataStore:
+    """Lưu metadata trong SQLite: mỗi thay đổi là một transaction nhỏ, có index theo user_id/tên"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_name ON users(name);
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            path TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_images_user ON images(user_id);
+        CREATE TABLE IF NOT EXISTS encodings (
+            path TEXT PRIMARY KEY,
+            mtime INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha1 TEXT NOT NULL,
+            encoding BLOB
+        );
+        CREATE TABLE IF NOT EXISTS prototypes (
+            user_id TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        # Dùng chung connection giữa các luồng, mọi truy cập đi qua lock
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.lock = threading.RLock()
+        self._batch_depth = 0
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+        for key in ("generation", "encoding_generation"):
+            self.conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+                              (key, str(initial_generation())))
+
+    @contextmanager
+    def transaction(self):
+        """Transaction lồng được: chỉ transaction ngoài cùng mới COMMIT/ROLLBACK"""
+        with self.lock:
+            if self._batch_depth:
+                self._batch_depth += 1
+                try:
+                    yield self.conn
+                finally:
+                    self._batch_depth -= 1
+                return
+            self._batch_depth = 1
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._batch_depth = 0
+
+    def batch(self):
+        """Gộp nhiều thay đổi thành một transaction"""
+        return self.transaction()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _generation(self, key="generation"):
+        return int(self._query("SELECT value FROM settings WHERE key = ?", (key,))[0][0])
+
+    @staticmethod
+    def _bump(conn, key="generation"):
+        """Tăng bộ đếm generation trong cùng transaction với thay đổi"""
+        conn.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = ?", (key,))
+
+    @property
+    def generation(self):
+        return self._generation()
+
+    def __contains__(self, user_id):
+        return bool(self._query("SELECT 1 FROM users WHERE user_id = ?", (user_id,)))
+
+    def get_user(self, user_id):
+        rows = self._query("SELECT data FROM users WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        user_data = json.loads(rows[0][0])
+        user_data["images"] = [path for (path,) in self._query(
+            "SELECT path FROM images WHERE user_id = ? ORDER BY id", (user_id,))]
+        return user_data
+
+    def iter_users(self):
+        images = {}
+        for user_id, path in self._query("SELECT user_id, path FROM images ORDER BY id"):
+            images.setdefault(user_id, []).append(path)
+        users = []
+        for user_id, data in self._query("SELECT user_id, data FROM users ORDER BY rowid"):
+            user_data = json.loads(data)
+            user_data["images"] = images.get(user_id, [])
+            users.append((user_id, user_data))
+        return users
+
+    def list_users(self):
+        return self._query("SELECT user_id, name FROM users ORDER BY rowid")
+
+    def find_users_by_name(self, name):
+        return [user_id for (user_id,) in self._query("SELECT user_id FROM users WHERE name = ?", (name,))]
+
+    def add_user(self, user_id, user_data):
+        data = {key: value for key, value in user_data.items() if key != "images"}
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO users (user_id, name, data) VALUES (?, ?, ?)",
+                         (user_id, user_data["name"], json.dumps(data, ensure_ascii=False)))
+            conn.executemany("INSERT INTO images (user_id, path) VALUES (?, ?)",
+                             [(user_id, path) for path in user_data.get("images", [])])
+            self._bump(conn)
+
+    def add_image(self, user_id, image_path):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO images (user_id, path) VALUES (?, ?)", (user_id, image_path))
+            self._bump(conn)
+
+    def update_user(self, user_id, new_info):
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchall()
+            data = json.loads(rows[0][0])
+            data.update({key: value for key, value in new_info.items() if key != "images"})
+            conn.execute("UPDATE users SET name = ?, data = ? WHERE user_id = ?",
+                         (data["name"], json.dumps(data, ensure_ascii=False), user_id))
+            self._bump(conn)
+        return self.get_user(user_id)
+
+    def delete_user(self, user_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            self._bump(conn)
+
+    def migrate_from_json(self, metadata_file):
+        """Chuyển metadata.json sang SQLite một lần (file JSON được đổi tên thành .migrated)"""
+        if not os.path.exists(metadata_file) or self._query("SELECT 1 FROM users LIMIT 1"):
+            return 0
+        users = JsonMetadataStore(metadata_file).iter_users()
+        with self.transaction():
+            for user_id, user_data in users:
+                self.add_user(user_id, user_data)
+        os.replace(metadata_file, metadata_file + ".migrated")
+        print(f"Đã chuyển {len(users)} người dùng từ {metadata_file} sang SQLite")
+        return len(users)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class SqliteEncodingCache:
+    """Cache encoding lưu dạng BLOB trong cùng file SQLite, cùng API với EncodingCache"""
+
+    def __init__(self, store, model="small"):
+        self.store = store
+        self.model = model
+        # Đổi model thì toàn bộ encoding cũ không còn hợp lệ
+        rows = store._query("SELECT value FROM settings WHERE key = 'encoding_model'")
+        expected = f"{CACHE_VERSION}:{model}"
+        if rows and rows[0][0] != expected:
+            with store.transaction() as conn:
+                conn.execute("DELETE FROM encodings")
+                conn.execute("DELETE FROM prototypes")
+                store._bump(conn, "encoding_generation")
+        with store.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('encoding_model', ?)",
+                         (expected,))
+
+    @property
+    def generation(self):
+        return self.store._generation("encoding_generation")
+
+    @staticmethod
+    def _to_blob(encoding):
+        return None if encoding is None else np.asarray(encoding, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _from_blob(blob):
+        return None if blob is None else np.frombuffer(blob, dtype=np.float32).reshape(-1, ENCODING_DIM)
+
+    def lookup(self, image_path):
+        """Tra cứu encoding, trả về (có trong cache, encoding hoặc None)"""
+        rows = self.store._query("SELECT mtime, size, sha1, encoding FROM encodings WHERE path = ?",
+                                 (image_path,))
+        if not rows:
+            return False, None
+        mtime, size, sha1, blob = rows[0]
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            self.remove(image_path)
+            return False, None
+        if stat.st_mtime_ns != mtime or stat.st_size != size:
+            if stat.st_size != size or EncodingCache._file_hash(image_path) != sha1:
+                self.remove(image_path)
+                return False, None
+            # File chỉ bị touch, nội dung không đổi: cập nhật lại mtime
+            with self.store.transaction() as conn:
+                conn.execute("UPDATE encodings SET mtime = ? WHERE path = ?", (stat.st_mtime_ns, image_path))
+        encoding = self._from_blob(blob)
+        return True, None if encoding is None else encoding[0]
+
+    def put(self, image_path, encoding):
+        """Lưu encoding của một ảnh (encoding=None nếu ảnh không có khuôn mặt)"""
+        stat = os.stat(image_path)
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO encodings (path, mtime, size, sha1, encoding) VALUES (?, ?, ?, ?, ?)",
+                (image_path, stat.st_mtime_ns, stat.st_size, EncodingCache._file_hash(image_path),
+                 self._to_blob(encoding))
+            )
+            self.store._bump(conn, "encoding_generation")
+
+    def remove(self, image_path):
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM encodings WHERE path = ?", (image_path,))
+            self.store._bump(conn, "encoding_generation")
+
+    def prototype_key(self, image_paths, k):
+        """Khóa nhận diện tập ảnh của người dùng (đổi ảnh thì prototype cũ hết hiệu lực)"""
+        sha1 = hashlib.sha1(f"k={k}".encode())
+        for image_path in sorted(image_paths):
+            rows = self.store._query("SELECT sha1 FROM encodings WHERE path = ?", (image_path,))
+            if rows:
+                sha1.update(rows[0][0].encode())
+        return sha1.hexdigest()
+
+    def get_prototypes(self, user_id, key):
+        rows = self.store._query("SELECT key, data FROM prototypes WHERE user_id = ?", (user_id,))
+        if not rows or rows[0][0] != key:
+            return None
+        return self._from_blob(rows[0][1])
+
+    def put_prototypes(self, user_id, key, prototypes):
+        with self.store.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO prototypes (user_id, key, data) VALUES (?, ?, ?)",
+                         (user_id, key, self._to_blob(prototypes)))
+            self.store._bump(conn, "encoding_generation")
+
+    def remove_prototypes(self, user_id):
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM prototypes WHERE user_id = ?", (user_id,))
+            self.store._bump(conn, "encoding_generation")
+
+    def import_from(self, cache):
+        """Chép các encoding còn hợp lệ từ cache .npy để không phải encode lại sau khi chuyển đổi"""
+        imported = 0
+        with self.store.transaction() as conn:
+            for image_path, entry in cache._entries.items():
+                # Encoding mới (kể cả phát lại từ journal) còn nằm trong _pending với row = -1
+                if image_path in cache._pending:
+                    encoding = cache._pending[image_path]
+                elif entry["row"] >= 0:
+                    encoding = cache._matrix[entry["row"]]
+                else:
+                    encoding = None
+                conn.execute(
+                    "INSERT OR IGNORE INTO encodings (path, mtime, size, sha1, encoding) VALUES (?, ?, ?, ?, ?)",
+                    (image_path, entry["mtime"], entry["size"], entry["sha1"], self._to_blob(encoding))
+                )
+                imported += 1
+            self.store._bump(conn, "encoding_generation")
+        return imported
+
+    def save(self):
+        # Mỗi thay đổi đã được commit ngay trong transaction của nó
+        pass
+
+    def checkpoint(self):
+        pass
+
+
+def open_storage(backend, data_dir):
+    """Mở store metadata và cache encoding theo backend ("json" hoặc "sqlite")"""
+    metadata_file = os.path.join(data_dir, "metadata.json")
+    if backend == "json":
+        return JsonMetadataStore(metadata_file), EncodingCache(data_dir)
+    if backend == "sqlite":
+        store = SqliteMetadataStore(os.path.join(data_dir, "metadata.db"))
+        encoding_cache = SqliteEncodingCache(store)
+        if os.path.exists(metadata_file) and store.migrate_from_json(metadata_file):
+            encoding_cache.import_from(EncodingCache(data_dir))
+        return store, encoding_cache
+    raise ValueError(f"Không hỗ trợ backend lưu trữ: {backend}")
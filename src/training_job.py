@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import queue
+import shutil
+import multiprocessing
+from src import config
+
+RUN_NAME = "candidate"  # thư mục run của ultralytics trong model_dir, ghi đè mỗi lần train
+STATE_FILE = "train_state.json"
+METRIC_MAP50 = "metrics/mAP50(B)"
+METRIC_MAP = "metrics/mAP50-95(B)"
+
+
+def print_progress(epoch, epochs, metrics):
+    """In tiến độ mặc định của training"""
+    print(f"Training: epoch {epoch}/{epochs} (mAP50 {metrics.get(METRIC_MAP50, 0):.3f}, "
+          f"mAP50-95 {metrics.get(METRIC_MAP, 0):.3f})")
+
+
+def training_options(epochs, **overrides):
+    """Tham số training lấy từ config, ghi đè được từng giá trị"""
+    options = {
+        "epochs": epochs,
+        "imgsz": config.TRAIN_IMGSZ,
+        "batch": config.TRAIN_BATCH,
+        "workers": config.TRAIN_WORKERS,
+        "patience": config.TRAIN_PATIENCE,
+        "base_weights": config.TRAIN_BASE_WEIGHTS,
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def _read_state(model_dir):
+    try:
+        with open(os.path.join(model_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(model_dir, state):
+    path = os.path.join(model_dir, STATE_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def resume_checkpoint(model_dir, classes):
+    """last.pt của lần train bị dừng giữa chừng với cùng danh sách class, None nếu không có"""
+    state = _read_state(model_dir)
+    last = os.path.join(model_dir, RUN_NAME, "weights", "last.pt")
+    if state.get("status") == "running" and state.get("classes") == list(classes) and os.path.exists(last):
+        return last
+    return None
+
+
+def _evaluate(weights, data_yaml, classes, val_images, options):
+    """mAP trên tập val và độ trễ predict trung vị (ms); None nếu model có class khác dataset"""
+    from ultralytics import YOLO
+    model = YOLO(weights)
+    if list(model.names.values()) != list(classes):
+        return None
+    metrics = model.val(data=data_yaml, imgsz=options["imgsz"], batch=options["batch"],
+                        workers=options["workers"], split="val", plots=False, verbose=False)
+
+    samples = val_images[:config.TRAIN_LATENCY_SAMPLES]
+    times = []
+    if samples:
+        model.predict(samples[0], imgsz=options["imgsz"], verbose=False)  # warm-up
+    for image_path in samples:
+        start = time.perf_counter()
+        model.predict(image_path, imgsz=options["imgsz"], verbose=False)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "map50": round(float(metrics.box.map50), 4),
+        "map50_95": round(float(metrics.box.map), 4),
+        "ms": round(sorted(times)[len(times) // 2], 2) if times else 0.0,
+    }
+
+
+def _train_process(data_yaml, model_dir, classes, options, resume_from, current_weights, val_images, messages):
+    """Thân process training: train (hoặc tiếp tục), rồi đánh giá model mới và model đang dùng"""
+    try:
+        from ultralytics import YOLO
+
+        def on_fit_epoch_end(trainer):
+            metrics = {key: round(float(value), 4) for key, value in (trainer.metrics or {}).items()}
+            messages.put(("epoch", trainer.epoch + 1, trainer.epochs, metrics))
+
+        if resume_from:
+            model = YOLO(resume_from)
+            model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+            model.train(resume=True)
+        else:
+            model = YOLO(options["base_weights"])
+            model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+            model.train(data=data_yaml, epochs=options["epochs"], imgsz=options["imgsz"],
+                        batch=options["batch"], workers=options["workers"],
+                        patience=options["patience"], project=model_dir, name=RUN_NAME, exist_ok=True)
+
+        candidate = os.path.join(model_dir, RUN_NAME, "weights", "best.pt")
+        messages.put(("validating",))
+        report = {"candidate": _evaluate(candidate, data_yaml, classes, val_images, options), "current": None}
+        if current_weights and os.path.exists(current_weights):
+            try:
+                report["current"] = _evaluate(current_weights, data_yaml, classes, val_images, options)
+            except Exception as e:
+                print(f"Không thể đánh giá model đang dùng: {str(e)}")
+        messages.put(("done", candidate, report))
+    except Exception as e:
+        messages.put(("error", str(e)))
+
+
+def run_training(trainer, options, current_weights=None, progress=print_progress, stop_event=None):
+    """Train YOLO trong process riêng (spawn), báo tiến độ mỗi epoch
+
+    Trả về {"completed", "weights", "report", "error"}; dừng qua stop_event thì process bị
+    kết thúc và lần train sau tiếp tục từ last.pt.
+    """
+    data_yaml = trainer.create_data_yaml()
+    classes = list(trainer.classes)
+    resume_from = resume_checkpoint(trainer.model_dir, classes)
+    if resume_from:
+        print(f"Tiếp tục training dang dở từ {resume_from} (giữ số epochs của lần trước)")
+    _write_state(trainer.model_dir, {"status": "running", "classes": classes, "options": options})
+
+    # spawn thay vì fork: process cha có thể đang chạy luồng camera/pipeline.
+    # Process không phải daemon vì DataLoader của ultralytics cần tạo process con
+    context = multiprocessing.get_context("spawn")
+    messages = context.Queue()
+    process = context.Process(
+        target=_train_process, name="yolo-train",
+        args=(data_yaml, trainer.model_dir, classes, options, resume_from, current_weights,
+              trainer.val_images(), messages))
+    process.start()
+
+    result = {"completed": False, "weights": None, "report": None, "error": None}
+    while True:
+        try:
+            message = messages.get(timeout=0.5)
+        except queue.Empty:
+            if stop_event is not None and stop_event.is_set():
+                process.terminate()
+                result["error"] = "đã dừng (chạy lại để tiếp tục)"
+                break
+            if not process.is_alive():
+                result["error"] = f"process training kết thúc bất thường (exit code {process.exitcode})"
+                break
+            continue
+
+        kind = message[0]
+        if kind == "epoch":
+            if progress is not None:
+                progress(*message[1:])
+        elif kind == "validating":
+            print("Đang đánh giá model mới trên tập val...")
+        elif kind == "done":
+            result.update(completed=True, weights=message[1], report=message[2])
+            break
+        elif kind == "error":
+            result["error"] = message[1]
+            break
+    process.join()
+
+    # Bị dừng thì giữ trạng thái "running" để lần sau tiếp tục từ last.pt
+    stopped = not result["completed"] and stop_event is not None and stop_event.is_set()
+    if not stopped:
+        _write_state(trainer.model_dir, {"status": "done" if result["completed"] else "failed",
+                                         "classes": classes, "options": options})
+    return result
+
+
+def accept_candidate(report, max_slowdown=None, map_tolerance=None):
+    """Quyết định thay model: trả về (chấp nhận, lý do)"""
+    max_slowdown = config.TRAIN_MAX_SLOWDOWN if max_slowdown is None else max_slowdown
+    map_tolerance = config.TRAIN_MAP_TOLERANCE if map_tolerance is None else map_tolerance
+    candidate, current = report["candidate"], report["current"]
+    if candidate is None:
+        return False, "model mới không khớp danh sách class"
+    if current is None:
+        return True, "không có model đang dùng cùng danh sách class để so sánh"
+    if candidate["map50_95"] < current["map50_95"] - map_tolerance:
+        return False, f"mAP50-95 thấp hơn ({candidate['map50_95']:.3f} < {current['map50_95']:.3f})"
+    if current["ms"] > 0 and candidate["ms"] > current["ms"] * max_slowdown:
+        return False, f"chậm hơn ({candidate['ms']:.1f}ms so với {current['ms']:.1f}ms)"
+    return True, (f"mAP50-95 {candidate['map50_95']:.3f} (cũ {current['map50_95']:.3f}), "
+                  f"{candidate['ms']:.1f}ms (cũ {current['ms']:.1f}ms)")
+
+
+def _backup_path(model_path):
+    return os.path.splitext(model_path)[0] + ".prev.pt"
+
+
+def promote_weights(candidate, model_path):
+    """Thay weights đang dùng bằng candidate (atomic), giữ bản cũ để rollback"""
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    if os.path.exists(model_path):
+        shutil.copyfile(model_path, _backup_path(model_path))
+    tmp_path = model_path + ".tmp"
+    shutil.copyfile(candidate, tmp_path)  # copyfile: mtime mới để ONNX được export lại
+    os.replace(tmp_path, model_path)
+
+
+def rollback_weights(model_path):
+    """Khôi phục weights trước lần promote gần nhất, trả về False nếu không có bản cũ"""
+    backup = _backup_path(model_path)
+    if os.path.exists(backup):
+        os.replace(backup, model_path)
+        os.utime(model_path)  # mtime mới để cache ONNX của model bị thay không còn được dùng
+        return True
+    if os.path.exists(model_path):
+        # Trước đó dùng model mặc định: bỏ custom model đi
+        os.remove(model_path)
+        return True
+    return False
+
+
+def install_candidate(object_detector, result):
+    """Kiểm tra kết quả training rồi thay model của detector, rollback nếu không nạp được
+
+    Detector nạp xong model mới mới thay, stage nhận diện đồ vật không phải dừng.
+    """
+    accepted, reason = accept_candidate(result["report"])
+    if not accepted:
+        print(f"Giữ model hiện tại: {reason}")
+        return False
+    print(f"Model mới đạt yêu cầu: {reason}")
+    promote_weights(result["weights"], object_detector.model_path)
+    try:
+        loaded = object_detector.reload_model()
+    except Exception as e:
+        print(f"Lỗi khi nạp model mới: {str(e)}")
+        loaded = False
+    if not loaded:
+        print("Khôi phục model cũ")
+        rollback_weights(object_detector.model_path)
+    return loaded
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import pytest
+from src.encoding_cache import EncodingCache
+from src.storage import open_storage
+
+
+def _image(data_dir, name):
+    image_path = os.path.join(data_dir, f"{name}.jpg")
+    with open(image_path, 'wb') as f:
+        f.write(name.encode())
+    return image_path
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_generation_changes_with_data_and_survives_reopen(tmp_path, backend):
+    data_dir = str(tmp_path)
+    image_path = _image(data_dir, "alice")
+    store, cache = open_storage(backend, data_dir)
+    store_generation, cache_generation = store.generation, cache.generation
+
+    store.add_user("alice", {"name": "alice", "created_at": "", "images": [image_path], "additional_info": {}})
+    cache.put(image_path, np.ones(128, dtype=np.float32))
+    cache.checkpoint()
+    assert store.generation != store_generation
+    assert cache.generation != cache_generation
+
+    generations = (store.generation, cache.generation)
+    store.close()
+    store, cache = open_storage(backend, data_dir)
+    assert (store.generation, cache.generation) == generations
+
+    store.update_user("alice", {"name": "alicia"})
+    cache.remove(image_path)
+    assert store.generation != generations[0]
+    assert cache.generation != generations[1]
+    store.close()
+
+
+def test_json_cache_generation_matches_after_save(tmp_path):
+    data_dir = str(tmp_path)
+    cache = EncodingCache(data_dir)
+    cache.put(_image(data_dir, "bob"), None)
+    cache.save()
+    assert EncodingCache(data_dir).generation == cache.generation
@@ -0,0 +1,42 @@
+import os
+import numpy as np
+from src.encoding_cache import EncodingCache
+from src.storage import JsonMetadataStore, open_storage
+
+
+def _enroll(data_dir, name, encoding):
+    """Đăng ký một người dùng như DataManager: metadata JSON + encoding chỉ nằm trong journal"""
+    image_path = os.path.join(data_dir, f"{name}.jpg")
+    with open(image_path, 'wb') as f:
+        f.write(name.encode())
+    JsonMetadataStore(os.path.join(data_dir, "metadata.json")).add_user(
+        name, {"name": name, "created_at": "", "images": [image_path], "additional_info": {}})
+    cache = EncodingCache(data_dir)
+    cache.put(image_path, encoding)
+    cache.checkpoint()
+    return image_path
+
+
+def test_sqlite_migration_keeps_journal_only_encodings(tmp_path):
+    data_dir = str(tmp_path)
+    encoding = np.arange(128, dtype=np.float32)
+    image_path = _enroll(data_dir, "alice", encoding)
+    assert os.path.exists(os.path.join(data_dir, "encodings_journal.jsonl"))
+    assert not os.path.exists(os.path.join(data_dir, "encodings.npy"))
+
+    store, cache = open_storage("sqlite", data_dir)
+    found, migrated = cache.lookup(image_path)
+    assert found
+    assert migrated is not None
+    np.testing.assert_array_equal(migrated, encoding)
+    assert store.get_user("alice")["images"] == [image_path]
+    store.close()
+
+
+def test_sqlite_migration_keeps_no_face_entries(tmp_path):
+    data_dir = str(tmp_path)
+    image_path = _enroll(data_dir, "bob", None)
+
+    store, cache = open_storage("sqlite", data_dir)
+    assert cache.lookup(image_path) == (True, None)
+    store.close()
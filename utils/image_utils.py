@@ -32,4 +32,23 @@ def draw_text_with_background(image, text, position, font=cv2.FONT_HERSHEY_DUPLE
                  cv2.FILLED)
     
     # Vẽ text
-    cv2.putText(image, text, position, font, font_scale, color, thickness) 
\ No newline at end of file
+    cv2.putText(image, text, position, font, font_scale, color, thickness)
+
+def draw_face_box(image, box, label, known=True):
+    """Vẽ khung khuôn mặt (top, right, bottom, left) kèm nhãn"""
+    top, right, bottom, left = box
+    color = (0, 255, 0) if known else (0, 0, 255)
+    cv2.rectangle(image, (left, top), (right, bottom), color, 2)
+    draw_text_with_background(image, label, (left + 6, bottom - 6))
+
+def draw_detections(image, detections, class_names, color=(255, 0, 0)):
+    """Vẽ kết quả nhận diện đồ vật (boxes/classes/scores) lên ảnh"""
+    for (x1, y1, x2, y2), cls, conf in zip(detections.boxes, detections.classes, detections.scores):
+        # Tên class và độ tin cậy
+        label = f"{class_names[int(cls)]} ({conf:.2f})"
+        
+        # Vẽ khung và label
+        cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
+        cv2.putText(image, label, (int(x1), int(y1) - 10), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return image
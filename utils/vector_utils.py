@@ -0,0 +1,61 @@
+import numpy as np
+
+# Số dòng mỗi khối khi đổi kiểu ma trận float16 sang float32 để tính khoảng cách
+CHUNK_ROWS = 65536
+
+def squared_distances(queries, points, point_sq_norms=None):
+    """Bình phương khoảng cách Euclidean giữa từng query và từng điểm"""
+    queries = np.asarray(queries, dtype=np.float32)
+    if points.dtype != np.float32:
+        # Ma trận float16 (thường là memmap): đổi kiểu từng khối thay vì chép cả ma trận
+        sq_dist = np.empty((len(queries), len(points)), dtype=np.float32)
+        for start in range(0, len(points), CHUNK_ROWS):
+            end = start + CHUNK_ROWS
+            norms = None if point_sq_norms is None else point_sq_norms[start:end]
+            sq_dist[:, start:end] = squared_distances(queries, points[start:end].astype(np.float32), norms)
+        return sq_dist
+    if point_sq_norms is None:
+        point_sq_norms = np.einsum('ij,ij->i', points, points)
+    
+    # ||q - p||^2 = ||q||^2 + ||p||^2 - 2 q.p
+    sq_dist = queries @ points.T
+    sq_dist *= -2
+    sq_dist += point_sq_norms
+    sq_dist += np.einsum('ij,ij->i', queries, queries)[:, None]
+    return sq_dist
+
+def kmeans(data, k, iterations=20, seed=0):
+    """Phân cụm k-means đơn giản, trả về (centroids, labels)"""
+    data = np.asarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    labels = np.zeros(len(data), dtype=np.int64)
+    
+    for _ in range(iterations):
+        labels = np.argmin(squared_distances(data, centroids), axis=1)
+        counts = np.bincount(labels, minlength=k)
+        
+        # Cập nhật tâm cụm; cụm rỗng được gán lại một điểm ngẫu nhiên
+        new_centroids = np.zeros_like(centroids)
+        np.add.at(new_centroids, labels, data)
+        empty = counts == 0
+        new_centroids[~empty] /= counts[~empty, None]
+        if empty.any():
+            new_centroids[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        
+        if np.allclose(new_centroids, centroids):
+            break
+        centroids = new_centroids
+        
+    return centroids, labels
+
+def compute_prototypes(encodings, k=1):
+    """Nén các encoding của một người thành k prototype (k=1 là trung bình)"""
+    encodings = np.asarray(encodings, dtype=np.float32)
+    if len(encodings) <= k:
+        return encodings
+    if k == 1:
+        return encodings.mean(axis=0, keepdims=True)
+    centroids, _ = kmeans(encodings, k)
+    return centroids